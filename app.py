@@ -2,543 +2,880 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+import hashlib
+import json
+import os
 import time
 
+from callanalyzer import (
+    concurrency_steps, concurrency_summary,
+    grouped_concurrency_steps, grouped_concurrency_summary, grouped_resample_concurrency,
+    stream_csv, DEFAULT_CHUNKSIZE, ParquetCache, file_digest, load_with_cache,
+    SharedFrameStore, status_table, non_answered_status_table, breakdown_counts, breakdown_table,
+    conversation_stats, activity_table,
+    expand_sources, load_many, merge_calls, IncrementalStore, build_cube, FrameIndex,
+    build_call_flows, call_flow_table, call_legs, chain_length_table, extension_time_table,
+    missed_call_callbacks, callback_summary, callback_delay_table, repeat_callers,
+    capacity_table, blocked_calls_by_period, erlang_table, build_pyramid,
+    EXPORT_MIME, export_bytes, export_formats, iter_chunks,
+    profiling, span, current_profiler, report_table, report_cache_table,
+)
+
+MAX_CHART_POINTS = 2000
+MAX_PROFILE_REPORTS = 20
+
 st.set_page_config(page_title="3CX Call Analyzer Pro", layout="wide")
 st.title("📞 3CX Call Log Analyzer – Analisi Avanzata 2025")
 
-uploaded_file = st.file_uploader("Carica un file CSV di log chiamate 3CX", type=["csv"])
+uploaded_files = st.file_uploader("Carica uno o più file CSV di log chiamate 3CX", type=["csv"],
+                                  accept_multiple_files=True)
+source_dir = st.text_input("…oppure indica una cartella sul server con gli export CSV", value="")
+sources = list(uploaded_files or []) + (expand_sources([source_dir]) if source_dir and os.path.isdir(source_dir) else [])
+if source_dir and not os.path.isdir(source_dir):
+    st.warning(f"⚠️ Cartella non trovata: {source_dir}")
+analysis_mode = st.radio("Modalità di analisi", ["Completa", "Streaming", "Incrementale"], horizontal=True,
+                         help="Streaming: export molto grandi, solo aggregati e senza filtri. "
+                              "Incrementale: aggiunge allo storico locale solo le chiamate nuove di ogni export.")
+streaming_mode = analysis_mode == "Streaming"
+incremental_mode = analysis_mode == "Incrementale"
+profiling_enabled = st.toggle("⏱️ Profilazione delle fasi", key="profiling",
+                              help="Misura tempo e righe di ogni fase di elaborazione e sezione della dashboard.")
+profile_memory = profiling_enabled and st.checkbox("Misura anche il picco di memoria (più lento)",
+                                                   key="profiling_memory")
+if streaming_mode or incremental_mode:
+    chunksize = st.number_input("Righe per blocco", min_value=10_000, max_value=2_000_000,
+                                value=DEFAULT_CHUNKSIZE, step=50_000)
+
+@st.cache_resource
+def get_disk_cache():
+    return ParquetCache()
+
+@st.cache_resource
+def get_frame_store():
+    # Condiviso da tutte le sessioni del processo
+    return SharedFrameStore()
+
+def get_file_digest(file):
+    # L'hash del contenuto si calcola una volta per file caricato nella sessione
+    digests = st.session_state.setdefault('file_digests', {})
+    if isinstance(file, str):
+        stat = os.stat(file)
+        file_id = (file, stat.st_mtime_ns, stat.st_size)
+    else:
+        file_id = getattr(file, 'file_id', None) or id(file)
+    if file_id not in digests:
+        digests[file_id] = file_digest(file)
+    return digests[file_id]
+
+def source_name(file):
+    return os.path.basename(file) if isinstance(file, str) else getattr(file, 'name', None)
+
+def dataset_key(files):
+    keys = [get_file_digest(file) for file in files]
+    return keys[0] if len(files) == 1 else hashlib.blake2b('|'.join(sorted(keys)).encode(), digest_size=20).hexdigest()
+
+def load_and_process_data(files):
+    key = dataset_key(files)
+
+    def load():
+        # Cache su disco indirizzata per contenuto: sopravvive a riavvii e redeploy
+        if len(files) == 1:
+            return load_with_cache(files[0], get_disk_cache(), key=key, source=source_name(files[0]))
+        # Più file: elaborazione parallela dei soli file non in cache, poi unione senza duplicati
+        return merge_calls(load_many(files, get_disk_cache()))
+
+    return get_frame_store().get_or_load(key, load)
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def get_cube(key, _df):
+    # Cubo pre-aggregato, calcolato una volta per dataset e condiviso tra le sessioni
+    return build_cube(_df)
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def get_frame_index(key, _df):
+    # Indici di posizione per i filtri, condivisi tra le sessioni come il cubo
+    return FrameIndex(_df)
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def get_call_flows(key, _df):
+    # Tratte delle activity details dell'intero dataset; le selezioni ne prendono le righe
+    return build_call_flows(_df['Call Activity Details'])
+
+def show_cache_diagnostics():
+    with st.expander("🩺 Diagnostica cache"):
+        stats = get_frame_store().stats()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Hit (memoria condivisa)", stats['hits'])
+        col2.metric("Miss", stats['misses'])
+        col3.metric("Eviction", stats['evictions'])
+        col4.metric("Memoria usata", f"{stats['used_bytes'] / 1024 ** 2:.0f} / {stats['max_bytes'] / 1024 ** 2:.0f} MB")
+        st.dataframe(get_frame_store().entries())
+
+        disk_cache = get_disk_cache()
+        if disk_cache.enabled:
+            disk_entries = disk_cache.entries()
+            st.write(f"**Cache su disco** ({disk_cache.directory}): {len(disk_entries)} file, "
+                     f"{sum(size for _, size, _ in disk_entries) / 1024 ** 2:.0f} / {disk_cache.max_bytes / 1024 ** 2:.0f} MB")
+        else:
+            st.write("**Cache su disco** disattivata: pyarrow non installato")
+
+def show_load_info(info):
+    if info.get('files', 1) > 1:
+        st.info(f"📚 {info['files']} file uniti ({info['files_from_cache']} dalla cache su disco), "
+                f"{info['duplicates']} chiamate duplicate rimosse (Call ID + Call Time)")
+    elif info['from_cache']:
+        st.info("⚡ File già elaborato: dati caricati dalla cache su disco")
+    for fmt, count in info['date_formats'].items():
+        st.success(f"✅ Formato data riconosciuto: {fmt} ({count} righe)")
+    if info['date_fallback']:
+        st.warning(f"⚠️ Usato parsing automatico per {info['date_fallback']} date. Controlla i risultati.")
+    if info['rows_dropped']:
+        st.warning(f"⚠️ Rimosse {info['rows_dropped']} righe con date non valide")
+    if info['malformed']['Ringing'] or info['malformed']['Talking']:
+        st.warning(f"⚠️ Durate non valide considerate come 0 sec: "
+                   f"Ringing {info['malformed']['Ringing']}, Talking {info['malformed']['Talking']}")
+
+def render_concurrency_timeline(steps_df, key):
+    # Serie temporale dalla piramide multi-risoluzione: il livello dipende
+    # dall'intervallo visibile e i punti inviati al browser restano limitati
+    with span('build_pyramid', rows=len(steps_df)):
+        pyramid = build_pyramid(steps_df)
+    first = steps_df['Time'].iloc[0].floor('1min').to_pydatetime()
+    last = steps_df['Time'].iloc[-1].ceil('1min').to_pydatetime()
+    view_range = (first, last)
+    if last - first > timedelta(minutes=5):
+        view_range = st.slider("Intervallo visualizzato", min_value=first, max_value=last, value=(first, last),
+                               step=timedelta(minutes=5), format="DD/MM/YYYY HH:mm", key=f"timeline_{key}")
+    level, view_df = pyramid.view(view_range[0], view_range[1], max_points=MAX_CHART_POINTS)
+
+    with span('grafici_concorrenza', rows=len(view_df)):
+        fig = go.Figure()
+        fig.add_trace(go.Scattergl(x=view_df['Time'], y=view_df['Concurrent Calls'], mode='lines', name='Picco'))
+        fig.add_trace(go.Scattergl(x=view_df['Time'], y=view_df['Mean Concurrent Calls'], mode='lines', name='Media'))
+        fig.update_layout(title=f'Chiamate contemporanee nel tempo (massimo e media, risoluzione {level})',
+                          xaxis_title='Time', yaxis_title='Chiamate contemporanee')
+        st.plotly_chart(fig, width='stretch')
+
+        fig_volume = go.Figure(go.Scattergl(x=view_df['Time'], y=view_df['Chiamate'], mode='lines', name='Chiamate'))
+        fig_volume.update_layout(title=f'Chiamate iniziate per intervallo ({level})',
+                                 xaxis_title='Time', yaxis_title='Chiamate')
+        st.plotly_chart(fig_volume, width='stretch')
+    st.caption(f"{len(view_df)} punti (massimo {MAX_CHART_POINTS}) – restringi l'intervallo per una risoluzione più fine")
 
 @st.cache_data(show_spinner=False)
-def load_and_process_data(file):
-    df = pd.read_csv(file)
-    
+def load_streaming_aggregates(files, chunksize):
+    # In streaming i file vengono sommati uno dopo l'altro, senza rimozione dei duplicati
+    aggregates = None
+    for file in files:
+        aggregates = stream_csv(file, chunksize=chunksize, source=source_name(file), aggregates=aggregates)
+    return aggregates
+
+def render_streaming_dashboard(aggregates):
+    st.write(f"**Righe lette:** {aggregates.rows_read} – **scartate per data non valida:** {aggregates.rows_dropped}")
+    for fmt, count in aggregates.date_formats.items():
+        st.success(f"✅ Formato data riconosciuto: {fmt} ({count} righe)")
+    if aggregates.date_fallback:
+        st.warning(f"⚠️ Usato parsing automatico per {aggregates.date_fallback} date. Controlla i risultati.")
+    if aggregates.malformed['Ringing'] or aggregates.malformed['Talking']:
+        st.warning(f"⚠️ Durate non valide considerate come 0 sec: "
+                   f"Ringing {aggregates.malformed['Ringing']}, Talking {aggregates.malformed['Talking']}")
+    if aggregates.breakdown['total'] == 0:
+        st.warning("⚠️ Nessuna chiamata valida nel file.")
+        return
+
+    st.subheader("🔍 Analisi Dettagliata degli Status")
+    st.dataframe(aggregates.status_table())
+
+    non_answered_by_direction = aggregates.non_answered_by_direction.reset_index(name='Count')
+    if len(non_answered_by_direction) > 0:
+        fig_direction_status = px.bar(non_answered_by_direction, x='Direction', y='Count', color='Status',
+                                    title='Chiamate non-answered per direzione e status',
+                                    barmode='stack')
+        st.plotly_chart(fig_direction_status, width='stretch')
+
+    st.subheader("📈 Statistiche Generali Avanzate")
+    breakdown = aggregates.breakdown
+    col1, col2, col3, col4, col5, col6 = st.columns(6)
+    col1.metric("Totale Chiamate", breakdown['total'])
+    col2.metric("Status 'Answered'", breakdown['answered'])
+    col3.metric("Conversazioni Reali", breakdown['real_conversations'])
+    col4.metric("Abbandonate (0 sec talking)", breakdown['likely_abandoned'])
+    col5.metric("Altri Status", breakdown['other_status'])
+    col6.metric("Trasferite", breakdown['transferred'])
+
+    st.subheader("📊 Breakdown Dettagliato delle chiamate")
+    breakdown_df = aggregates.breakdown_table()
+    st.dataframe(breakdown_df)
+    fig_pie = px.pie(breakdown_df[:-1], values='Conteggio', names='Categoria',
+                    title='Distribuzione dettagliata delle chiamate')
+    st.plotly_chart(fig_pie, width='stretch')
+
+    st.subheader("📊 Analisi per Direzione")
+    st.dataframe(aggregates.direction_table())
+
+    st.subheader("📊 Pattern Settimanali")
+    daily_stats = aggregates.weekly_table()
+    st.dataframe(daily_stats)
+    fig_weekly = px.bar(daily_stats.reset_index(), x='DayOfWeek', y='Totale_Chiamate',
+                      title='Chiamate per giorno della settimana')
+    st.plotly_chart(fig_weekly, width='stretch')
+
+    steps_df = aggregates.concurrency_steps()
+    if not steps_df.empty:
+        summary = concurrency_summary(steps_df)
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Picco chiamate contemporanee", summary['peak'])
+        col2.metric("Media chiamate contemporanee", f"{summary['mean']:.2f}")
+        col3.metric("Istante del picco", summary['peak_time'].strftime('%Y-%m-%d %H:%M:%S'))
+        render_concurrency_timeline(steps_df, key='streaming')
+
+    st.subheader("📊 Chiamate per Ora del Giorno")
+    hourly_stats = aggregates.hourly_table()
+    fig2 = px.bar(hourly_stats.reset_index(), x='Hour', y='Totale_Chiamate',
+                 labels={'Hour': 'Ora del giorno', 'Totale_Chiamate': 'Numero chiamate'},
+                 title='Distribuzione chiamate per ora')
+    st.plotly_chart(fig2, width='stretch')
+
+    st.subheader("⏱️ Analisi Durata Chiamate Dettagliata")
+    conversation_stats = aggregates.conversation_stats()
+    if conversation_stats:
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Conversazioni totali", conversation_stats['count'])
+        col2.metric("Durata media", f"{conversation_stats['mean']:.0f} sec")
+        col3.metric("Durata mediana", f"{conversation_stats['median']:.0f} sec")
+        col4.metric("Durata massima", f"{conversation_stats['max']:.0f} sec")
+        distribution = conversation_stats['distribution'].rename_axis('Talking_sec').reset_index(name='count')
+        fig_talk_dist = px.histogram(distribution, x='Talking_sec', y='count',
+                                   title='Distribuzione durata conversazioni',
+                                   nbins=30,
+                                   labels={'Talking_sec': 'Durata (secondi)'})
+        st.plotly_chart(fig_talk_dist, width='stretch')
+
+    st.subheader("🏆 Top Utenti - Analisi Dettagliata")
+    st.dataframe(aggregates.user_table())
+
+    activity_analysis = aggregates.activity_table()
+    if activity_analysis is not None:
+        st.subheader("📝 Analisi Call Activity Details")
+        st.write("**Top 10 Activity Details:**")
+        st.dataframe(activity_analysis)
+        if aggregates.activity_pruned:
+            st.caption("Conteggi approssimati: in streaming si conservano solo le activity details più frequenti.")
+
+@contextmanager
+def profiled_run(label):
+    # Un profiler per esecuzione: durante l'esecuzione completa della pagina
+    # gli span dei frammenti si annidano in quello già attivo, una
+    # riesecuzione del solo frammento ne apre uno nuovo
+    if not st.session_state.get('profiling') or current_profiler() is not None:
+        yield
+        return
+    with profiling(memory=st.session_state.get('profiling_memory', False), label=label) as profiler:
+        yield
+    reports = st.session_state.setdefault('profile_reports', [])
+    reports.append(profiler.to_dict())
+    del reports[:-MAX_PROFILE_REPORTS]
+
+def show_profiling_panel():
+    reports = st.session_state.get('profile_reports', [])
+    if not st.session_state.get('profiling') or not reports:
+        return
+    with st.expander("⏱️ Diagnostica prestazioni"):
+        labels = [f"{report['created']} – {report['label']} ({report['total_seconds']:.2f} s)"
+                  for report in reversed(reports)]
+        choice = st.selectbox("Esecuzione", range(len(labels)), format_func=labels.__getitem__, key="profile_choice")
+        report = reports[-1 - min(choice, len(reports) - 1)]
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Tempo totale", f"{report['total_seconds']:.2f} s")
+        col2.metric("Fasi misurate", len(report['spans']))
+        col3.metric("Picco RSS del processo", f"{report['rss_peak_mb']:.0f} MB" if report['rss_peak_mb'] else "n/d")
+        st.dataframe(report_table(report))
+        cache_df = report_cache_table(report)
+        if not cache_df.empty:
+            st.write("**Cache (hit / miss):**")
+            st.dataframe(cache_df)
+        if not report['memory_tracking']:
+            st.caption("Picco di memoria non misurato: attiva l'opzione sotto l'interruttore di profilazione.")
+        st.caption("Le riesecuzioni dei soli filtri compaiono qui al successivo aggiornamento della pagina.")
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("📥 Scarica report JSON", data=json.dumps(report, indent=2, default=str),
+                               file_name=f"3cx_profilo_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                               mime="application/json", key="profile_json")
+        with col2:
+            st.download_button("📥 Scarica tutte le esecuzioni", data=json.dumps(reports, indent=2, default=str),
+                               file_name=f"3cx_profili_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                               mime="application/json", key="profile_json_all")
+
+def show_debug_info(df, info):
     # Debug: mostra informazioni sul file caricato
     st.write("🔍 **Debug - Informazioni file CSV:**")
-    st.write(f"**Colonne disponibili:** {list(df.columns)}")
-    st.write(f"**Numero di righe:** {len(df)}")
+    st.write(f"**Colonne disponibili:** {info['columns']}")
+    st.write(f"**Numero di righe:** {info['rows_read']}")
     st.write("**Primi 3 valori di Call Time:**")
-    st.write(df['Call Time'].head(3).tolist())
-    
-    # Prova diversi formati di data comuni, incluso il formato ISO
-    date_formats = [
-        '%Y-%m-%dT%H:%M:%S',    # 2025-07-25T11:41:48 (formato ISO)
-        '%Y-%m-%d %H:%M:%S',    # 2024-01-15 14:30:25
-        '%d/%m/%Y %H:%M:%S',    # 15/01/2024 14:30:25
-        '%m/%d/%Y %H:%M:%S',    # 01/15/2024 14:30:25
-        '%d-%m-%Y %H:%M:%S',    # 15-01-2024 14:30:25
-        '%Y/%m/%d %H:%M:%S',    # 2024/01/15 14:30:25
-        '%d.%m.%Y %H:%M:%S',    # 15.01.2024 14:30:25
-        '%Y-%m-%d %H:%M',       # 2024-01-15 14:30
-        '%d/%m/%Y %H:%M',       # 15/01/2024 14:30
-    ]
-    
-    # Tenta di convertire la data con diversi formati
-    call_time_converted = False
-    for fmt in date_formats:
+    st.write(info['call_time_head'])
+
+    with st.expander("🧠 Memoria del dataset (prima/dopo lo schema compatto)"):
+        st.dataframe(pd.DataFrame(info['memory']))
+    show_cache_diagnostics()
+
+    # DEBUG: Mostra le prime righe con status non-answered
+    st.subheader("🐛 DEBUG: Analisi Status Non-Answered")
+    non_answered_debug = df[df['Status_clean'] != 'answered']
+    st.write(f"**Trovate {len(non_answered_debug)} chiamate con status non-answered**")
+
+    if len(non_answered_debug) > 0:
+        st.write("**Primi 10 esempi di chiamate non-answered:**")
+        debug_cols = ['Call Time', 'From', 'To', 'Direction', 'Status', 'Status_clean', 'Ringing', 'Talking']
+        if 'Call Activity Details' in non_answered_debug.columns:
+            debug_cols.append('Call Activity Details')
+        st.dataframe(non_answered_debug[debug_cols].head(10))
+
+        # Mostra i valori unici degli status
+        st.write("**Status originali unici (non-answered):**")
+        unique_non_answered = non_answered_debug['Status'].value_counts().loc[lambda c: c > 0]
+        st.write(unique_non_answered)
+
+        st.write("**Status_clean unici (non-answered):**")
+        unique_clean_non_answered = non_answered_debug['Status_clean'].value_counts().loc[lambda c: c > 0]
+        st.write(unique_clean_non_answered)
+
+        # Verifica se ci sono valori null
+        st.write("**Verifica valori null negli status:**")
+        st.write(f"Status null: {non_answered_debug['Status'].isnull().sum()}")
+        st.write(f"Status vuoti: {(non_answered_debug['Status'] == '').sum()}")
+    else:
+        st.write("⚠️ Strano: il conteggio dice 2348 ma il filtro non trova niente!")
+        st.write("Verifichiamo la colonna Status...")
+        st.write("**Tutti gli status nel dataset:**")
+        st.write(df['Status'].value_counts(dropna=False))
+
+def lazy_expander(label, key):
+    # Expander che esegue il contenuto solo quando è aperto
+    container = st.expander(label, on_change="rerun", key=key)
+    return container, container.open
+
+def export_button(label, chunks, file_stem, fmt, key):
+    # I dati vengono estratti e serializzati a blocchi solo al click sul
+    # pulsante; il file completo resta in memoria fino al download
+    st.download_button(
+        label=label,
+        data=lambda: export_bytes(chunks(), fmt),
+        file_name=f"{file_stem}_{datetime.now().strftime('%Y%m%d_%H%M')}.{fmt}",
+        mime=EXPORT_MIME[fmt],
+        key=key,
+    )
+
+def render_overview(df, cube):
+    # ANALISI AVANZATA DEGLI STATUS
+    st.subheader("🔍 Analisi Dettagliata degli Status")
+
+    # Mostra tutti gli status unici trovati nel dataset
+    st.write("**Status trovati nel dataset:**")
+    st.dataframe(status_table(df))
+
+    # BREAKDOWN DETTAGLIATO
+    st.subheader("📊 Breakdown Dettagliato delle chiamate")
+    breakdown_df = breakdown_table(df)
+    st.dataframe(breakdown_df)
+
+    # Grafico a torta del breakdown
+    fig_pie = px.pie(breakdown_df[:-1], values='Conteggio', names='Categoria',
+                    title='Distribuzione dettagliata delle chiamate')
+    st.plotly_chart(fig_pie, width='stretch')
+
+    # ANALISI PER DIREZIONE
+    st.subheader("📊 Analisi per Direzione")
+    st.dataframe(cube.direction_table())
+
+    # Distribuzione per direzione
+    direction_counts = cube.direction_counts()
+    fig_direction = px.pie(values=direction_counts.values, names=direction_counts.index,
+                          title="Distribuzione per tipo di chiamata")
+    st.plotly_chart(fig_direction, width='stretch')
+
+def render_non_answered(df):
+    # ANALISI APPROFONDITA DEI NON-ANSWERED
+    non_answered = df[df['Status_clean'] != 'answered']
+    if len(non_answered) > 0:
+        st.subheader("🔍 APPROFONDIMENTO: Chiamate NON-Answered")
+        st.write(f"**Totale chiamate non-answered: {len(non_answered)} ({len(non_answered)/len(df)*100:.1f}%)**")
+
+        # Status dettagliato per i non-answered
+        st.write("**Breakdown dettagliato degli status non-answered:**")
+        non_answered_df = non_answered_status_table(df)
+        st.dataframe(non_answered_df)
+
+        # Grafico a barre per i non-answered
+        if len(non_answered_df) > 0:
+            fig_non_answered = px.bar(non_answered_df, x='Status', y='Conteggio',
+                                    title='Distribuzione degli status non-answered',
+                                    labels={'Status': 'Tipo di Status', 'Conteggio': 'Numero chiamate'})
+            fig_non_answered.update_xaxes(tickangle=45)
+            st.plotly_chart(fig_non_answered, width='stretch')
+
+        # Analisi durate per i non-answered
+        st.write("**Analisi durate per chiamate non-answered:**")
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Con tempo di squillo", (non_answered['Ringing_sec'] > 0).sum())
+        col2.metric("Con tempo di conversazione", (non_answered['Talking_sec'] > 0).sum())
+        col3.metric("Senza durata", ((non_answered['Ringing_sec'] == 0) & (non_answered['Talking_sec'] == 0)).sum())
+
+        # Analisi per direzione dei non-answered
+        non_answered_by_direction = non_answered.groupby(['Direction', 'Status'], observed=True).size().reset_index(name='Count')
+        if len(non_answered_by_direction) > 0:
+            fig_direction_status = px.bar(non_answered_by_direction, x='Direction', y='Count', color='Status',
+                                        title='Chiamate non-answered per direzione e status',
+                                        barmode='stack')
+            st.plotly_chart(fig_direction_status, width='stretch')
+
+        # Campione di chiamate non-answered per analisi manuale
+        st.write("**Campione di chiamate non-answered (prime 10 per ogni status):**")
+        sample_non_answered = pd.DataFrame()
+        for status in non_answered['Status'].unique()[:5]:  # Prime 5 tipologie
+            status_sample = non_answered[non_answered['Status'] == status].head(10)
+            sample_non_answered = pd.concat([sample_non_answered, status_sample])
+
+        if not sample_non_answered.empty:
+            display_cols = ['Call Time', 'From', 'To', 'Direction', 'Status', 'Ringing', 'Talking']
+            if 'Call Activity Details' in sample_non_answered.columns:
+                display_cols.append('Call Activity Details')
+            st.dataframe(sample_non_answered[display_cols])
+
+    # Analisi chiamate "Answered" ma senza conversazione
+    answered_no_talk = df[(df['Status_clean'] == 'answered') & (df['Talking_sec'] == 0)]
+    st.write(f"🔍 **Chiamate 'Answered' ma senza conversazione**: {len(answered_no_talk)} ({len(answered_no_talk)/len(df)*100:.1f}%)")
+    st.write("*Queste sono chiamate che il sistema ha risposto ma senza tempo di conversazione - probabilmente abbandonate dal chiamante*")
+
+    # Distribuzione durate per chiamate "answered"
+    answered_calls = df[df['Status_clean'] == 'answered']
+    if len(answered_calls) > 0:
+        fig_duration = px.histogram(answered_calls, x='Talking_sec',
+                                  title='Distribuzione durata conversazioni (chiamate Answered)',
+                                  nbins=50,
+                                  labels={'Talking_sec': 'Durata conversazione (secondi)', 'count': 'Numero chiamate'})
+        st.plotly_chart(fig_duration, width='stretch')
+
+def render_concurrency(steps_df, selected_cube):
+    summary = concurrency_summary(steps_df)
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Picco chiamate contemporanee", summary['peak'])
+    col2.metric("Media chiamate contemporanee", f"{summary['mean']:.2f}")
+    col3.metric("Istante del picco", summary['peak_time'].strftime('%Y-%m-%d %H:%M:%S'))
+
+    render_concurrency_timeline(steps_df, key='full')
+
+    # DIMENSIONAMENTO LINEE: tutti i limiti da 1 al picco in un passaggio
+    st.subheader("📐 Dimensionamento linee (what-if)")
+    capacity_df = capacity_table(steps_df)
+    fig_capacity = px.line(capacity_df, x='Linee', y=['Chiamate_Bloccate_%', 'Tempo_Oltre_Limite_%'],
+                           markers=True, title='Chiamate bloccate e tempo oltre il limite per numero di linee')
+    st.plotly_chart(fig_capacity, width='stretch')
+    if st.toggle("Mostra tabella per numero di linee"):
+        st.dataframe(capacity_df)
+
+    trunk_lines = st.number_input("Linee disponibili (simulazione)", min_value=1,
+                                  max_value=max(summary['peak'], 1), value=max(summary['peak'] - 1, 1))
+    blocked_df = blocked_calls_by_period(steps_df, int(trunk_lines), '1h')
+    blocked_total = int(blocked_df['Chiamate_Bloccate'].sum())
+    st.write(f"**Con {int(trunk_lines)} linee:** {blocked_total} chiamate bloccate")
+    if blocked_total:
+        fig_blocked = px.bar(blocked_df[blocked_df['Chiamate_Bloccate'] > 0], x='Time', y='Chiamate_Bloccate',
+                             title=f'Chiamate bloccate per ora con {int(trunk_lines)} linee')
+        st.plotly_chart(fig_blocked, width='stretch')
+
+    st.write("**Erlang B / C per fascia oraria** (chiamate medie per ora e durata media di conversazione)")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        target_blocking = st.number_input("Blocco massimo linee (%)", min_value=0.1, max_value=20.0,
+                                          value=1.0, step=0.5)
+    with col2:
+        answer_sec = st.number_input("Risposta entro (secondi)", min_value=5, max_value=300, value=20, step=5)
+    with col3:
+        target_service = st.number_input("Livello di servizio (%)", min_value=50, max_value=99, value=80, step=5)
+    st.dataframe(erlang_table(selected_cube.hourly_traffic(), target_blocking / 100,
+                              answer_sec, target_service / 100))
+
+def render_grouped_concurrency(selection):
+    # Concorrenza per gruppo: un solo passaggio sugli eventi ordinati
+    group_options = {
+        'Direzione': 'Direction',
+        'Utente': 'User',
+        'Interno (numero)': 'User_Number',
+        'Trunk / Destinazione': 'Destination_Number',
+    }
+    col1, col2 = st.columns(2)
+    with col1:
+        group_label = st.selectbox("Raggruppa per", options=list(group_options))
+    with col2:
+        heatmap_freq = st.selectbox("Intervallo heat-map", options=['15min', '1h', '1D'], index=1)
+    group_key = group_options[group_label]
+
+    grouped_steps = grouped_concurrency_steps(selection.frame(['Call Time', 'End', group_key]), group_key)
+    grouped_summary = grouped_concurrency_summary(grouped_steps, group_key)
+    st.dataframe(grouped_summary)
+
+    # Heat-map gruppo × intervallo, limitata ai gruppi con il picco più alto
+    top_groups = grouped_summary.head(20).index
+    heatmap_steps = grouped_steps[grouped_steps[group_key].isin(top_groups)].copy()
+    heatmap_steps[group_key] = heatmap_steps[group_key].cat.remove_unused_categories()
+    heatmap_df = grouped_resample_concurrency(heatmap_steps, group_key, heatmap_freq)
+    heatmap_matrix = heatmap_df.pivot(index=group_key, columns='Time', values='Concurrent Calls')
+    heatmap_matrix = heatmap_matrix.reindex([g for g in top_groups if g in heatmap_matrix.index])
+    fig_heatmap = px.imshow(heatmap_matrix, aspect='auto', color_continuous_scale='Reds',
+                            labels={'x': 'Periodo', 'y': group_label, 'color': 'Picco'},
+                            title=f'Picco chiamate contemporanee per {group_label.lower()} ({heatmap_freq})')
+    st.plotly_chart(fig_heatmap, width='stretch')
+
+def render_durations(selection):
+    talk_df = selection.frame(['Real_Conversation', 'Talking_sec'])
+    talk_stats = conversation_stats(talk_df)
+    if not talk_stats:
+        st.write("Nessuna conversazione nella selezione.")
+        return
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Conversazioni totali", talk_stats['count'])
+    col2.metric("Durata media", f"{talk_stats['mean']:.0f} sec")
+    col3.metric("Durata mediana", f"{talk_stats['median']:.0f} sec")
+    col4.metric("Durata massima", f"{talk_stats['max']:.0f} sec")
+
+    # Distribuzione durate
+    conversations_only = talk_df[talk_df['Real_Conversation']]
+    fig_talk_dist = px.histogram(conversations_only, x='Talking_sec',
+                               title='Distribuzione durata conversazioni',
+                               nbins=30,
+                               labels={'Talking_sec': 'Durata (secondi)'})
+    st.plotly_chart(fig_talk_dist, width='stretch')
+
+def render_callbacks(df, frame_index, date_bounds):
+    # Solo il filtro per periodo: con i filtri per direzione, utente e
+    # ora le richiamate in uscita sparirebbero dalla selezione
+    callback_window = st.number_input("Finestra di richiamata (minuti)", min_value=1, max_value=7 * 24 * 60,
+                                      value=60, step=15)
+    period_df = frame_index.select(df, date_bounds[0], date_bounds[1]).frame([
+        'Call ID', 'Call Time', 'User', 'User_Number', 'Destination_Number',
+        'Is_Inbound', 'Is_Outbound', 'Other_Status', 'Real_Conversation',
+    ])
+    callbacks_df = missed_call_callbacks(period_df, int(callback_window))
+    callback_stats = callback_summary(callbacks_df)
+    if callback_stats['missed'] == 0:
+        st.write("Nessuna chiamata in entrata persa nel periodo selezionato.")
+    else:
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Chiamate in entrata perse", callback_stats['missed'])
+        col2.metric("Richiamate entro la finestra", callback_stats['called_back'],
+                    f"{callback_stats['callback_rate']:.1f}%")
+        col3.metric("Il chiamante ha riprovato", callback_stats['retried'])
+        col4.metric("Né richiamate né ritentate", callback_stats['unresolved'])
+
+        if callback_stats['called_back']:
+            st.write(f"**Tempo mediano alla richiamata:** {callback_stats['median_minutes']:.1f} min")
+            delay_df = callback_delay_table(callbacks_df)
+            fig_delay = px.bar(delay_df, x='Tempo_Alla_Richiamata', y='Richiamate',
+                               labels={'Tempo_Alla_Richiamata': 'Tempo alla richiamata'},
+                               title='Distribuzione del tempo alla richiamata')
+            st.plotly_chart(fig_delay, width='stretch')
+
+        st.write("**Chiamate perse non ancora richiamate:**")
+        st.dataframe(callbacks_df[~callbacks_df['Richiamata']].head(200))
+
+    st.subheader("🔁 Chiamanti ripetuti")
+    st.dataframe(repeat_callers(period_df, callbacks_df, int(callback_window)))
+
+def render_call_flow(df, selection, flows):
+    # CALL ACTIVITY DETAILS ANALYSIS
+    st.write("**Top 10 Activity Details:**")
+    st.dataframe(activity_table(df))
+
+    # Flusso di chiamata ricostruito dalle activity details della selezione
+    st.subheader("🔀 Flusso chiamate e trasferimenti")
+    flow_df = selection.frame(['Call ID', 'Call Activity Details', 'Talking_sec'])
+    flows = flows.take(selection.rows)
+    flow_calls = call_flow_table(flow_df, flows)
+    with_flow = flow_calls[flow_calls['Legs'] > 0]
+    if with_flow.empty:
+        st.write("Nessun percorso riconosciuto nelle activity details della selezione.")
+        return
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Chiamate con trasferimento", int((with_flow['Trasferimenti'] > 0).sum()))
+    col2.metric("Tratte medie per chiamata", f"{with_flow['Legs'].mean():.2f}")
+    col3.metric("Catena più lunga", int(with_flow['Legs'].max()))
+
+    chain_df = chain_length_table(flow_calls)
+    fig_chain = px.bar(chain_df, x='Legs', y='Chiamate',
+                       labels={'Legs': 'Tratte per chiamata', 'Chiamate': 'Numero chiamate'},
+                       title='Lunghezza delle catene di chiamata')
+    st.plotly_chart(fig_chain, width='stretch')
+
+    st.write("**Tempo gestito per interno** (conversazione divisa tra le tratte che l'hanno gestita):")
+    st.dataframe(extension_time_table(call_legs(flow_df, flows)))
+
+    queue_counts = with_flow['Coda'].value_counts().loc[lambda c: c > 0]
+    if len(queue_counts) > 0:
+        st.write("**Chiamate per coda / ring group:**")
+        st.dataframe(queue_counts.rename_axis('Coda').reset_index(name='Chiamate'))
+
+def render_exports(df, selection):
+    export_format = st.radio("Formato", export_formats(), horizontal=True, key="export_format",
+                             format_func=str.upper)
+    col1, col2 = st.columns(2)
+    with col1:
+        export_button("📄 Scarica dati filtrati", selection.chunks, "3cx_analisi_filtrati",
+                      export_format, key="export_filtered")
+    with col2:
+        export_button("📊 Scarica Breakdown Dettagliato", lambda: iter_chunks(breakdown_table(df)),
+                      "3cx_breakdown", export_format, key="export_breakdown")
+
+@st.fragment
+def render_filtered_analysis(df, cube, frame_index, data_key):
+    # Filtri e sezioni che ne dipendono: un cambio di filtro riesegue solo
+    # questo frammento, e ogni expander calcola il suo contenuto solo se aperto
+    with profiled_run("Analisi filtrata (riesecuzione del frammento)"):
+        filtered_analysis(df, cube, frame_index, data_key)
+
+def filtered_analysis(df, cube, frame_index, data_key):
+    st.subheader("📅 Analisi Temporale Avanzata")
+
+    # Filtri temporali
+    col1, col2 = st.columns(2)
+    with col1:
+        date_range = st.date_input("Seleziona periodo",
+                                 value=[df['Date'].min().date(), df['Date'].max().date()],
+                                 min_value=df['Date'].min().date(),
+                                 max_value=df['Date'].max().date())
+    with col2:
+        selected_directions = st.multiselect("Filtra per direzione",
+                                            options=frame_index.keys('Direction'),
+                                            default=frame_index.keys('Direction'))
+
+    st.subheader("👥 Analisi per Utente")
+    unique_users = sorted(frame_index.keys('User'))
+    selected_users = st.multiselect("Filtra per utente (From)", options=unique_users, default=None)
+
+    st.subheader("🕐 Analisi per Fascia Oraria")
+    hour_range = st.slider("Seleziona fascia oraria", 0, 23, (0, 23))
+
+    # Applica filtri: intervalli e indici di posizione sul DataFrame
+    # condiviso, le colonne si estraggono solo dove servono
+    date_bounds = date_range if len(date_range) == 2 else (None, None)
+    with span('filtri') as filter_span:
+        selection = frame_index.select(df, date_bounds[0], date_bounds[1], directions=selected_directions,
+                                       users=selected_users, hours=hour_range)
+
+        # Tabelle per periodo, direzione e utente dal cubo: nessuna scansione delle righe
+        selected_cube = cube.select(date_bounds[0], date_bounds[1], directions=selected_directions,
+                                    users=selected_users, hours=hour_range)
+        filter_span.set(rows=len(selection))
+
+    if selected_cube.total_calls == 0:
+        st.warning("⚠️ Nessuna chiamata trovata con i filtri selezionati.")
+        return
+
+    # Metriche per i dati filtrati
+    st.write(f"**Chiamate nella selezione**: {selected_cube.total_calls}")
+
+    with span('tabelle_dal_cubo'):
+        # Analisi pattern giornalieri
+        daily_stats = selected_cube.weekly_table()
+
+        st.subheader("📊 Pattern Settimanali")
+        st.dataframe(daily_stats)
+
+        fig_weekly = px.bar(daily_stats.reset_index(), x='DayOfWeek', y='Totale_Chiamate',
+                          title='Chiamate per giorno della settimana')
+        st.plotly_chart(fig_weekly, width='stretch')
+
+        st.subheader("📊 Chiamate per Ora del Giorno")
+        hourly_stats = selected_cube.hourly_table()
+
+        fig2 = px.bar(hourly_stats.reset_index(), x='Hour', y='Totale_Chiamate',
+                     labels={'Hour': 'Ora del giorno', 'Totale_Chiamate': 'Numero chiamate'},
+                     title='Distribuzione chiamate per ora')
+        st.plotly_chart(fig2, width='stretch')
+
+        # Top utenti DETTAGLIATO
+        st.subheader("🏆 Top Utenti - Analisi Dettagliata")
+        st.dataframe(selected_cube.user_table())
+
+    expander, is_open = lazy_expander("📈 Chiamate contemporanee e dimensionamento linee", key="section_concurrency")
+    if is_open:
+        with expander, span('sezione_concorrenza'):
+            # Concorrenza: valori esatti dalla funzione a gradini
+            steps_df = concurrency_steps(selection.column('Call Time'), selection.column('End'))
+            if steps_df.empty:
+                st.write("Nessuna chiamata con durata nella selezione.")
+            else:
+                render_concurrency(steps_df, selected_cube)
+
+    expander, is_open = lazy_expander("📶 Chiamate contemporanee per gruppo", key="section_grouped")
+    if is_open:
+        with expander, span('sezione_concorrenza_gruppi'):
+            render_grouped_concurrency(selection)
+
+    expander, is_open = lazy_expander("⏱️ Analisi Durata Chiamate Dettagliata", key="section_durations")
+    if is_open:
+        with expander, span('sezione_durate'):
+            render_durations(selection)
+
+    expander, is_open = lazy_expander("📞 Richiamate delle chiamate perse", key="section_callbacks")
+    if is_open:
+        with expander, span('sezione_richiamate'):
+            render_callbacks(df, frame_index, date_bounds)
+
+    if 'Call Activity Details' in df.columns:
+        expander, is_open = lazy_expander("📝 Analisi Call Activity Details", key="section_activity")
+        if is_open:
+            with expander, span('sezione_call_flow'):
+                with span('get_call_flows', rows=len(df)):
+                    flows = get_call_flows(data_key, df)
+                render_call_flow(df, selection, flows)
+
+    expander, is_open = lazy_expander("📋 Dati filtrati", key="section_table")
+    if is_open:
+        with expander, span('sezione_dati_filtrati'):
+            display_columns = ['Call Time', 'From', 'To', 'Direction', 'Status', 'Ringing', 'Talking', 'Real_Conversation']
+            if 'Call Activity Details' in df.columns:
+                display_columns.append('Call Activity Details')
+            st.dataframe(selection.frame(display_columns))
+
+    expander, is_open = lazy_expander("⬇️ Esporta i dati", key="section_export")
+    if is_open:
+        with expander, span('sezione_esporta'):
+            render_exports(df, selection)
+
+@st.cache_resource
+def get_incremental_store():
+    return IncrementalStore()
+
+def ingest_incremental(files, chunksize):
+    # I file su disco si riesaminano a ogni esecuzione (si legge solo la parte
+    # aggiunta); un file caricato si acquisisce una sola volta per sessione
+    store = get_incremental_store()
+    ingested = st.session_state.setdefault('incremental_uploads', set())
+    summaries = []
+    for file in files:
+        if not isinstance(file, str):
+            file_id = getattr(file, 'file_id', None) or id(file)
+            if file_id in ingested:
+                continue
+        summaries.append(store.ingest(file, source=None if isinstance(file, str) else source_name(file),
+                                      chunksize=chunksize))
+        if not isinstance(file, str):
+            ingested.add(file_id)
+    return store, summaries
+
+with profiled_run(f"Pagina completa ({analysis_mode})"):
+    if incremental_mode:
         try:
-            df['Call Time'] = pd.to_datetime(df['Call Time'], format=fmt, errors='raise')
-            st.success(f"✅ Formato data riconosciuto: {fmt}")
-            call_time_converted = True
-            break
-        except:
-            continue
-    
-    # Se nessun formato specifico funziona, prova il parsing automatico
-    if not call_time_converted:
+            with st.spinner("⏳ Acquisizione delle chiamate nuove..."):
+                with span('ingest_incremental'):
+                    store, summaries = ingest_incremental(sources, int(chunksize))
+            for summary in summaries:
+                st.info(f"📥 {os.path.basename(summary['source'])}: {summary['new_rows']} chiamate nuove, "
+                        f"{summary['skipped_rows']} già presenti, {summary['rows_dropped']} scartate per data non valida "
+                        f"({'solo parte aggiunta' if summary['tail_only'] else 'file completo'}, "
+                        f"{summary['seconds']:.2f} s)")
+            with st.expander("🗄️ Storico incrementale"):
+                st.caption(store.path)
+                st.dataframe(store.sources())
+                if st.button("🗑️ Svuota storico"):
+                    store.reset()
+                    st.session_state.pop('incremental_uploads', None)
+                    st.rerun()
+            with span('load_aggregates'):
+                aggregates = store.load_aggregates()
+            if aggregates.rows_read:
+                with span('render_streaming_dashboard', rows=aggregates.rows_read):
+                    render_streaming_dashboard(aggregates)
+            else:
+                st.info("📁 Storico vuoto: carica uno o più file CSV (o indica una cartella) per iniziare.")
+        except Exception as e:
+            st.error(f"❌ Errore durante l'acquisizione incrementale: {str(e)}")
+            import traceback
+            st.code(traceback.format_exc())
+
+    elif sources and streaming_mode:
         try:
-            df['Call Time'] = pd.to_datetime(df['Call Time'], errors='coerce', infer_datetime_format=True)
-            st.warning("⚠️ Usato parsing automatico per le date. Controlla i risultati.")
-            call_time_converted = True
+            with st.spinner("⏳ Lettura a blocchi del file in corso..."):
+                with span('load_streaming_aggregates'):
+                    aggregates = load_streaming_aggregates(sources, int(chunksize))
+            with span('render_streaming_dashboard', rows=aggregates.rows_read):
+                render_streaming_dashboard(aggregates)
         except Exception as e:
-            st.error(f"❌ Impossibile convertire la colonna Call Time: {str(e)}")
-            st.stop()
-    
-    # Rimuovi le righe con date non valide
-    before_dropna = len(df)
-    df = df.dropna(subset=['Call Time'])
-    after_dropna = len(df)
-    
-    if before_dropna != after_dropna:
-        st.warning(f"⚠️ Rimosse {before_dropna - after_dropna} righe con date non valide")
+            st.error(f"❌ Errore durante l'elaborazione del file: {str(e)}")
+            import traceback
+            st.code(traceback.format_exc())
 
-    def duration_to_seconds(s):
-        if pd.isna(s) or s == '' or s is None:
-            return 0
+    elif sources:
         try:
-            # Gestisce formati come "00:05:30" o "5:30" o "30"
-            s = str(s).strip()
-            if ':' in s:
-                parts = s.split(':')
-                if len(parts) == 3:  # HH:MM:SS
-                    hours, minutes, seconds = map(int, parts)
-                    return hours * 3600 + minutes * 60 + seconds
-                elif len(parts) == 2:  # MM:SS
-                    minutes, seconds = map(int, parts)
-                    return minutes * 60 + seconds
-            else:
-                # Solo secondi
-                return int(float(s))
-        except:
-            return 0
-
-    with st.spinner("⏳ Elaborazione colonne Ringing e Talking..."):
-        df['Ringing_sec'] = df['Ringing'].fillna("00:00:00").apply(duration_to_seconds)
-        df['Talking_sec'] = df['Talking'].fillna("00:00:00").apply(duration_to_seconds)
-        df['Total_Duration_sec'] = df['Ringing_sec'] + df['Talking_sec']
-        df['Start'] = df['Call Time']
-        df['End'] = df['Start'] + pd.to_timedelta(df['Total_Duration_sec'], unit='s')
-
-    # Analisi temporale
-    df['Hour'] = df['Call Time'].dt.hour
-    df['Date'] = df['Call Time'].dt.date
-    df['DayOfWeek'] = df['Call Time'].dt.day_name()
-    df['Week'] = df['Call Time'].dt.isocalendar().week
-    df['Month'] = df['Call Time'].dt.month
-    
-    # Adatta alle nuove colonne: usa 'From' invece di 'Caller ID'
-    try:
-        # Estrae il nome/numero dalla colonna From (formato: "59004 Cassa 04 (59004)")
-        df['User'] = df['From'].str.extract(r'(.*?)\s*\(.*?\)')[0].fillna(df['From'])
-        df['User_Number'] = df['From'].str.extract(r'\((.*?)\)')[0].fillna("Unknown")
-    except:
-        df['User'] = df['From'].fillna("Unknown")
-        df['User_Number'] = "Unknown"
-
-    # Crea campo destination dalla colonna To
-    try:
-        df['Destination'] = df['To'].str.extract(r'(.*?)\s*\(.*?\)')[0].fillna(df['To'])
-        df['Destination_Number'] = df['To'].str.extract(r'\((.*?)\)')[0].fillna("Unknown")
-    except:
-        df['Destination'] = df['To'].fillna("Unknown")
-        df['Destination_Number'] = "Unknown"
-
-    # Analisi avanzata degli status
-    df['Status_clean'] = df['Status'].str.lower().str.strip()
-    
-    # Categorizzazione più dettagliata
-    df['Is_Internal'] = df['Direction'].str.lower() == 'internal'
-    df['Is_Inbound'] = df['Direction'].str.lower() == 'inbound' 
-    df['Is_Outbound'] = df['Direction'].str.lower() == 'outbound'
-    
-    # Analisi dettagliata dello status
-    df['Is_Answered'] = df['Status_clean'].isin(['answered', 'connected'])
-    df['Is_Missed'] = df['Status_clean'].isin(['missed', 'unanswered', 'no answer'])
-    df['Is_Busy'] = df['Status_clean'].isin(['busy', 'user busy'])
-    df['Is_Failed'] = df['Status_clean'].isin(['failed', 'error', 'rejected'])
-    df['Is_Abandoned'] = df['Status_clean'].isin(['abandoned', 'caller hangup'])
-    
-    # Analisi durata per categorizzare meglio
-    df['Has_Talking_Time'] = df['Talking_sec'] > 0
-    df['Has_Only_Ringing'] = (df['Ringing_sec'] > 0) & (df['Talking_sec'] == 0)
-    df['No_Duration'] = (df['Ringing_sec'] == 0) & (df['Talking_sec'] == 0)
-    
-    # Categorizzazione corretta basata sui dati reali
-    df['Real_Conversation'] = (df['Status_clean'] == 'answered') & (df['Talking_sec'] > 0)
-    df['Likely_Abandoned'] = (df['Status_clean'] == 'answered') & (df['Talking_sec'] == 0)
-    df['Other_Status'] = df['Status_clean'] != 'answered'
-    
-    # Considera come trasferiti quelli con activity details che contengono "transfer" o "forward"
-    if 'Call Activity Details' in df.columns:
-        df['Is_Transferred'] = df['Call Activity Details'].str.lower().str.contains("transfer|forward", na=False)
-        df['Ended_By_Caller'] = df['Call Activity Details'].str.lower().str.contains("ended by.*\(", na=False)
-    else:
-        df['Is_Transferred'] = False
-        df['Ended_By_Caller'] = False
+            with st.spinner("⏳ Elaborazione del file in corso..."):
+                with span('load_and_process_data') as load_span:
+                    df, load_info = load_and_process_data(sources)
+                    load_span.set(rows=len(df))
+                with span('get_cube', rows=len(df)):
+                    cube = get_cube(dataset_key(sources), df)
+                with span('get_frame_index', rows=len(df)):
+                    frame_index = get_frame_index(dataset_key(sources), df)
+            show_load_info(load_info)
+            if st.toggle("🐛 Mostra sezioni di debug", key="show_debug"):
+                with span('sezione_debug'):
+                    show_debug_info(df, load_info)
 
-    return df
+            st.subheader("📈 Statistiche Generali Avanzate")
+            col1, col2, col3, col4, col5, col6 = st.columns(6)
 
-def calculate_concurrency(df, freq='1min'):
-    if df.empty:
-        return pd.DataFrame(columns=['Time', 'Concurrent Calls'])
-    
-    time_points = pd.date_range(start=df['Start'].min(), end=df['End'].max(), freq=freq)
-    intervals = pd.IntervalIndex.from_arrays(df['Start'], df['End'], closed='both')
-
-    concurrency = []
-    progress_text = "Calcolo delle chiamate contemporanee in corso..."
-    my_bar = st.progress(0, text=progress_text)
-
-    for i, t in enumerate(time_points):
-        count = intervals.contains(t).sum()
-        concurrency.append((t, count))
-        if i % 10 == 0 or i == len(time_points) - 1:
-            my_bar.progress((i + 1) / len(time_points), text=progress_text)
-    my_bar.empty()
-
-    concurrency_df = pd.DataFrame(concurrency, columns=['Time', 'Concurrent Calls'])
-    return concurrency_df
-
-if uploaded_file:
-    try:
-        df = load_and_process_data(uploaded_file)
-        
-        # ANALISI AVANZATA DEGLI STATUS
-        st.subheader("🔍 Analisi Dettagliata degli Status")
-        
-        # Mostra tutti gli status unici trovati nel dataset
-        unique_statuses = df['Status'].value_counts()
-        st.write("**Status trovati nel dataset:**")
-        status_df = pd.DataFrame({
-            'Status': unique_statuses.index,
-            'Conteggio': unique_statuses.values,
-            'Percentuale': (unique_statuses.values / len(df) * 100).round(2)
-        })
-        st.dataframe(status_df)
-        
-        # DEBUG: Mostra le prime righe con status non-answered
-        st.subheader("🐛 DEBUG: Analisi Status Non-Answered")
-        non_answered_debug = df[df['Status_clean'] != 'answered']
-        st.write(f"**Trovate {len(non_answered_debug)} chiamate con status non-answered**")
-        
-        if len(non_answered_debug) > 0:
-            st.write("**Primi 10 esempi di chiamate non-answered:**")
-            debug_cols = ['Call Time', 'From', 'To', 'Direction', 'Status', 'Status_clean', 'Ringing', 'Talking']
-            if 'Call Activity Details' in non_answered_debug.columns:
-                debug_cols.append('Call Activity Details')
-            st.dataframe(non_answered_debug[debug_cols].head(10))
-            
-            # Mostra i valori unici degli status
-            st.write("**Status originali unici (non-answered):**")
-            unique_non_answered = non_answered_debug['Status'].value_counts()
-            st.write(unique_non_answered)
-            
-            st.write("**Status_clean unici (non-answered):**")
-            unique_clean_non_answered = non_answered_debug['Status_clean'].value_counts()
-            st.write(unique_clean_non_answered)
-            
-            # Verifica se ci sono valori null
-            st.write("**Verifica valori null negli status:**")
-            st.write(f"Status null: {non_answered_debug['Status'].isnull().sum()}")
-            st.write(f"Status vuoti: {(non_answered_debug['Status'] == '').sum()}")
-        else:
-            st.write("⚠️ Strano: il conteggio dice 2348 ma il filtro non trova niente!")
-            st.write("Verifichiamo la colonna Status...")
-            st.write("**Tutti gli status nel dataset:**")
-            st.write(df['Status'].value_counts(dropna=False))
-        
-        # ANALISI APPROFONDITA DEI NON-ANSWERED
-        non_answered = df[df['Status_clean'] != 'answered']
-        if len(non_answered) > 0:
-            st.subheader("🔍 APPROFONDIMENTO: Chiamate NON-Answered")
-            st.write(f"**Totale chiamate non-answered: {len(non_answered)} ({len(non_answered)/len(df)*100:.1f}%)**")
-            
-            # Status dettagliato per i non-answered
-            non_answered_status = non_answered['Status'].value_counts()
-            st.write("**Breakdown dettagliato degli status non-answered:**")
-            non_answered_df = pd.DataFrame({
-                'Status': non_answered_status.index,
-                'Conteggio': non_answered_status.values,
-                'Percentuale_del_Totale': (non_answered_status.values / len(df) * 100).round(2),
-                'Percentuale_dei_NonAnswered': (non_answered_status.values / len(non_answered) * 100).round(2)
-            })
-            st.dataframe(non_answered_df)
-            
-            # Grafico a barre per i non-answered
-            if len(non_answered_status) > 0:
-                fig_non_answered = px.bar(non_answered_df, x='Status', y='Conteggio',
-                                        title='Distribuzione degli status non-answered',
-                                        labels={'Status': 'Tipo di Status', 'Conteggio': 'Numero chiamate'})
-                fig_non_answered.update_xaxes(tickangle=45)
-                st.plotly_chart(fig_non_answered, use_container_width=True)
-            
-            # Analisi durate per i non-answered
-            st.write("**Analisi durate per chiamate non-answered:**")
-            col1, col2, col3 = st.columns(3)
-            col1.metric("Con tempo di squillo", (non_answered['Ringing_sec'] > 0).sum())
-            col2.metric("Con tempo di conversazione", (non_answered['Talking_sec'] > 0).sum())
-            col3.metric("Senza durata", ((non_answered['Ringing_sec'] == 0) & (non_answered['Talking_sec'] == 0)).sum())
-            
-            # Analisi per direzione dei non-answered
-            non_answered_by_direction = non_answered.groupby(['Direction', 'Status']).size().reset_index(name='Count')
-            if len(non_answered_by_direction) > 0:
-                fig_direction_status = px.bar(non_answered_by_direction, x='Direction', y='Count', color='Status',
-                                            title='Chiamate non-answered per direzione e status',
-                                            barmode='stack')
-                st.plotly_chart(fig_direction_status, use_container_width=True)
-            
-            # Campione di chiamate non-answered per analisi manuale
-            st.write("**Campione di chiamate non-answered (prime 10 per ogni status):**")
-            sample_non_answered = pd.DataFrame()
-            for status in non_answered['Status'].unique()[:5]:  # Prime 5 tipologie
-                status_sample = non_answered[non_answered['Status'] == status].head(10)
-                sample_non_answered = pd.concat([sample_non_answered, status_sample])
-            
-            if not sample_non_answered.empty:
-                display_cols = ['Call Time', 'From', 'To', 'Direction', 'Status', 'Ringing', 'Talking']
-                if 'Call Activity Details' in sample_non_answered.columns:
-                    display_cols.append('Call Activity Details')
-                st.dataframe(sample_non_answered[display_cols])
-        
-        # Analisi chiamate "Answered" ma senza conversazione
-        answered_no_talk = df[(df['Status_clean'] == 'answered') & (df['Talking_sec'] == 0)]
-        st.write(f"🔍 **Chiamate 'Answered' ma senza conversazione**: {len(answered_no_talk)} ({len(answered_no_talk)/len(df)*100:.1f}%)")
-        st.write("*Queste sono chiamate che il sistema ha risposto ma senza tempo di conversazione - probabilmente abbandonate dal chiamante*")
-        
-        # Distribuzione durate per chiamate "answered"
-        answered_calls = df[df['Status_clean'] == 'answered']
-        if len(answered_calls) > 0:
-            fig_duration = px.histogram(answered_calls, x='Talking_sec', 
-                                      title='Distribuzione durata conversazioni (chiamate Answered)',
-                                      nbins=50, 
-                                      labels={'Talking_sec': 'Durata conversazione (secondi)', 'count': 'Numero chiamate'})
-            st.plotly_chart(fig_duration, use_container_width=True)
-        
-        st.subheader("📈 Statistiche Generali Avanzate")
-        col1, col2, col3, col4, col5, col6 = st.columns(6)
-        
-        total_calls = len(df)
-        answered_calls_count = (df['Status_clean'] == 'answered').sum()
-        real_conversations = df['Real_Conversation'].sum()
-        likely_abandoned = df['Likely_Abandoned'].sum()
-        other_status = df['Other_Status'].sum()
-        transferred_calls = df['Is_Transferred'].sum()
-        
-        col1.metric("Totale Chiamate", total_calls)
-        col2.metric("Status 'Answered'", answered_calls_count)
-        col3.metric("Conversazioni Reali", real_conversations)
-        col4.metric("Abbandonate (0 sec talking)", likely_abandoned)
-        col5.metric("Altri Status", other_status)
-        col6.metric("Trasferite", transferred_calls)
-        
-        # BREAKDOWN DETTAGLIATO
-        st.subheader("📊 Breakdown Dettagliato delle chiamate")
-        
-        breakdown_data = {
-            'Categoria': [
-                'Conversazioni reali (answered + talking > 0)',
-                'Answered ma senza conversazione (0 sec talking)',
-                'Altri status (non answered)',
-                'TOTALE'
-            ],
-            'Conteggio': [
-                real_conversations,
-                likely_abandoned,
-                other_status,
-                total_calls
-            ]
-        }
-        
-        breakdown_df = pd.DataFrame(breakdown_data)
-        breakdown_df['Percentuale'] = (breakdown_df['Conteggio'] / total_calls * 100).round(1)
-        
-        st.dataframe(breakdown_df)
-        
-        # Grafico a torta del breakdown
-        fig_pie = px.pie(breakdown_df[:-1], values='Conteggio', names='Categoria', 
-                        title='Distribuzione dettagliata delle chiamate')
-        st.plotly_chart(fig_pie, use_container_width=True)
-
-        # ANALISI PER DIREZIONE
-        st.subheader("📊 Analisi per Direzione")
-        direction_stats = df.groupby('Direction').agg({
-            'Call ID': 'count',
-            'Real_Conversation': 'sum',
-            'Talking_sec': 'mean',
-            'Ringing_sec': 'mean'
-        }).round(2)
-        direction_stats.columns = ['Totale', 'Conversazioni_Reali', 'Durata_Media_Talking', 'Durata_Media_Ringing']
-        direction_stats['Tasso_Conversazione_%'] = (direction_stats['Conversazioni_Reali'] / direction_stats['Totale'] * 100).round(1)
-        st.dataframe(direction_stats)
-
-        # Distribuzione per direzione
-        direction_counts = df['Direction'].value_counts()
-        fig_direction = px.pie(values=direction_counts.values, names=direction_counts.index, 
-                              title="Distribuzione per tipo di chiamata")
-        st.plotly_chart(fig_direction, use_container_width=True)
-
-        # ANALISI TEMPORALE AVANZATA
-        st.subheader("📅 Analisi Temporale Avanzata")
-        
-        # Filtri temporali
-        col1, col2 = st.columns(2)
-        with col1:
-            date_range = st.date_input("Seleziona periodo", 
-                                     value=[df['Date'].min(), df['Date'].max()],
-                                     min_value=df['Date'].min(),
-                                     max_value=df['Date'].max())
-        with col2:
-            selected_directions = st.multiselect("Filtra per direzione", 
-                                                options=df['Direction'].unique(),
-                                                default=df['Direction'].unique())
-        
-        # Applica filtri
-        if len(date_range) == 2:
-            mask = (df['Date'] >= date_range[0]) & (df['Date'] <= date_range[1])
-            filtered_df = df[mask]
-        else:
-            filtered_df = df.copy()
-            
-        filtered_df = filtered_df[filtered_df['Direction'].isin(selected_directions)]
-
-        st.subheader("👥 Analisi per Utente")
-        unique_users = sorted(df['User'].unique())
-        selected_users = st.multiselect("Filtra per utente (From)", options=unique_users, default=None)
-        if selected_users:
-            filtered_df = filtered_df[filtered_df['User'].isin(selected_users)]
-
-        st.subheader("🕐 Analisi per Fascia Oraria")
-        hour_range = st.slider("Seleziona fascia oraria", 0, 23, (0, 23))
-        filtered_df = filtered_df[(filtered_df['Hour'] >= hour_range[0]) & (filtered_df['Hour'] <= hour_range[1])]
-
-        if filtered_df.empty:
-            st.warning("⚠️ Nessuna chiamata trovata con i filtri selezionati.")
-        else:
-            # Metriche per i dati filtrati
-            st.write(f"**Chiamate nella selezione**: {len(filtered_df)}")
-            
-            # Analisi pattern giornalieri
-            daily_stats = filtered_df.groupby('DayOfWeek').agg({
-                'Call ID': 'count',
-                'Real_Conversation': 'sum',
-                'Talking_sec': 'mean'
-            }).round(2)
-            daily_stats.columns = ['Totale_Chiamate', 'Conversazioni', 'Durata_Media']
-            
-            # Riordina i giorni della settimana
-            day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-            daily_stats = daily_stats.reindex([d for d in day_order if d in daily_stats.index])
-            
-            st.subheader("📊 Pattern Settimanali")
-            st.dataframe(daily_stats)
-            
-            fig_weekly = px.bar(daily_stats.reset_index(), x='DayOfWeek', y='Totale_Chiamate',
-                              title='Chiamate per giorno della settimana')
-            st.plotly_chart(fig_weekly, use_container_width=True)
-            
-            # Concorrenza
-            concurrency_df = calculate_concurrency(filtered_df)
-            
-            if not concurrency_df.empty:
-                peak = concurrency_df['Concurrent Calls'].max()
-                mean = concurrency_df['Concurrent Calls'].mean()
-
-                col1, col2 = st.columns(2)
-                col1.metric("Picco chiamate contemporanee", peak)
-                col2.metric("Media chiamate contemporanee", f"{mean:.2f}")
-
-                fig = px.line(concurrency_df, x='Time', y='Concurrent Calls', 
-                             title='Chiamate contemporanee nel tempo')
-                st.plotly_chart(fig, use_container_width=True)
-
-            st.subheader("📊 Chiamate per Ora del Giorno")
-            hourly_stats = filtered_df.groupby('Hour').agg({
-                'Call ID': 'count',
-                'Real_Conversation': 'sum',
-                'Talking_sec': 'mean'
-            }).round(2)
-            
-            fig2 = px.bar(hourly_stats.reset_index(), x='Hour', y='Call ID',
-                         labels={'Hour': 'Ora del giorno', 'Call ID': 'Numero chiamate'},
-                         title='Distribuzione chiamate per ora')
-            st.plotly_chart(fig2, use_container_width=True)
-
-            # Analisi durata chiamate dettagliata
-            st.subheader("⏱️ Analisi Durata Chiamate Dettagliata")
-            
-            conversations_only = filtered_df[filtered_df['Real_Conversation']]
-            if len(conversations_only) > 0:
-                col1, col2, col3, col4 = st.columns(4)
-                col1.metric("Conversazioni totali", len(conversations_only))
-                col2.metric("Durata media", f"{conversations_only['Talking_sec'].mean():.0f} sec")
-                col3.metric("Durata mediana", f"{conversations_only['Talking_sec'].median():.0f} sec")
-                col4.metric("Durata massima", f"{conversations_only['Talking_sec'].max():.0f} sec")
-                
-                # Distribuzione durate
-                fig_talk_dist = px.histogram(conversations_only, x='Talking_sec',
-                                           title='Distribuzione durata conversazioni',
-                                           nbins=30,
-                                           labels={'Talking_sec': 'Durata (secondi)'})
-                st.plotly_chart(fig_talk_dist, use_container_width=True)
-
-            # Top utenti DETTAGLIATO
-            st.subheader("🏆 Top Utenti - Analisi Dettagliata")
-            user_detailed_stats = filtered_df.groupby('User').agg({
-                'Call ID': 'count',
-                'Real_Conversation': 'sum',
-                'Talking_sec': ['mean', 'sum'],
-                'Ringing_sec': 'mean',
-                'Is_Internal': 'sum',
-                'Is_Inbound': 'sum',
-                'Is_Outbound': 'sum'
-            }).round(2)
-            
-            # Flatten column names
-            user_detailed_stats.columns = [
-                'Totale_Chiamate', 'Conversazioni_Reali', 'Durata_Media_Sec', 'Durata_Totale_Sec', 
-                'Tempo_Risposta_Medio', 'Chiamate_Interne', 'Chiamate_In_Entrata', 'Chiamate_In_Uscita'
-            ]
-            
-            user_detailed_stats['Tasso_Risposta_%'] = (
-                user_detailed_stats['Conversazioni_Reali'] / user_detailed_stats['Totale_Chiamate'] * 100
-            ).round(1)
-            
-            user_detailed_stats['Durata_Totale_Min'] = (user_detailed_stats['Durata_Totale_Sec'] / 60).round(1)
-            
-            user_detailed_stats = user_detailed_stats.sort_values('Totale_Chiamate', ascending=False).head(15)
-            st.dataframe(user_detailed_stats)
-
-            # CALL ACTIVITY DETAILS ANALYSIS
-            if 'Call Activity Details' in df.columns:
-                st.subheader("📝 Analisi Call Activity Details")
-                activity_analysis = df['Call Activity Details'].value_counts().head(10)
-                st.write("**Top 10 Activity Details:**")
-                st.dataframe(activity_analysis)
-
-            st.subheader("📋 Dati filtrati")
-            with st.expander("Mostra tabella dettagliata"):
-                display_columns = ['Call Time', 'From', 'To', 'Direction', 'Status', 'Ringing', 'Talking', 'Real_Conversation']
-                if 'Call Activity Details' in filtered_df.columns:
-                    display_columns.append('Call Activity Details')
-                
-                st.dataframe(filtered_df[display_columns])
-
-            st.subheader("⬇️ Esporta i dati")
-            
-            col1, col2 = st.columns(2)
-            with col1:
-                csv_export = filtered_df.to_csv(index=False).encode('utf-8')
-                st.download_button(
-                    label="📄 Scarica CSV filtrato",
-                    data=csv_export,
-                    file_name=f"3cx_analisi_filtrati_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
-                    mime="text/csv"
-                )
-            
-            with col2:
-                # Export del breakdown dettagliato
-                breakdown_export = breakdown_df.to_csv(index=False).encode('utf-8')
-                st.download_button(
-                    label="📊 Scarica Breakdown Dettagliato",
-                    data=breakdown_export,
-                    file_name=f"3cx_breakdown_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
-                    mime="text/csv"
-                )
-            
-    except Exception as e:
-        st.error(f"❌ Errore durante l'elaborazione del file: {str(e)}")
-        import traceback
-        st.code(traceback.format_exc())
-        st.write("**Suggerimenti per risolvere il problema:**")
-        st.write("1. Verifica che il file CSV sia correttamente formattato")
-        st.write("2. Controlla che la colonna 'Call Time' contenga date valide")
-        st.write("3. Assicurati che il file non sia danneggiato")
-
-else:
-    st.info("📁 Carica un file CSV per iniziare l'analisi avanzata.")
-    st.write("**🚀 Funzionalità di analisi corrette:**")
-    st.write("✅ **Breakdown accurato**: Conversazioni reali vs abbandonate vs altri status")
-    st.write("✅ **Nessuna supposizione**: Solo dati reali dal CSV")
-    st.write("✅ **Tutte le durate valide**: 5 sec o 500 sec = conversazioni reali")
-    st.write("✅ **Analisi status dettagliata**: Tutti gli status trovati nel tuo CSV")
-    st.write("✅ **Metriche utente precise**: Basate sui dati reali")
-    st.write("✅ **Filtri multipli**: Periodo, direzione, utente, ora")
+            counts = breakdown_counts(df)
+            col1.metric("Totale Chiamate", counts['total'])
+            col2.metric("Status 'Answered'", counts['answered'])
+            col3.metric("Conversazioni Reali", counts['real_conversations'])
+            col4.metric("Abbandonate (0 sec talking)", counts['likely_abandoned'])
+            col5.metric("Altri Status", counts['other_status'])
+            col6.metric("Trasferite", counts['transferred'])
+
+            # Ogni scheda viene calcolata solo quando è quella aperta
+            tab_filtered, tab_overview, tab_non_answered = st.tabs(
+                ["📅 Analisi filtrata", "📊 Panoramica status", "🔍 Non-answered"],
+                on_change="rerun", key="dashboard_tab")
+            if tab_filtered.open:
+                with tab_filtered, span('scheda_analisi_filtrata'):
+                    render_filtered_analysis(df, cube, frame_index, dataset_key(sources))
+            if tab_overview.open:
+                with tab_overview, span('scheda_panoramica'):
+                    render_overview(df, cube)
+            if tab_non_answered.open:
+                with tab_non_answered, span('scheda_non_answered'):
+                    render_non_answered(df)
+
+        except Exception as e:
+            st.error(f"❌ Errore durante l'elaborazione del file: {str(e)}")
+            import traceback
+            st.code(traceback.format_exc())
+            st.write("**Suggerimenti per risolvere il problema:**")
+            st.write("1. Verifica che il file CSV sia correttamente formattato")
+            st.write("2. Controlla che la colonna 'Call Time' contenga date valide")
+            st.write("3. Assicurati che il file non sia danneggiato")
+
+    else:
+        st.info("📁 Carica uno o più file CSV (o indica una cartella) per iniziare l'analisi avanzata.")
+        st.write("**🚀 Funzionalità di analisi corrette:**")
+        st.write("✅ **Breakdown accurato**: Conversazioni reali vs abbandonate vs altri status")
+        st.write("✅ **Nessuna supposizione**: Solo dati reali dal CSV")
+        st.write("✅ **Tutte le durate valide**: 5 sec o 500 sec = conversazioni reali")
+        st.write("✅ **Analisi status dettagliata**: Tutti gli status trovati nel tuo CSV")
+        st.write("✅ **Metriche utente precise**: Basate sui dati reali")
+        st.write("✅ **Filtri multipli**: Periodo, direzione, utente, ora")
     
-    st.write("**📋 Formato CSV supportato:**")
-    st.write("- **Call Time**: 2025-07-25T11:41:48")
-    st.write("- **From/To**: Utenti con formato 'Nome (Numero)'") 
-    st.write("- **Direction**: Internal/Inbound/Outbound")
-    st.write("- **Status**: Answered/Missed/etc.")
-    st.write("- **Talking/Ringing**: Durata HH:MM:SS")
-    st.write("- **Call Activity Details**: Dettagli opzionali")
+        st.write("**📋 Formato CSV supportato:**")
+        st.write("- **Call Time**: 2025-07-25T11:41:48")
+        st.write("- **From/To**: Utenti con formato 'Nome (Numero)'") 
+        st.write("- **Direction**: Internal/Inbound/Outbound")
+        st.write("- **Status**: Answered/Missed/etc.")
+        st.write("- **Talking/Ringing**: Durata HH:MM:SS")
+        st.write("- **Call Activity Details**: Dettagli opzionali")
+
+show_profiling_panel()
@@ -0,0 +1,75 @@
+# Logica di analisi dei log 3CX, indipendente dall'interfaccia Streamlit
+from .concurrency import (
+    concurrency_steps,
+    concurrency_steps_from_counts,
+    concurrency_summary,
+    resample_concurrency,
+    grouped_concurrency_steps,
+    grouped_concurrency_summary,
+    grouped_resample_concurrency,
+)
+from .parsing import (
+    DATE_FORMATS,
+    detect_datetime_format,
+    duration_to_seconds,
+    parse_activity_flags,
+    parse_call_times,
+    parse_durations,
+    parse_parties,
+)
+from .processing import PARSER_VERSION, derive_columns, process_calls
+from .cache import ParquetCache, file_digest, load_with_cache, process_and_cache
+from .multi import expand_sources, load_many, merge_calls
+from .schema import DAY_ORDER, compact_frame, memory_report
+from .store import SharedFrameStore
+from .stats import (
+    activity_table,
+    breakdown_counts,
+    breakdown_table,
+    conversation_stats,
+    direction_table,
+    hourly_table,
+    non_answered_status_table,
+    status_table,
+    summary_tables,
+    user_table,
+    weekly_table,
+)
+from .streaming import DEFAULT_CHUNKSIZE, StreamingAggregates, partial_aggregates, stream_csv
+from .incremental import IncrementalStore
+from .cube import CallCube, build_cube
+from .selection import FrameIndex, Selection
+from .callflow import (
+    CallFlows,
+    build_call_flows,
+    call_flow_table,
+    call_legs,
+    chain_length_table,
+    extension_time_table,
+)
+from .capacity import (
+    blocked_calls_by_period,
+    capacity_table,
+    erlang_b,
+    erlang_c,
+    erlang_table,
+    hourly_traffic,
+)
+from .pyramid import PYRAMID_LEVELS, ConcurrencyPyramid, build_pyramid, lttb
+from .callbacks import (
+    callback_delay_table,
+    callback_summary,
+    missed_call_callbacks,
+    normalize_numbers,
+    repeat_callers,
+)
+from .export import EXPORT_MIME, export_bytes, export_formats, iter_chunks, write_export
+from .profiling import (
+    Profiler,
+    current_profiler,
+    profiling,
+    record_cache,
+    report_cache_table,
+    report_table,
+    span,
+)
@@ -0,0 +1,309 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from . import parsing
+from .concurrency import concurrency_steps, concurrency_summary, grouped_concurrency_steps, resample_concurrency
+from .cube import build_cube
+from .processing import PARSER_VERSION, process_calls
+from .profiling import profiling, span
+from .selection import FrameIndex
+from .stats import (
+    activity_table,
+    breakdown_table,
+    direction_table,
+    hourly_table,
+    non_answered_status_table,
+    status_table,
+    user_table,
+    weekly_table,
+)
+from .synthetic import SYNTHETIC_VERSION, write_synthetic_csv
+
+# Benchmark riproducibile della pipeline su export sintetici:
+#
+#   python -m callanalyzer.benchmark --sizes 100000 1000000 -o prima.json
+#   python -m callanalyzer.benchmark --sizes 100000 1000000 -o dopo.json
+#   python -m callanalyzer.benchmark --compare prima.json dopo.json
+#
+# Per ogni dimensione viene generato (o riusato, con --data-dir) un CSV con
+# seed fisso e la pipeline viene eseguita per fasi: parse (lettura, date,
+# ordinamento), derive (colonne derivate e schema compatto), index (indici
+# dei filtri e cubo), filter (selezioni tipiche della dashboard), groupby
+# (tabelle aggregate) e concurrency (funzione a gradini e serie). I tempi
+# sono il migliore di --repeat esecuzioni senza tracemalloc; i picchi di
+# memoria vengono da un'esecuzione separata con tracemalloc attivo. Prima di
+# ogni esecuzione le cache di parsing in memoria vengono svuotate, così ogni
+# misura parte a freddo.
+#
+# Il JSON contiene anche ambiente (versioni, piattaforma, commit) e versioni
+# di parser e generatore, per confrontare solo risultati confrontabili.
+
+BENCHMARK_VERSION = '1'
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+STAGES = {
+    'parse': ('read_csv', 'parse_call_times', 'ordina_per_call_time'),
+    'derive': ('derive_columns', 'compact_frame'),
+    'index': ('index',),
+    'filter': ('filter',),
+    'groupby': ('groupby',),
+    'concurrency': ('concurrency',),
+}
+
+
+def _clear_caches():
+    parsing._FORMAT_CACHE.clear()
+    parsing._PARTY_CACHE.clear()
+    parsing._ACTIVITY_CACHE.clear()
+
+
+def _filter_cases(df):
+    # Selezioni tipiche della dashboard, ricavate dai dati (quindi stabili a parità di seed)
+    first, last = df['Date'].min(), df['Date'].max()
+    week_start = (first + (last - first) / 2).normalize()
+    top_users = df['User'].value_counts().head(5).index.tolist()
+    return [
+        {'start': week_start, 'end': week_start + pd.Timedelta(days=6)},
+        {'directions': ['Inbound']},
+        {'hours': (9, 17)},
+        {'users': top_users},
+        {'start': first, 'end': week_start, 'directions': ['Inbound', 'Outbound'], 'hours': (8, 12)},
+    ]
+
+
+def _run_pipeline(path):
+    df, info = process_calls(path)
+    cases = _filter_cases(df)
+
+    with span('index', rows=len(df)):
+        frame_index = FrameIndex(df)
+        cube = build_cube(df)
+
+    with span('filter', rows=len(df)):
+        for case in cases:
+            frame_index.select(df, **case).frame(['Call Time', 'End', 'Talking_sec', 'Direction'])
+            filtered = cube.select(**case)
+            filtered.weekly_table()
+            filtered.user_table()
+
+    with span('groupby', rows=len(df)):
+        status_table(df)
+        non_answered_status_table(df)
+        breakdown_table(df)
+        direction_table(df)
+        weekly_table(df)
+        hourly_table(df)
+        user_table(df)
+        activity_table(df)
+
+    with span('concurrency', rows=len(df)):
+        steps = concurrency_steps(df['Call Time'], df['End'])
+        concurrency_summary(steps)
+        resample_concurrency(steps, '1min')
+        grouped_concurrency_steps(df, 'Direction')
+
+    return info
+
+
+def _measure(path, memory):
+    _clear_caches()
+    with profiling(memory=memory, label=os.path.basename(path)) as profiler:
+        info = _run_pipeline(path)
+    report = profiler.to_dict()
+    top_level = [s for s in report['spans'] if s['depth'] == 0]
+    stages = {}
+    for stage, names in STAGES.items():
+        spans = [s for s in top_level if s['name'] in names]
+        stages[stage] = {
+            'seconds': sum(s['seconds'] for s in spans),
+            'peak_mb': max((s['peak_mb'] or 0 for s in spans), default=None) if memory else None,
+            'arrow_mb': max((s['arrow_mb'] or 0 for s in spans), default=None) if memory else None,
+        }
+    return stages, report, info
+
+
+def run_size(rows, data_dir, seed=0, repeat=3, memory=True, log=print):
+    path = os.path.join(data_dir, f'synthetic_v{SYNTHETIC_VERSION}_{rows}_s{seed}.csv')
+    generate_seconds = None
+    if not os.path.exists(path):
+        started = time.perf_counter()
+        write_synthetic_csv(path, rows, seed=seed)
+        generate_seconds = round(time.perf_counter() - started, 3)
+        log(f"  generato {os.path.basename(path)} in {generate_seconds:.1f}s")
+
+    timings = []
+    for i in range(repeat):
+        stages, report, info = _measure(path, memory=False)
+        timings.append(stages)
+        log(f"  esecuzione {i + 1}/{repeat}: {report['total_seconds']:.2f}s")
+    rows_loaded = info['rows_read'] - info['rows_dropped']
+
+    peaks = _measure(path, memory=True)[0] if memory else None
+    result_stages = {}
+    for stage in STAGES:
+        seconds = [t[stage]['seconds'] for t in timings]
+        best = min(seconds)
+        stage_rows = info['rows_read'] if stage == 'parse' else rows_loaded
+        result_stages[stage] = {
+            'seconds': round(best, 6),
+            'seconds_median': round(statistics.median(seconds), 6),
+            'rows_per_sec': round(stage_rows / best) if best else None,
+            'peak_mb': peaks[stage]['peak_mb'] if peaks else None,
+            'arrow_mb': peaks[stage]['arrow_mb'] if peaks else None,
+        }
+    return {
+        'rows': rows,
+        'rows_loaded': rows_loaded,
+        'csv_mb': round(os.path.getsize(path) / 1024 ** 2, 1),
+        'generate_seconds': generate_seconds,
+        'total_seconds': round(sum(s['seconds'] for s in result_stages.values()), 6),
+        'stages': result_stages,
+        'rss_peak_mb': report['rss_peak_mb'],
+    }
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True, timeout=5,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def environment():
+    try:
+        import pyarrow
+        pyarrow_version = pyarrow.__version__
+    except ImportError:
+        pyarrow_version = None
+    return {
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'pyarrow': pyarrow_version,
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'git_commit': _git_commit(),
+    }
+
+
+def run_benchmark(sizes=None, seed=0, repeat=3, memory=True, data_dir=None, label=None, log=print):
+    # Esegue il benchmark per ogni dimensione e restituisce il report (dizionario serializzabile in JSON)
+    sizes = sorted(sizes or DEFAULT_SIZES)
+    report = {
+        'benchmark_version': BENCHMARK_VERSION,
+        'parser_version': PARSER_VERSION,
+        'synthetic_version': SYNTHETIC_VERSION,
+        'label': label,
+        'created': pd.Timestamp.now().isoformat(timespec='seconds'),
+        'environment': environment(),
+        'config': {'sizes': sizes, 'seed': seed, 'repeat': repeat, 'memory': memory},
+        'results': [],
+    }
+    with tempfile.TemporaryDirectory(prefix='callanalyzer_bench_') as tmp_dir:
+        for rows in sizes:
+            log(f"⏱️ {rows} chiamate")
+            report['results'].append(run_size(rows, data_dir or tmp_dir, seed=seed, repeat=repeat,
+                                              memory=memory, log=log))
+    return report
+
+
+def results_table(report):
+    return pd.DataFrame([{
+        'Righe': result['rows'],
+        'Fase': stage,
+        'Secondi': stats['seconds'],
+        'Righe_Al_Sec': stats['rows_per_sec'],
+        'Memoria_Picco_MB': stats['peak_mb'],
+        'Arrow_MB': stats['arrow_mb'],
+    } for result in report['results'] for stage, stats in result['stages'].items()],
+        columns=['Righe', 'Fase', 'Secondi', 'Righe_Al_Sec', 'Memoria_Picco_MB', 'Arrow_MB'])
+
+
+def compare_reports(old, new):
+    # Tempi e memoria fase per fase per le dimensioni presenti in entrambi i report;
+    # Rapporto > 1 significa più lento nel nuovo
+    merged = results_table(old).merge(results_table(new), on=['Righe', 'Fase'], suffixes=('_Prima', '_Dopo'))
+    merged['Rapporto'] = (merged['Secondi_Dopo'] / merged['Secondi_Prima']).round(3)
+    return merged[['Righe', 'Fase', 'Secondi_Prima', 'Secondi_Dopo', 'Rapporto',
+                   'Memoria_Picco_MB_Prima', 'Memoria_Picco_MB_Dopo']]
+
+
+def _comparability_notes(old, new):
+    notes = []
+    for key in ('benchmark_version', 'parser_version', 'synthetic_version'):
+        if old.get(key) != new.get(key):
+            notes.append(f"{key}: {old.get(key)} -> {new.get(key)}")
+    if old['config']['seed'] != new['config']['seed']:
+        notes.append(f"seed: {old['config']['seed']} -> {new['config']['seed']}")
+    for key in ('python', 'pandas', 'numpy', 'pyarrow', 'platform'):
+        if old['environment'].get(key) != new['environment'].get(key):
+            notes.append(f"{key}: {old['environment'].get(key)} -> {new['environment'].get(key)}")
+    return notes
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m callanalyzer.benchmark',
+        description="Benchmark per fase della pipeline su export 3CX sintetici, con report JSON confrontabili.",
+    )
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="numeri di chiamate da misurare (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=0, help="seme del generatore (default: %(default)s)")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="esecuzioni per dimensione, si tiene la più veloce (default: %(default)s)")
+    parser.add_argument('--no-memory', action='store_true',
+                        help="salta l'esecuzione con tracemalloc per i picchi di memoria")
+    parser.add_argument('--data-dir', default=None,
+                        help="cartella dove generare e riusare i CSV sintetici (default: cartella temporanea)")
+    parser.add_argument('--label', default=None, help="etichetta salvata nel report (es. nome del branch)")
+    parser.add_argument('-o', '--output', default=None, help="file JSON del report")
+    parser.add_argument('--compare', nargs=2, metavar=('PRIMA', 'DOPO'), default=None,
+                        help="confronta due report JSON invece di eseguire il benchmark")
+    parser.add_argument('--max-ratio', type=float, default=None,
+                        help="con --compare esce con codice 1 se una fase è più lenta di questo rapporto")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    with pd.option_context('display.width', 200, 'display.max_columns', 20):
+        if args.compare:
+            with open(args.compare[0], encoding='utf-8') as fh:
+                old = json.load(fh)
+            with open(args.compare[1], encoding='utf-8') as fh:
+                new = json.load(fh)
+            for note in _comparability_notes(old, new):
+                print(f"⚠️ {note}", file=sys.stderr)
+            table = compare_reports(old, new)
+            print(table.to_string(index=False))
+            if args.max_ratio is not None and (table['Rapporto'] > args.max_ratio).any():
+                print(f"❌ fasi più lente di {args.max_ratio}x", file=sys.stderr)
+                return 1
+            return 0
+
+        if args.data_dir:
+            os.makedirs(args.data_dir, exist_ok=True)
+        report = run_benchmark(args.sizes, seed=args.seed, repeat=max(args.repeat, 1), memory=not args.no_memory,
+                               data_dir=args.data_dir, label=args.label)
+        print(results_table(report).to_string(index=False))
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as fh:
+                json.dump(report, fh, indent=2, default=str)
+            print(f"✅ Report salvato in {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
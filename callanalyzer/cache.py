@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # Windows: niente lock, restano le scritture atomiche
+    fcntl = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+from .processing import PARSER_VERSION, process_calls
+from .profiling import record_cache, span
+
+# Cache su disco dei log elaborati, indirizzata per contenuto.
+#
+# La chiave è l'hash del contenuto del file più la versione del parser, quindi
+# lo stesso export caricato di nuovo (anche dopo un riavvio, da un'altra
+# sessione o da un altro worker) viene letto dal Parquet in memory mapping
+# invece di essere rielaborato. Le scritture sono atomiche (file temporaneo +
+# rename) e l'eviction LRU per dimensione è serializzata da un lock su file,
+# così più processi sullo stesso host possono condividere la directory.
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', '3cx-call-analyzer')
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+_METADATA_KEY = b'callanalyzer'
+_HASH_BLOCK = 8 * 1024 ** 2
+
+
+def file_digest(file):
+    # Hash del contenuto di un percorso o di un file-like (la posizione viene ripristinata)
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f'parser-{PARSER_VERSION}\n'.encode())
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'rb') as fh:
+            for block in iter(lambda: fh.read(_HASH_BLOCK), b''):
+                digest.update(block)
+    elif hasattr(file, 'getbuffer'):
+        digest.update(file.getbuffer())
+    else:
+        position = file.tell()
+        file.seek(0)
+        for block in iter(lambda: file.read(_HASH_BLOCK), b''):
+            digest.update(block)
+        file.seek(position)
+    return digest.hexdigest()
+
+
+def load_with_cache(file, cache, key=None, source=None):
+    # Elabora il file passando dalla cache su disco; restituisce (df, info)
+    # con info['from_cache'] a indicare se è stato letto dalla cache
+    if key is None:
+        with span('file_digest'):
+            key = file_digest(file)
+    cached = None
+    if cache is not None:
+        with span('cache_disco_lettura'):
+            cached = cache.get(key)
+        record_cache('disco', cached is not None)
+    if cached is not None:
+        df, info = cached
+        return df, dict(info, from_cache=True)
+    return process_and_cache(file, cache, key, source=source)
+
+
+def process_and_cache(file, cache, key, source=None):
+    # Elabora il file e salva il risultato in cache, senza cercarlo prima:
+    # per chi ha già verificato il miss (load_many)
+    with span('process_calls') as process_span:
+        df, info = process_calls(file, source=source)
+        process_span.set(rows=len(df))
+    if cache is not None:
+        with span('cache_disco_scrittura', rows=len(df)):
+            cache.put(key, df, info)
+    return df, dict(info, from_cache=False)
+
+
+class ParquetCache:
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or os.environ.get('CALLANALYZER_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.max_bytes = int(max_bytes or os.environ.get('CALLANALYZER_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+        self.enabled = pq is not None
+        if self.enabled:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.parquet')
+
+    def _lock(self):
+        return _FileLock(os.path.join(self.directory, '.lock'))
+
+    def get(self, key):
+        # (DataFrame, info) se presente, altrimenti None
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            table = pq.read_table(path, memory_map=True)
+            # Aggiorna la data di ultimo uso per l'LRU
+            os.utime(path)
+        except (FileNotFoundError, OSError, pa.ArrowInvalid):
+            return None
+        metadata = table.schema.metadata or {}
+        info = json.loads(metadata.get(_METADATA_KEY, b'{}'))
+        return table.to_pandas(), info
+
+    def put(self, key, df, info):
+        if not self.enabled:
+            return
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[_METADATA_KEY] = json.dumps(info).encode()
+        table = table.replace_schema_metadata(metadata)
+
+        fd, tmp_path = tempfile.mkstemp(prefix=f'.{key}.', suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                pq.write_table(table, fh)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def entries(self):
+        # [(percorso, dimensione, ultimo uso)] dei file in cache
+        result = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.parquet'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            result.append((path, stat.st_size, stat.st_mtime))
+        return result
+
+    def evict(self):
+        # Rimuove i file usati meno di recente finché la cache rientra nel limite
+        if not self.enabled:
+            return
+        with self._lock():
+            entries = sorted(self.entries(), key=lambda entry: entry[2])
+            total = sum(size for _, size, _ in entries)
+            for path, size, _ in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    # Chi ha già il file in memory mapping continua a leggerlo
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+
+class _FileLock:
+
+    def __init__(self, path):
+        self.path = path
+        self._fh = None
+
+    def __enter__(self):
+        self._fh = open(self.path, 'a')
+        if fcntl is not None:
+            fcntl.flock(self._fh, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._fh, fcntl.LOCK_UN)
+        self._fh.close()
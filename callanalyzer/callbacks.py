@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+# Richiamate delle chiamate perse e chiamanti ripetuti.
+#
+# Per ogni chiamata in entrata non risposta si cerca, con merge_asof sulle
+# chiamate ordinate per Call Time, la prima chiamata in uscita verso lo stesso
+# numero (richiamata) e la prima nuova chiamata in entrata dallo stesso numero
+# (nuovo tentativo) entro la finestra indicata. I numeri vengono normalizzati
+# e confrontati come codici interi: il costo è O(N log N), non a coppie.
+
+DEFAULT_WINDOW_MINUTES = 60
+DELAY_BINS = [0, 5, 15, 30, 60, 120, 240, 480, 1440]
+
+
+def normalize_numbers(values):
+    # Solo cifre, senza prefisso internazionale "+" / "00"; NaN se non è un numero
+    values = pd.Series(values)
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    digits = pd.Series(np.asarray(uniques, dtype=object), dtype=object).astype(str)
+    digits = digits.str.strip().str.replace(r'^(\+|00)', '', regex=True).str.replace(r'[\s\-./()]', '', regex=True)
+    digits = digits.where(digits.str.fullmatch(r'\d+'))
+    lookup = np.append(digits.to_numpy(dtype=object), np.nan)
+    return pd.Series(lookup[codes], index=values.index, dtype=object)
+
+
+def _first_after(left, right, window):
+    # Per ogni riga di left la prima riga di right con lo stesso numero, strettamente dopo
+    # e al massimo `window` più tardi (left e right ordinati per Call Time)
+    return pd.merge_asof(
+        left, right, on='Call Time', by='Numero', direction='forward',
+        tolerance=window, allow_exact_matches=False,
+    )
+
+
+def missed_call_callbacks(df, window_minutes=DEFAULT_WINDOW_MINUTES):
+    # Una riga per chiamata in entrata non risposta, con richiamata e nuovo tentativo
+    window = pd.Timedelta(minutes=window_minutes)
+    df = df.sort_values('Call Time', kind='stable')
+    caller = normalize_numbers(df['User_Number'])
+    callee = normalize_numbers(df['Destination_Number'])
+    # Codici interi comuni a chiamanti e chiamati per la chiave di merge_asof
+    codes, _ = pd.factorize(pd.concat([caller, callee], ignore_index=True), use_na_sentinel=True)
+    caller_code, callee_code = codes[:len(df)], codes[len(df):]
+
+    inbound = df['Is_Inbound'].to_numpy() & (caller_code >= 0)
+    missed = inbound & df['Other_Status'].to_numpy()
+    outbound = df['Is_Outbound'].to_numpy() & (callee_code >= 0)
+
+    left = pd.DataFrame({
+        'Call ID': df['Call ID'].to_numpy()[missed],
+        'Call Time': df['Call Time'].to_numpy()[missed],
+        'Numero': caller_code[missed],
+    })
+    callbacks = pd.DataFrame({
+        'Call Time': df['Call Time'].to_numpy()[outbound],
+        'Numero': callee_code[outbound],
+        'Ora_Richiamata': df['Call Time'].to_numpy()[outbound],
+        'Richiamata_Da': df['User'].to_numpy()[outbound],
+        'Richiamata_Risposta': df['Real_Conversation'].to_numpy()[outbound],
+    })
+    retries = pd.DataFrame({
+        'Call Time': df['Call Time'].to_numpy()[inbound],
+        'Numero': caller_code[inbound],
+        'Ora_Nuovo_Tentativo': df['Call Time'].to_numpy()[inbound],
+        'Nuovo_Tentativo_Risposto': df['Real_Conversation'].to_numpy()[inbound],
+    })
+
+    result = _first_after(left, callbacks, window)
+    result = _first_after(result, retries, window)
+    result['Numero'] = caller.to_numpy()[missed]
+    result['Richiamata'] = result['Ora_Richiamata'].notna()
+    result['Minuti_Alla_Richiamata'] = ((result['Ora_Richiamata'] - result['Call Time']).dt.total_seconds() / 60).round(1)
+    result['Nuovo_Tentativo'] = result['Ora_Nuovo_Tentativo'].notna()
+    result['Minuti_Al_Nuovo_Tentativo'] = (
+        (result['Ora_Nuovo_Tentativo'] - result['Call Time']).dt.total_seconds() / 60).round(1)
+    result['Richiamata_Risposta'] = result['Richiamata_Risposta'].fillna(False).astype(bool)
+    result['Nuovo_Tentativo_Risposto'] = result['Nuovo_Tentativo_Risposto'].fillna(False).astype(bool)
+    return result[['Call ID', 'Call Time', 'Numero', 'Richiamata', 'Minuti_Alla_Richiamata', 'Richiamata_Da',
+                   'Richiamata_Risposta', 'Nuovo_Tentativo', 'Minuti_Al_Nuovo_Tentativo', 'Nuovo_Tentativo_Risposto']]
+
+
+def callback_summary(callbacks):
+    missed = len(callbacks)
+    called_back = int(callbacks['Richiamata'].sum())
+    retried = int(callbacks['Nuovo_Tentativo'].sum())
+    return {
+        'missed': missed,
+        'called_back': called_back,
+        'callback_rate': called_back / missed * 100 if missed else 0.0,
+        'retried': retried,
+        'unresolved': int((~callbacks['Richiamata'] & ~callbacks['Nuovo_Tentativo']).sum()),
+        'median_minutes': float(callbacks['Minuti_Alla_Richiamata'].median()) if called_back else None,
+    }
+
+
+def callback_delay_table(callbacks, bins=DELAY_BINS):
+    # Distribuzione del tempo alla richiamata per fasce di minuti
+    delays = callbacks['Minuti_Alla_Richiamata'].dropna()
+    if len(delays):
+        # La prima fascia esiste sempre, anche con tutti i ritardi a 0 minuti
+        edges = [bins[0]] + [b for b in bins[1:] if b < delays.max()] + [np.inf]
+    else:
+        edges = bins[:2]
+    labels = [f"{int(lo)}-{int(hi)} min" if np.isfinite(hi) else f"oltre {int(lo)} min"
+              for lo, hi in zip(edges[:-1], edges[1:])]
+    counts = pd.cut(delays, edges, labels=labels, include_lowest=True).value_counts(sort=False)
+    table = counts.rename_axis('Tempo_Alla_Richiamata').reset_index(name='Richiamate')
+    table['Percentuale'] = (table['Richiamate'] / max(len(delays), 1) * 100).round(1)
+    return table
+
+
+def repeat_callers(df, callbacks=None, window_minutes=DEFAULT_WINDOW_MINUTES, min_calls=2, top=50):
+    # Numeri esterni che chiamano più volte: chiamate in entrata, non risposte
+    # e chiamate perse seguite da un nuovo tentativo entro la finestra
+    if callbacks is None:
+        callbacks = missed_call_callbacks(df, window_minutes)
+    inbound = df[df['Is_Inbound'].to_numpy()]
+    numbers = normalize_numbers(inbound['User_Number'])
+    stats = pd.DataFrame({
+        'Numero': numbers.to_numpy(),
+        'Call Time': inbound['Call Time'].to_numpy(),
+        'Non_Risposta': inbound['Other_Status'].to_numpy(),
+    }).dropna(subset=['Numero']).groupby('Numero').agg(
+        Chiamate_In_Entrata=('Call Time', 'size'),
+        Non_Risposte=('Non_Risposta', 'sum'),
+        Prima_Chiamata=('Call Time', 'min'),
+        Ultima_Chiamata=('Call Time', 'max'),
+    )
+    stats['Richiamate_Entro_Finestra'] = callbacks.groupby('Numero')['Richiamata'].sum()
+    stats['Ritentate_Entro_Finestra'] = callbacks.groupby('Numero')['Nuovo_Tentativo'].sum()
+    stats[['Richiamate_Entro_Finestra', 'Ritentate_Entro_Finestra']] = (
+        stats[['Richiamate_Entro_Finestra', 'Ritentate_Entro_Finestra']].fillna(0).astype('int64'))
+    stats = stats[stats['Chiamate_In_Entrata'] >= min_calls]
+    return stats.sort_values(['Chiamate_In_Entrata', 'Non_Risposte'], ascending=False).head(top)
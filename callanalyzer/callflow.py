@@ -0,0 +1,235 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from .profiling import span
+
+# Ricostruzione del flusso di chiamata da Call Activity Details.
+#
+# Ogni stringa distinta (es. "Inbound: Cliente -> Queue 800 -> 5901 Cassa 01
+# (5901) answered; Ended by Cliente (39...)") viene scomposta una sola volta
+# in una sequenza di tratte (leg): origine, code, destinazioni, trasferimenti
+# e inoltri, più chi ha chiuso la chiamata. Queste stringhe contengono il
+# numero del chiamante e sono quasi tutte distinte, quindi non c'è una cache
+# globale per valore: le tratte dei distinti vengono calcolate una volta per
+# dataset (CallFlows, da condividere fra call_legs e call_flow_table) e
+# riportate sulle chiamate con i codici di factorize, senza cicli per riga.
+#
+# L'export non contiene gli orari delle singole tratte: il tempo di
+# conversazione della chiamata viene diviso in parti uguali tra le tratte che
+# l'hanno gestita (risposta, trasferimento ricevuto, origine delle chiamate
+# in uscita o interne).
+
+LEG_TYPES = ['Origine', 'Coda', 'Destinazione', 'Trasferimento', 'Inoltro']
+
+_PREFIX = re.compile(r'^\s*(inbound|outbound|internal)\s*:\s*', re.IGNORECASE)
+_ENDED_BY = re.compile(r'^ended by\s+(.*)$', re.IGNORECASE)
+_TRANSFER = re.compile(r'^(transfer(?:red)?|forward(?:ed)?)\s+(?:to\s+)?(.*)$', re.IGNORECASE)
+_ANSWERED = re.compile(r'\s+answered$', re.IGNORECASE)
+_QUEUE = re.compile(r'^(queue|ring group|ivr)\b', re.IGNORECASE)
+_ARROW = re.compile(r'\s*(?:->|→)\s*')
+_PARTY = re.compile(r'^(.*?)\s*\((.*?)\)')
+_NUMBER = re.compile(r'^\+?\d+$')
+_TRAILING_NUMBER = re.compile(r'(\d+)$')
+
+
+def _party(text):
+    # "5901 Cassa 01 (5901)" -> ("5901 Cassa 01", "5901"); "5903" -> ("5903", "5903")
+    match = _PARTY.match(text)
+    if match:
+        return match.group(1) or text, match.group(2)
+    if _NUMBER.match(text):
+        return text, text
+    if _QUEUE.match(text):
+        trailing = _TRAILING_NUMBER.search(text)
+        if trailing:
+            return text, trailing.group(1)
+    return text, 'Unknown'
+
+
+def _parse_flow(value):
+    # Restituisce (tratte, chiuso_da); ogni tratta è (tipo, nome, numero, risposta, gestita)
+    prefix = _PREFIX.match(value)
+    direction = prefix.group(1).lower() if prefix else None
+    text = value[prefix.end():] if prefix else value
+
+    legs = []
+    ended_by = None
+    for clause in text.split(';'):
+        clause = clause.strip()
+        if not clause:
+            continue
+        ended = _ENDED_BY.match(clause)
+        if ended:
+            ended_by = _party(ended.group(1).strip())[0]
+            continue
+        transfer = _TRANSFER.match(clause)
+        if transfer:
+            kind = 'Trasferimento' if transfer.group(1).lower().startswith('transfer') else 'Inoltro'
+            target = _ANSWERED.sub('', transfer.group(2).strip())
+            name, number = _party(target)
+            legs.append((kind, name, number, False, kind == 'Trasferimento'))
+            continue
+        hops = _ARROW.split(clause)
+        if len(hops) < 2:
+            # Clausole senza percorso (es. "Missed"): solo esito, nessuna tratta
+            continue
+        for hop in hops:
+            answered = bool(_ANSWERED.search(hop))
+            hop = _ANSWERED.sub('', hop).strip()
+            if not hop:
+                continue
+            name, number = _party(hop)
+            if not legs:
+                kind = 'Origine'
+                handled = direction in ('outbound', 'internal')
+            elif _QUEUE.match(hop):
+                kind, handled = 'Coda', False
+            else:
+                kind, handled = 'Destinazione', answered
+            legs.append((kind, name, number, answered, handled or answered))
+    return tuple(legs), ended_by
+
+
+class CallFlows:
+    # Tratte dei valori distinti di Call Activity Details e codice del valore
+    # per ogni riga del DataFrame da cui è stato costruito (i NaN puntano
+    # all'ultimo distinto, senza tratte)
+
+    def __init__(self, codes, leg_counts, legs, summary):
+        self.codes = codes
+        self.leg_counts = leg_counts
+        self.leg_starts = np.cumsum(leg_counts) - leg_counts
+        self.legs = legs
+        self.summary = summary
+
+    def __len__(self):
+        return len(self.codes)
+
+    def take(self, rows):
+        # Le stesse tratte per un sottoinsieme di righe (slice o posizioni, es. Selection.rows)
+        flows = CallFlows.__new__(CallFlows)
+        flows.codes = self.codes[rows]
+        flows.leg_counts, flows.leg_starts = self.leg_counts, self.leg_starts
+        flows.legs, flows.summary = self.legs, self.summary
+        return flows
+
+
+def _first_per_owner(owner, mask, values, n_unique):
+    # Codice del primo valore per distinto tra le tratte con mask, -1 se nessuna
+    positions = np.flatnonzero(mask)
+    owners, first = np.unique(owner[positions], return_index=True)
+    result = np.full(n_unique, -1, dtype='int64')
+    result[owners] = values[positions[first]]
+    return result
+
+
+def build_call_flows(values):
+    with span('build_call_flows', rows=len(values)):
+        codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=True)
+        parsed = [_parse_flow(value) if isinstance(value, str) else ((), None) for value in uniques]
+        # Ultimo distinto vuoto per i NaN
+        parsed.append(((), None))
+        n_unique = len(parsed)
+        codes = np.where(codes < 0, n_unique - 1, codes)
+
+        leg_counts = np.fromiter((len(flow) for flow, _ in parsed), dtype='int64', count=n_unique)
+        flat = [leg for flow, _ in parsed for leg in flow]
+        kinds, names, numbers, answered, handled = zip(*flat) if flat else ((), (), (), (), ())
+        legs = pd.DataFrame({
+            'Tipo': pd.Categorical(kinds, categories=LEG_TYPES),
+            'Nome': pd.Categorical(names),
+            'Numero': pd.Categorical(numbers),
+            'Risposta': np.array(answered, dtype=bool),
+            'Gestita': np.array(handled, dtype=bool),
+        })
+
+        owner = np.repeat(np.arange(n_unique), leg_counts)
+        kind_codes = legs['Tipo'].cat.codes.to_numpy()
+        name_codes = legs['Nome'].cat.codes.to_numpy().astype('int64')
+        name_categories = legs['Nome'].cat.categories
+        summary = pd.DataFrame({
+            'Legs': leg_counts,
+            'Trasferimenti': np.bincount(owner[kind_codes == LEG_TYPES.index('Trasferimento')],
+                                         minlength=n_unique),
+            'Coda': pd.Categorical.from_codes(
+                _first_per_owner(owner, kind_codes == LEG_TYPES.index('Coda'), name_codes, n_unique),
+                categories=name_categories),
+            'Risposto_Da': pd.Categorical.from_codes(
+                _first_per_owner(owner, legs['Risposta'].to_numpy(), name_codes, n_unique),
+                categories=name_categories),
+            'Chiuso_Da': pd.Categorical([ended for _, ended in parsed]),
+        })
+    return CallFlows(codes, leg_counts, legs, summary)
+
+
+def call_legs(df, flows=None):
+    # Tabella degli eventi: una riga per tratta, indicizzata da Call ID, con la
+    # quota del tempo di conversazione attribuita alle tratte che l'hanno gestita.
+    # `flows`: CallFlows già calcolato per le righe di df
+    columns = ['Call ID', 'Leg', 'Tipo', 'Nome', 'Numero', 'Risposta', 'Gestita', 'Tempo_Gestito_Sec']
+    if 'Call Activity Details' not in df.columns:
+        return pd.DataFrame(columns=columns)
+    if flows is None:
+        flows = build_call_flows(df['Call Activity Details'])
+    codes = flows.codes
+
+    row_counts = flows.leg_counts[codes]
+    rows = np.repeat(np.arange(len(codes)), row_counts)
+    # Posizione di ogni tratta nella tabella dei distinti
+    row_starts = np.cumsum(row_counts) - row_counts
+    leg_number = np.arange(len(rows)) - np.repeat(row_starts, row_counts)
+    leg_positions = flows.leg_starts[codes[rows]] + leg_number
+
+    events = flows.legs.iloc[leg_positions].reset_index(drop=True)
+    events.insert(0, 'Call ID', df['Call ID'].to_numpy()[rows])
+    events.insert(1, 'Leg', (leg_number + 1).astype('uint8'))
+
+    # Tempo di conversazione diviso tra le tratte gestite della stessa chiamata
+    handled = events['Gestita'].to_numpy()
+    handled_per_call = np.bincount(rows[handled], minlength=len(codes))
+    talking = df['Talking_sec'].to_numpy(dtype='float64') if 'Talking_sec' in df.columns else np.zeros(len(codes))
+    share = np.divide(talking, handled_per_call, out=np.zeros(len(codes)), where=handled_per_call > 0)
+    events['Tempo_Gestito_Sec'] = np.where(handled, share[rows], 0.0).round(1)
+    return events[columns]
+
+
+def call_flow_table(df, flows=None):
+    # Una riga per chiamata: tratte, passaggi, trasferimenti, coda, chi ha
+    # risposto e chi ha chiuso
+    calls = pd.DataFrame({'Call ID': df['Call ID'].to_numpy()})
+    if 'Call Activity Details' not in df.columns:
+        return calls
+    if flows is None:
+        flows = build_call_flows(df['Call Activity Details'])
+    per_call = flows.summary.iloc[flows.codes].reset_index(drop=True)
+    calls['Legs'] = per_call['Legs'].astype('int64')
+    calls['Passaggi'] = (calls['Legs'] - 1).clip(lower=0)
+    calls['Trasferimenti'] = per_call['Trasferimenti'].astype('int64')
+    for col in ['Coda', 'Risposto_Da', 'Chiuso_Da']:
+        calls[col] = per_call[col]
+    return calls
+
+
+def chain_length_table(calls):
+    # Distribuzione delle catene: quante chiamate per numero di tratte
+    counts = calls.loc[calls['Legs'] > 0, 'Legs'].value_counts().sort_index()
+    table = counts.rename_axis('Legs').reset_index(name='Chiamate')
+    table['Percentuale'] = (table['Chiamate'] / max(table['Chiamate'].sum(), 1) * 100).round(1)
+    return table
+
+
+def extension_time_table(events, top=20):
+    # Tempo gestito per interno/numero, dalle tratte gestite
+    handled = events[events['Gestita']]
+    handled = handled.assign(Trasferimento=handled['Tipo'] == 'Trasferimento')
+    stats = handled.groupby('Numero', observed=True).agg(
+        Nome=('Nome', 'first'),
+        Tratte_Gestite=('Call ID', 'size'),
+        Risposte=('Risposta', 'sum'),
+        Trasferimenti_Ricevuti=('Trasferimento', 'sum'),
+        Tempo_Gestito_Sec=('Tempo_Gestito_Sec', 'sum'),
+    )
+    stats['Tempo_Gestito_Min'] = (stats['Tempo_Gestito_Sec'] / 60).round(1)
+    return stats.sort_values('Tempo_Gestito_Sec', ascending=False).head(top)
@@ -0,0 +1,141 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from .concurrency import _bucket_edges, _from_ns, _to_ns
+
+# Dimensionamento delle linee (canali SIP) e degli operatori.
+#
+# Dalla funzione a gradini della concorrenza si ricavano, per tutti i limiti
+# di linee da 1 al picco in un solo passaggio:
+# - il tempo trascorso sopra il limite, da un istogramma dei livelli di
+#   concorrenza pesato sulla durata;
+# - le chiamate che avrebbero trovato tutte le linee occupate, da un
+#   istogramma del livello visto da ogni chiamata al suo arrivo.
+# Le chiamate bloccate sono stimate sul traffico storico: con il limite
+# attivo non avrebbero occupato una linea, quindi il valore è un limite
+# superiore (leggermente pessimistico) per i limiti più bassi.
+#
+# Le tabelle Erlang B (linee) ed Erlang C (operatori) per fascia oraria usano
+# le chiamate medie per ora e la durata media di conversazione.
+
+CAPACITY_COLUMNS = ['Linee', 'Minuti_Oltre_Limite', 'Tempo_Oltre_Limite_%',
+                    'Chiamate_Bloccate', 'Chiamate_Bloccate_%']
+
+
+def _arrivals(steps):
+    # Per ogni istante: chiamate attive prima dell'istante e chiamate iniziate
+    concurrent = steps['Concurrent Calls'].to_numpy().astype('int64')
+    active_after = steps['Active After'].to_numpy().astype('int64')
+    before = np.concatenate([[0], active_after[:-1]])
+    return before, concurrent - before
+
+
+def capacity_table(steps):
+    # Una riga per ogni limite di linee da 1 al picco osservato
+    if steps.empty:
+        return pd.DataFrame(columns=CAPACITY_COLUMNS)
+    times = _to_ns(steps['Time'])
+    active = steps['Active After'].to_numpy().astype('int64')
+    peak = int(steps['Concurrent Calls'].max())
+
+    # Tempo a ogni livello di concorrenza (ns), poi tempo oltre ogni limite
+    time_at_level = np.bincount(active[:-1], weights=np.diff(times).astype('float64'), minlength=peak + 1)
+    time_above = time_at_level[::-1].cumsum()[::-1]
+    total_time = max(time_at_level.sum(), 1.0)
+
+    # La k-esima chiamata che inizia in un istante trova `before + k - 1`
+    # chiamate attive: ogni istante aggiunge +1 all'intervallo di livelli
+    # [before, before + starts) dell'istogramma, con un array di differenze
+    before, starts = _arrivals(steps)
+    arriving = (starts > 0).astype('float64')
+    diff = np.bincount(before, weights=arriving, minlength=peak + 2)
+    diff -= np.bincount(before + starts, weights=arriving, minlength=peak + 2)
+    arrivals_at_level = np.cumsum(diff)[:peak + 1]
+    blocked = arrivals_at_level[::-1].cumsum()[::-1]
+    total_calls = max(int(starts.sum()), 1)
+
+    lines = np.arange(1, peak + 1)
+    above = np.append(time_above, 0.0)[lines + 1]
+    return pd.DataFrame({
+        'Linee': lines,
+        'Minuti_Oltre_Limite': (above / 60e9).round(1),
+        'Tempo_Oltre_Limite_%': (above / total_time * 100).round(3),
+        'Chiamate_Bloccate': blocked[lines].round().astype('int64'),
+        'Chiamate_Bloccate_%': (blocked[lines] / total_calls * 100).round(2),
+    })
+
+
+def blocked_calls_by_period(steps, lines, freq='1h'):
+    # Quando si sarebbero avute chiamate bloccate con `lines` linee
+    if steps.empty:
+        return pd.DataFrame(columns=['Time', 'Chiamate_Bloccate'])
+    before, starts = _arrivals(steps)
+    blocked = np.clip(before + starts - lines, 0, starts)
+    times = _to_ns(steps['Time'])
+    edges = _bucket_edges(times, freq)
+    bucket = np.searchsorted(edges, times, side='right') - 1
+    counts = np.bincount(bucket, weights=blocked, minlength=len(edges) - 1)[:len(edges) - 1]
+    return pd.DataFrame({'Time': _from_ns(edges[:-1]), 'Chiamate_Bloccate': counts.astype('int64')})
+
+
+def erlang_b(traffic, lines):
+    # Probabilità di blocco con `lines` linee e `traffic` Erlang (ricorsione stabile)
+    blocking = 1.0
+    for n in range(1, lines + 1):
+        blocking = traffic * blocking / (n + traffic * blocking)
+    return blocking
+
+
+def erlang_c(traffic, agents):
+    # Probabilità di attesa con `agents` operatori (1 se il sistema è saturo)
+    if agents <= traffic:
+        return 1.0
+    blocking = erlang_b(traffic, agents)
+    return agents * blocking / (agents - traffic * (1 - blocking))
+
+
+def _lines_for_blocking(traffic, target):
+    lines, blocking = 0, 1.0
+    while blocking > target:
+        lines += 1
+        blocking = traffic * blocking / (lines + traffic * blocking)
+    return lines
+
+
+def _agents_for_service_level(traffic, holding_sec, answer_sec, target):
+    agents = max(int(math.floor(traffic)) + 1, 1)
+    while True:
+        wait = erlang_c(traffic, agents)
+        service_level = 1 - wait * math.exp(-(agents - traffic) * answer_sec / holding_sec)
+        if service_level >= target:
+            return agents, service_level, wait * holding_sec / (agents - traffic)
+        agents += 1
+
+
+def erlang_table(traffic, target_blocking=0.01, answer_sec=20, target_service_level=0.8):
+    # `traffic`: indice Hour, colonne Chiamate_Per_Ora e Durata_Media_Sec
+    rows = []
+    for hour, calls, holding in traffic[['Chiamate_Per_Ora', 'Durata_Media_Sec']].itertuples():
+        erlangs = calls * holding / 3600
+        if erlangs <= 0 or holding <= 0:
+            rows.append((hour, erlangs, 0, 0, 100.0, 0.0))
+            continue
+        agents, service_level, wait = _agents_for_service_level(erlangs, holding, answer_sec, target_service_level)
+        rows.append((hour, erlangs, _lines_for_blocking(erlangs, target_blocking), agents,
+                     service_level * 100, wait))
+    table = pd.DataFrame(rows, columns=['Hour', 'Traffico_Erlang', 'Linee_Erlang_B', 'Operatori_Erlang_C',
+                                        'Livello_Servizio_%', 'Attesa_Media_Sec']).set_index('Hour')
+    table = traffic[['Chiamate_Per_Ora', 'Durata_Media_Sec']].round(2).join(table)
+    return table.round({'Traffico_Erlang': 3, 'Livello_Servizio_%': 1, 'Attesa_Media_Sec': 1})
+
+
+def hourly_traffic(df):
+    # Chiamate medie per ora del giorno (sui giorni presenti) e durata media di conversazione
+    days = max(df['Date'].nunique(), 1)
+    stats = df.groupby('Hour', observed=True).agg(Chiamate=('Call ID', 'size'), Talking_sum=('Talking_sec', 'sum'))
+    return pd.DataFrame({
+        'Chiamate_Per_Ora': stats['Chiamate'] / days,
+        'Durata_Media_Sec': stats['Talking_sum'] / stats['Chiamate'],
+    })
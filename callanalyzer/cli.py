@@ -0,0 +1,137 @@
+import argparse
+import os
+import sys
+import time
+
+from .cache import ParquetCache
+from .multi import expand_sources, load_many, merge_calls
+from .profiling import profiling, span
+from .stats import summary_tables
+
+# Elaborazione batch degli export 3CX senza browser, ad esempio da cron:
+#
+#   python -m callanalyzer export_luglio.csv export_agosto.csv -o report --format parquet
+#   python -m callanalyzer cartella_export/ --merge -o report
+#   python -m callanalyzer export.csv --no-cache --profile profilo.json
+#
+# Per ogni file viene creata una cartella <output>/<nome file> con una
+# tabella aggregata per file (status, breakdown, direzioni, utenti, ...).
+# File con lo stesso nome in cartelle diverse ricevono come prefisso la
+# cartella che li contiene (<cartella>_<nome file>), poi un suffisso numerico.
+# Con --merge i file vengono uniti (senza chiamate duplicate) in <output>/merged.
+
+OUTPUT_FORMATS = ('parquet', 'csv', 'json')
+
+
+def write_table(table, path, fmt):
+    if fmt == 'parquet':
+        table.to_parquet(path, index=False)
+    elif fmt == 'csv':
+        table.to_csv(path, index=False)
+    else:
+        table.to_json(path, orient='records', date_format='iso', force_ascii=False, indent=2)
+
+
+def output_names(paths):
+    # Nome della cartella di output per ogni file, senza collisioni
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    names = []
+    for path, stem in zip(paths, stems):
+        if stems.count(stem) > 1:
+            parent = os.path.basename(os.path.dirname(os.path.abspath(path)))
+            stem = f'{parent}_{stem}' if parent else stem
+        names.append(stem)
+
+    unique = []
+    for name in names:
+        candidate, n = name, 1
+        while candidate in unique:
+            n += 1
+            candidate = f'{name}_{n}'
+        unique.append(candidate)
+    return dict(zip(paths, unique))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='callanalyzer',
+        description="Analisi batch dei log chiamate 3CX (CSV) con esportazione delle tabelle aggregate.",
+    )
+    parser.add_argument('files', nargs='+', help="file CSV esportati da 3CX o cartelle che li contengono")
+    parser.add_argument('-o', '--output-dir', default='callanalyzer_output',
+                        help="cartella di destinazione (default: %(default)s)")
+    parser.add_argument('-f', '--format', choices=OUTPUT_FORMATS, default='csv',
+                        help="formato delle tabelle (default: %(default)s)")
+    parser.add_argument('--freq', default='1min',
+                        help="intervallo della serie di concorrenza (default: %(default)s)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="non usare la cache su disco dei file già elaborati")
+    parser.add_argument('--merge', action='store_true',
+                        help="unisci tutti i file rimuovendo le chiamate duplicate (Call ID + Call Time)")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="processi paralleli per l'elaborazione (default: numero di core)")
+    parser.add_argument('--profile', metavar='FILE', default=None,
+                        help="salva in FILE (JSON) tempi, righe e cache di ogni fase "
+                             "(con più file in parallelo i worker sono misurati in blocco: usa -j 1 per il dettaglio)")
+    parser.add_argument('--profile-memory', action='store_true',
+                        help="con --profile misura anche il picco di memoria per fase (più lento)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    cache = None if args.no_cache else ParquetCache()
+    if cache is not None and not cache.enabled:
+        cache = None
+
+    with profiling(enabled=args.profile is not None, memory=args.profile_memory, label='cli') as profiler:
+        files = expand_sources(args.files)
+        names = output_names(files)
+        started = time.perf_counter()
+        results = load_many(files, cache, max_workers=args.jobs, return_exceptions=True)
+
+        failures = 0
+        loaded = []
+        for path, result in zip(files, results):
+            if isinstance(result, Exception):
+                failures += 1
+                print(f"❌ {path}: {result}", file=sys.stderr)
+            else:
+                loaded.append((path, result))
+
+        if args.merge and loaded:
+            df, info = merge_calls([result for _, result in loaded])
+            print(f"🔗 {info['files']} file uniti, {info['duplicates']} chiamate duplicate rimosse")
+            loaded = [('merged', (df, info))]
+            names = {'merged': 'merged'}
+
+        for path, (df, info) in loaded:
+            try:
+                with span(f'summary_tables {names[path]}', rows=len(df)):
+                    tables = summary_tables(df, concurrency_freq=args.freq)
+            except Exception as e:
+                failures += 1
+                print(f"❌ {path}: {e}", file=sys.stderr)
+                continue
+
+            target = os.path.join(args.output_dir, names[path])
+            os.makedirs(target, exist_ok=True)
+            with span('write_tables'):
+                for name, table in tables.items():
+                    write_table(table, os.path.join(target, f'{name}.{args.format}'), args.format)
+
+            source = 'cache' if info['from_cache'] else 'elaborato'
+            print(f"✅ {path}: {len(df)} chiamate ({source}), {len(tables)} tabelle in {target}")
+            if info['rows_dropped']:
+                print(f"⚠️ {path}: rimosse {info['rows_dropped']} righe con date non valide", file=sys.stderr)
+            if info['malformed']['Ringing'] or info['malformed']['Talking']:
+                print(f"⚠️ {path}: durate non valide considerate come 0 sec: "
+                      f"Ringing {info['malformed']['Ringing']}, Talking {info['malformed']['Talking']}", file=sys.stderr)
+
+    if profiler is not None:
+        with open(args.profile, 'w', encoding='utf-8') as fh:
+            fh.write(profiler.to_json())
+        print(profiler.table().to_string(index=False))
+        print(f"⏱️ Profilo salvato in {args.profile}")
+    print(f"⏱️ Tempo totale: {time.perf_counter() - started:.2f}s")
+    return 1 if failures else 0
@@ -0,0 +1,268 @@
+import numpy as np
+import pandas as pd
+
+from .profiling import span
+
+# Motore sweep-line per le chiamate contemporanee.
+#
+# Ogni chiamata genera un evento +1 all'inizio e -1 alla fine: ordinando gli
+# eventi una sola volta e facendo la somma cumulativa si ottiene la
+# concorrenza esatta in ogni istante in cui cambia (O(N log N)).
+# Gli intervalli sono chiusi su entrambi gli estremi, come il vecchio
+# IntervalIndex(closed='both'): una chiamata che termina in t e una che
+# inizia in t sono contate insieme nell'istante t.
+#
+# La versione raggruppata ordina gli eventi per (gruppo, tempo): dato che gli
+# eventi di ogni gruppo si annullano, la somma cumulativa globale riparte da
+# zero all'inizio di ogni gruppo e basta un solo passaggio per tutti i gruppi.
+
+STEP_COLUMNS = ['Time', 'Concurrent Calls', 'Active After']
+RESAMPLED_COLUMNS = ['Time', 'Concurrent Calls', 'Mean Concurrent Calls']
+NAT_NS = np.iinfo('int64').min
+
+
+def _to_ns(values):
+    return np.asarray(pd.to_datetime(values), dtype='datetime64[ns]').view('int64')
+
+
+def _from_ns(values):
+    return pd.to_datetime(np.asarray(values, dtype='int64').view('datetime64[ns]'))
+
+
+def _sweep(group_codes, start_ns, end_ns):
+    # Eventi ordinati per (gruppo, tempo), aggregati per istante
+    valid = (start_ns != NAT_NS) & (end_ns != NAT_NS) & (group_codes >= 0)
+    start_ns = start_ns[valid]
+    end_ns = np.maximum(end_ns[valid], start_ns)
+    group_codes = group_codes[valid]
+
+    times = np.concatenate([start_ns, end_ns])
+    groups = np.concatenate([group_codes, group_codes])
+    is_start = np.concatenate([np.ones(len(start_ns), dtype='int64'),
+                               np.zeros(len(end_ns), dtype='int64')])
+
+    order = np.lexsort((times, groups))
+    times, groups, is_start = times[order], groups[order], is_start[order]
+
+    if len(times) == 0:
+        empty = np.array([], dtype='int64')
+        return empty, empty, empty, empty
+
+    new_point = np.ones(len(times), dtype=bool)
+    new_point[1:] = (times[1:] != times[:-1]) | (groups[1:] != groups[:-1])
+    first = np.flatnonzero(new_point)
+
+    starts_at = np.add.reduceat(is_start, first)
+    ends_at = np.add.reduceat(1 - is_start, first)
+    active_after = np.cumsum(starts_at - ends_at)
+    concurrent_at = active_after + ends_at
+
+    return groups[first], times[first], concurrent_at, active_after
+
+
+def _grouped_searchsorted(event_groups, event_times, query_groups, query_times, side):
+    # Come np.searchsorted(event_times, query_times, side) - 1, ma ristretto al
+    # gruppo della query: restituisce l'indice dell'ultimo evento dello stesso
+    # gruppo prima (side='left') o fino a (side='right') l'istante della query,
+    # oppure l'ultimo evento del gruppo precedente, che ha sempre livello 0.
+    n_events = len(event_times)
+    groups = np.concatenate([event_groups, query_groups])
+    times = np.concatenate([event_times, query_times])
+    # A parità di istante gli eventi vanno prima delle query con side='right'
+    kind = np.concatenate([np.zeros(n_events, dtype='int8'),
+                           np.ones(len(query_times), dtype='int8')])
+    if side == 'left':
+        kind = 1 - kind
+    order = np.lexsort((kind, times, groups))
+    is_event = order < n_events
+    events_before = np.cumsum(is_event) - 1
+    result = np.empty(len(query_times), dtype='int64')
+    result[order[~is_event] - n_events] = events_before[~is_event]
+    return result
+
+
+def _bucket_edges(times_ns, freq):
+    step = pd.Timedelta(freq)
+    first = pd.Timestamp(times_ns.min()).floor(step)
+    last = pd.Timestamp(times_ns.max()).floor(step) + step
+    return _to_ns(pd.date_range(start=first, end=last, freq=step))
+
+
+def _resample(groups, times, concurrent_at, active_after, n_groups, edges_ns):
+    # Massimo e media pesata sul tempo per ogni (gruppo, intervallo)
+    n_buckets = len(edges_ns) - 1
+
+    # Area cumulativa sotto la funzione a gradini; l'ultimo evento di ogni
+    # gruppo ha livello 0, quindi il salto tra gruppi non aggiunge area
+    seg_area = np.zeros(len(times), dtype='float64')
+    seg_area[1:] = np.cumsum(active_after[:-1] * np.diff(times).astype('float64'))
+
+    query_groups = np.repeat(np.arange(n_groups), len(edges_ns))
+    query_times = np.tile(edges_ns, n_groups)
+    idx = _grouped_searchsorted(groups, times, query_groups, query_times, 'right')
+    clipped = np.clip(idx, 0, None)
+    same_group = (idx >= 0) & (groups[clipped] == query_groups)
+    area = np.where(idx >= 0, seg_area[clipped], 0.0)
+    area = area + np.where(same_group,
+                           active_after[clipped] * (query_times - times[clipped]).astype('float64'),
+                           0.0)
+    area = area.reshape(n_groups, len(edges_ns))
+    mean = np.diff(area, axis=1) / np.diff(edges_ns).astype('float64')
+
+    # Massimo: livello ereditato all'inizio dell'intervallo e picchi interni
+    left_groups = np.repeat(np.arange(n_groups), n_buckets)
+    left_times = np.tile(edges_ns[:-1], n_groups)
+    carry_idx = _grouped_searchsorted(groups, times, left_groups, left_times, 'left')
+    carry_in = np.where(carry_idx >= 0, active_after[np.clip(carry_idx, 0, None)], 0)
+    bucket = np.searchsorted(edges_ns, times, side='right') - 1
+    max_inside = np.zeros(n_groups * n_buckets, dtype='int64')
+    np.maximum.at(max_inside, groups * n_buckets + bucket, concurrent_at)
+    peak = np.maximum(carry_in, max_inside).reshape(n_groups, n_buckets)
+
+    return peak, mean
+
+
+def concurrency_steps(start, end):
+    # Restituisce la funzione a gradini della concorrenza:
+    # - 'Concurrent Calls': chiamate attive nell'istante Time (estremi inclusi)
+    # - 'Active After': chiamate attive subito dopo Time, fino al cambio successivo
+    with span('concurrency_steps', rows=len(start)):
+        start_ns = _to_ns(start)
+        _, times, concurrent_at, active_after = _sweep(
+            np.zeros(len(start_ns), dtype='int64'), start_ns, _to_ns(end))
+
+    if len(times) == 0:
+        return pd.DataFrame(columns=STEP_COLUMNS)
+
+    return pd.DataFrame({
+        'Time': _from_ns(times),
+        'Concurrent Calls': concurrent_at,
+        'Active After': active_after,
+    })
+
+
+def concurrency_steps_from_counts(times, starts_at, ends_at):
+    # Come concurrency_steps, ma a partire dal numero di inizi e fini già
+    # aggregati per istante (es. accumulati blocco per blocco in streaming)
+    times = _to_ns(times)
+    if len(times) == 0:
+        return pd.DataFrame(columns=STEP_COLUMNS)
+
+    order = np.argsort(times, kind='stable')
+    starts_at = np.asarray(starts_at, dtype='int64')[order]
+    ends_at = np.asarray(ends_at, dtype='int64')[order]
+    active_after = np.cumsum(starts_at - ends_at)
+
+    return pd.DataFrame({
+        'Time': _from_ns(times[order]),
+        'Concurrent Calls': active_after + ends_at,
+        'Active After': active_after,
+    })
+
+
+def grouped_concurrency_steps(df, by):
+    # Funzione a gradini per ogni valore della colonna `by` (es. Direction,
+    # User, Destination_Number), calcolata con un solo ordinamento
+    if df.empty:
+        return pd.DataFrame(columns=[by] + STEP_COLUMNS)
+
+    with span('grouped_concurrency_steps', rows=len(df)):
+        codes, uniques = pd.factorize(df[by], sort=True)
+        groups, times, concurrent_at, active_after = _sweep(
+            codes.astype('int64'), _to_ns(df['Call Time']), _to_ns(df['End']))
+
+    return pd.DataFrame({
+        by: pd.Categorical.from_codes(groups, categories=uniques),
+        'Time': _from_ns(times),
+        'Concurrent Calls': concurrent_at,
+        'Active After': active_after,
+    })
+
+
+def concurrency_summary(steps):
+    # Picco esatto, istante del picco e media pesata sul tempo
+    if steps.empty:
+        return {'peak': 0, 'peak_time': None, 'mean': 0.0}
+
+    times = _to_ns(steps['Time'])
+    active = steps['Active After'].to_numpy()
+    peak_idx = int(np.argmax(steps['Concurrent Calls'].to_numpy()))
+    duration_ns = times[-1] - times[0]
+    if duration_ns > 0:
+        mean = float((active[:-1] * np.diff(times)).sum() / duration_ns)
+    else:
+        mean = float(steps['Concurrent Calls'].iloc[0])
+
+    return {
+        'peak': int(steps['Concurrent Calls'].iloc[peak_idx]),
+        'peak_time': steps['Time'].iloc[peak_idx],
+        'mean': mean,
+    }
+
+
+def grouped_concurrency_summary(steps, by):
+    # Picco, istante del picco e media per gruppo; la media è pesata
+    # sull'intero periodo analizzato, così i gruppi sono confrontabili
+    if steps.empty:
+        return pd.DataFrame(columns=['Picco', 'Istante_Picco', 'Media'])
+
+    codes = steps[by].cat.codes.to_numpy()
+    times = _to_ns(steps['Time'])
+    active = steps['Active After'].to_numpy()
+    duration_ns = times.max() - times.min()
+
+    seg_area = np.zeros(len(times), dtype='float64')
+    same_group = codes[1:] == codes[:-1]
+    seg_area[:-1] = np.where(same_group, active[:-1] * np.diff(times).astype('float64'), 0.0)
+
+    peak_rows = steps.groupby(by, observed=True)['Concurrent Calls'].idxmax()
+    summary = pd.DataFrame({
+        'Picco': steps.loc[peak_rows.values, 'Concurrent Calls'].values,
+        'Istante_Picco': steps.loc[peak_rows.values, 'Time'].values,
+    }, index=peak_rows.index)
+    area = pd.Series(seg_area).groupby(steps[by].values, observed=True).sum()
+    summary['Media'] = (area / duration_ns).round(3) if duration_ns > 0 else 0.0
+    return summary.sort_values('Picco', ascending=False)
+
+
+def resample_concurrency(steps, freq='1min'):
+    # Ricampiona la funzione a gradini su intervalli regolari:
+    # - 'Concurrent Calls': massimo nell'intervallo (nessun picco breve va perso)
+    # - 'Mean Concurrent Calls': media pesata sul tempo nell'intervallo
+    if steps.empty:
+        return pd.DataFrame(columns=RESAMPLED_COLUMNS)
+
+    times = _to_ns(steps['Time'])
+    edges_ns = _bucket_edges(times, freq)
+    peak, mean = _resample(np.zeros(len(times), dtype='int64'), times,
+                           steps['Concurrent Calls'].to_numpy(),
+                           steps['Active After'].to_numpy(), 1, edges_ns)
+
+    return pd.DataFrame({
+        'Time': _from_ns(edges_ns[:-1]),
+        'Concurrent Calls': peak[0],
+        'Mean Concurrent Calls': mean[0],
+    })
+
+
+def grouped_resample_concurrency(steps, by, freq='1h'):
+    # Come resample_concurrency, ma per gruppo: tabella lunga (gruppo, Time)
+    # pronta per il pivot della heat-map
+    if steps.empty:
+        return pd.DataFrame(columns=[by] + RESAMPLED_COLUMNS)
+
+    categories = steps[by].cat.categories
+    times = _to_ns(steps['Time'])
+    edges_ns = _bucket_edges(times, freq)
+    peak, mean = _resample(steps[by].cat.codes.to_numpy().astype('int64'), times,
+                           steps['Concurrent Calls'].to_numpy(),
+                           steps['Active After'].to_numpy(), len(categories), edges_ns)
+
+    n_buckets = len(edges_ns) - 1
+    return pd.DataFrame({
+        by: pd.Categorical.from_codes(np.repeat(np.arange(len(categories)), n_buckets),
+                                      categories=categories),
+        'Time': _from_ns(np.tile(edges_ns[:-1], len(categories))),
+        'Concurrent Calls': peak.ravel(),
+        'Mean Concurrent Calls': mean.ravel(),
+    })
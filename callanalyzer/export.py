@@ -0,0 +1,62 @@
+import io
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Esportazione dei dati a blocchi di righe.
+#
+# Le righe vengono estratte e serializzate un blocco alla volta, quindi per
+# una selezione grande non si materializza la copia completa del DataFrame
+# né una stringa CSV intera. write_export scrive direttamente su un file;
+# export_bytes (usata dal download_button di Streamlit, che vuole l'intero
+# contenuto) tiene invece in memoria il file esportato completo. Il Parquet
+# (un row group per blocco) è disponibile solo con pyarrow installato.
+
+EXPORT_CHUNK_ROWS = 200_000
+EXPORT_MIME = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def export_formats():
+    return ['csv', 'parquet'] if pq is not None else ['csv']
+
+
+def iter_chunks(df, chunk_rows=EXPORT_CHUNK_ROWS):
+    # Almeno un blocco (anche vuoto), così l'intestazione viene sempre scritta
+    for start in range(0, max(len(df), 1), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def write_export(chunks, fh, fmt='csv'):
+    # `chunks`: DataFrame con le stesse colonne, scritti in ordine su `fh` (binario)
+    if fmt == 'csv':
+        header = True
+        for chunk in chunks:
+            chunk.to_csv(fh, index=False, header=header, encoding='utf-8')
+            header = False
+        return
+    if fmt != 'parquet':
+        raise ValueError(f"Formato di esportazione non supportato: {fmt}")
+    if pq is None:
+        raise RuntimeError("Esportazione Parquet non disponibile: pyarrow non installato")
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(fh, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def export_bytes(chunks, fmt='csv'):
+    buffer = io.BytesIO()
+    write_export(chunks, buffer, fmt)
+    return buffer.getvalue()
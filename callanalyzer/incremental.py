@@ -0,0 +1,325 @@
+import io
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from datetime import datetime
+
+import pandas as pd
+
+from .cache import DEFAULT_CACHE_DIR
+from .parsing import parse_call_times
+from .processing import PARSER_VERSION, derive_columns
+from .profiling import span
+from .streaming import DEFAULT_CHUNKSIZE, FOLDED_AGGREGATES, StreamingAggregates, partial_aggregates
+
+# Modalità incrementale: storico su SQLite locale.
+#
+# Per ogni sorgente (export 3CX che cresce nel tempo) si ricorda il punto più
+# recente già acquisito (Call Time massimo e Call ID in quell'istante) e,
+# per i file su disco, fin dove il file era già stato letto. A ogni refresh
+# solo le righe nuove passano da derive_columns e i loro aggregati parziali
+# vengono sommati alle tabelle già presenti (UPSERT), senza rielaborare lo
+# storico: il costo è proporzionale al traffico nuovo. Gli aggregati
+# calcolati con un PARSER_VERSION diverso vengono scartati all'apertura.
+
+DEFAULT_STORE_PATH = os.path.join(DEFAULT_CACHE_DIR, 'incremental.sqlite')
+_TAIL_CHECK_BYTES = 4096
+
+# Tabelle aggregate: nome -> (colonne chiave, colonne sommate)
+AGGREGATE_TABLES = {
+    'breakdown': (['key'], ['value']),
+    'status': (['Status'], ['count']),
+    'non_answered_by_direction': (['Direction', 'Status'], ['count']),
+    'direction': (['Direction'], ['Totale', 'Conversazioni_Reali', 'Talking_sum', 'Ringing_sum']),
+    'weekly': (['DayOfWeek'], ['Totale_Chiamate', 'Conversazioni', 'Talking_sum']),
+    'hourly': (['Hour'], ['Totale_Chiamate', 'Conversazioni', 'Talking_sum']),
+    'users': (['User'], ['Totale_Chiamate', 'Conversazioni_Reali', 'Durata_Totale_Sec', 'Ringing_sum',
+                         'Chiamate_Interne', 'Chiamate_In_Entrata', 'Chiamate_In_Uscita']),
+    'conversation_durations': (['Talking_sec'], ['count']),
+    'activity': (['Call Activity Details'], ['count']),
+    'events': (['time_ns'], ['starts', 'ends']),
+}
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+class _BoundedReader(io.RawIOBase):
+    # Legge un file su disco solo fino al byte `end` (escluso)
+
+    def __init__(self, fh, end):
+        self._fh = fh
+        self._remaining = end - fh.tell()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self._remaining)
+        if size <= 0:
+            return 0
+        data = self._fh.read(size)
+        buffer[:len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+    def close(self):
+        self._fh.close()
+        super().close()
+
+
+class IncrementalStore:
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get('CALLANALYZER_INCREMENTAL_PATH', DEFAULT_STORE_PATH)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            self._create_schema(conn)
+            self._drop_stale(conn)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=60)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def _create_schema(self, conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS sources (
+                source TEXT PRIMARY KEY,
+                high_water_ns INTEGER,
+                high_water_ids TEXT,
+                bytes_ingested INTEGER,
+                tail_check BLOB,
+                rows_ingested INTEGER,
+                parser_version TEXT,
+                updated_at TEXT,
+                rows_read INTEGER,
+                rows_dropped INTEGER
+            )''')
+        # Storici creati prima dei contatori di righe lette e scartate
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(sources)')}
+        for column in ('rows_read', 'rows_dropped'):
+            if column not in columns:
+                conn.execute(f'ALTER TABLE sources ADD COLUMN {column} INTEGER')
+        for name, (keys, values) in AGGREGATE_TABLES.items():
+            columns = [f'{_quote(k)} NOT NULL' for k in keys] + [f'{_quote(v)} INTEGER NOT NULL' for v in values]
+            conn.execute(f'CREATE TABLE IF NOT EXISTS {_quote("agg_" + name)} '
+                         f'({", ".join(columns)}, PRIMARY KEY ({", ".join(_quote(k) for k in keys)}))')
+
+    def _drop_stale(self, conn):
+        # Gli aggregati sono sommati fra le sorgenti: se una è stata acquisita
+        # con un altro parser lo storico intero non è più coerente
+        stale = conn.execute('SELECT COUNT(*) FROM sources WHERE parser_version IS NOT ?',
+                             (PARSER_VERSION,)).fetchone()[0]
+        if stale:
+            self._clear(conn)
+
+    def _clear(self, conn):
+        conn.execute('DELETE FROM sources')
+        for name in AGGREGATE_TABLES:
+            conn.execute(f'DELETE FROM {_quote("agg_" + name)}')
+
+    def sources(self):
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query(
+                'SELECT source, rows_read, rows_ingested, rows_dropped, high_water_ns, parser_version, updated_at '
+                'FROM sources', conn)
+
+    def reset(self):
+        with closing(self._connect()) as conn, conn:
+            self._clear(conn)
+
+    def _source_state(self, conn, source):
+        row = conn.execute('SELECT high_water_ns, high_water_ids, bytes_ingested, tail_check, rows_ingested, '
+                           'COALESCE(rows_read, 0), COALESCE(rows_dropped, 0) '
+                           'FROM sources WHERE source = ?', (source,)).fetchone()
+        if row is None:
+            return None
+        return {
+            'high_water_ns': row[0],
+            'high_water_ids': set(json.loads(row[1] or '[]')),
+            'bytes_ingested': row[2],
+            'tail_check': row[3],
+            'rows_ingested': row[4],
+            'rows_read': row[5],
+            'rows_dropped': row[6],
+        }
+
+    def _open_new_part(self, file, state, end_offset):
+        # Per un file su disco che è solo cresciuto si leggono i byte dopo
+        # l'ultimo refresh (con l'intestazione); altrimenti l'intero file.
+        # In entrambi i casi la lettura si ferma a end_offset, il punto che
+        # viene registrato come già acquisito
+        if not isinstance(file, (str, os.PathLike)):
+            file.seek(0)
+            return file, False
+        if end_offset is None:
+            return file, False
+
+        full = io.BufferedReader(_BoundedReader(open(file, 'rb'), end_offset))
+        if state is None or not state['bytes_ingested'] or not state['tail_check']:
+            return full, False
+
+        offset = state['bytes_ingested']
+        with open(file, 'rb') as fh:
+            header = fh.readline()
+            if end_offset < offset:
+                return full, False
+            fh.seek(max(offset - _TAIL_CHECK_BYTES, 0))
+            if fh.read(min(offset, _TAIL_CHECK_BYTES)) != state['tail_check']:
+                return full, False
+            fh.seek(offset)
+            tail = fh.read(end_offset - offset)
+        full.close()
+        return io.BytesIO(header + tail), True
+
+    def _file_end_state(self, file):
+        # Posizione e ultimi byte del file, se termina con una riga completa
+        if not isinstance(file, (str, os.PathLike)):
+            return None, None
+        with open(file, 'rb') as fh:
+            fh.seek(0, os.SEEK_END)
+            size = fh.tell()
+            fh.seek(max(size - _TAIL_CHECK_BYTES, 0))
+            tail = fh.read()
+        if not tail.endswith(b'\n'):
+            return None, None
+        return size, tail
+
+    def ingest(self, file, source=None, chunksize=DEFAULT_CHUNKSIZE):
+        # Acquisisce le righe nuove di `file`; restituisce un riepilogo
+        started = time.perf_counter()
+        if source is None:
+            source = os.path.abspath(file) if isinstance(file, (str, os.PathLike)) else getattr(file, 'name', 'upload')
+        # Dimensione e coda del file prima della lettura: se cresce durante il
+        # refresh, le righe aggiunte nel frattempo restano per il prossimo
+        end_offset, tail_check = self._file_end_state(file)
+
+        with closing(self._connect()) as conn:
+            state = self._source_state(conn, source)
+        reader, tail_only = self._open_new_part(file, state, end_offset)
+
+        summary = {'source': source, 'rows_read': 0, 'new_rows': 0, 'skipped_rows': 0, 'rows_dropped': 0,
+                   'tail_only': tail_only, 'seconds': 0.0}
+        high_water_ns = state['high_water_ns'] if state else None
+        high_water_ids = state['high_water_ids'] if state else set()
+
+        conn = self._connect()
+        try:
+            for chunk in pd.read_csv(reader, chunksize=chunksize):
+                summary['rows_read'] += len(chunk)
+                chunk['Call Time'], _ = parse_call_times(chunk['Call Time'], source=source)
+                before = len(chunk)
+                chunk = chunk.dropna(subset=['Call Time'])
+                summary['rows_dropped'] += before - len(chunk)
+
+                # Rileggendo l'intero file si tengono solo le righe successive
+                # al punto già acquisito; la coda letta per offset è già nuova
+                if not tail_only and state is not None and high_water_ns is not None:
+                    times_ns = chunk['Call Time'].to_numpy(dtype='datetime64[ns]').view('int64')
+                    is_new = times_ns > high_water_ns
+                    at_mark = times_ns == high_water_ns
+                    if at_mark.any():
+                        is_new |= at_mark & ~chunk['Call ID'].astype(str).isin(high_water_ids).to_numpy()
+                    summary['skipped_rows'] += int((~is_new).sum())
+                    chunk = chunk[is_new]
+                if chunk.empty:
+                    continue
+
+                with span('derive_columns', rows=len(chunk)):
+                    chunk, _ = derive_columns(chunk)
+                with span('aggiorna_storico', rows=len(chunk)):
+                    self._upsert(conn, partial_aggregates(chunk))
+                summary['new_rows'] += len(chunk)
+
+                chunk_max = chunk['Call Time'].max().value
+                ids_at_max = chunk.loc[chunk['Call Time'].to_numpy(dtype='datetime64[ns]').view('int64') == chunk_max,
+                                       'Call ID'].astype(str)
+                if high_water_ns is None or chunk_max > high_water_ns:
+                    high_water_ns, high_water_ids = chunk_max, set(ids_at_max)
+                elif chunk_max == high_water_ns:
+                    high_water_ids |= set(ids_at_max)
+
+            rows_ingested = (state['rows_ingested'] if state else 0) + summary['new_rows']
+            # Righe lette e scartate si riferiscono all'intero export: una
+            # rilettura completa le sostituisce, una coda si somma
+            rows_read, rows_dropped = summary['rows_read'], summary['rows_dropped']
+            if tail_only:
+                rows_read += state['rows_read']
+                rows_dropped += state['rows_dropped']
+            conn.execute('''
+                INSERT INTO sources (source, high_water_ns, high_water_ids, bytes_ingested, tail_check,
+                                     rows_ingested, parser_version, updated_at, rows_read, rows_dropped)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(source) DO UPDATE SET
+                    high_water_ns = excluded.high_water_ns, high_water_ids = excluded.high_water_ids,
+                    bytes_ingested = excluded.bytes_ingested, tail_check = excluded.tail_check,
+                    rows_ingested = excluded.rows_ingested, parser_version = excluded.parser_version,
+                    updated_at = excluded.updated_at, rows_read = excluded.rows_read,
+                    rows_dropped = excluded.rows_dropped''',
+                (source, high_water_ns, json.dumps(sorted(high_water_ids)), end_offset, tail_check,
+                 rows_ingested, PARSER_VERSION, datetime.now().isoformat(timespec='seconds'),
+                 rows_read, rows_dropped))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+            if reader is not file:
+                reader.close()
+
+        summary['seconds'] = time.perf_counter() - started
+        return summary
+
+    def _upsert(self, conn, partials):
+        for name, (keys, values) in AGGREGATE_TABLES.items():
+            partial = partials.get(name)
+            if partial is None or len(partial) == 0:
+                continue
+            if name == 'events':
+                partial = partial.set_axis(partial.index.to_numpy(dtype='datetime64[ns]').view('int64'))
+            frame = partial.to_frame(values[0]) if isinstance(partial, pd.Series) else partial
+            frame = frame.rename_axis(keys).reset_index()[keys + values]
+            columns = ', '.join(_quote(c) for c in keys + values)
+            updates = ', '.join(f'{_quote(v)} = {_quote(v)} + excluded.{_quote(v)}' for v in values)
+            conn.executemany(
+                f'INSERT INTO {_quote("agg_" + name)} ({columns}) VALUES ({", ".join("?" * len(keys + values))}) '
+                f'ON CONFLICT({", ".join(_quote(k) for k in keys)}) DO UPDATE SET {updates}',
+                frame.astype(object).to_numpy().tolist())
+
+    def load_aggregates(self):
+        # Aggregati dello storico nello stesso formato della modalità streaming
+        aggregates = StreamingAggregates()
+        partials = {}
+        with closing(self._connect()) as conn:
+            for name, (keys, values) in AGGREGATE_TABLES.items():
+                frame = pd.read_sql_query(f'SELECT * FROM {_quote("agg_" + name)}', conn)
+                if frame.empty:
+                    continue
+                frame = frame.set_index(keys)
+                partials[name] = frame[values[0]] if values == ['count'] or values == ['value'] else frame
+            rows_read, rows_dropped = conn.execute(
+                'SELECT COALESCE(SUM(COALESCE(rows_read, rows_ingested)), 0), COALESCE(SUM(rows_dropped), 0) '
+                'FROM sources').fetchone()
+
+        if 'events' in partials:
+            events = partials['events']
+            events.index = pd.to_datetime(events.index.to_numpy(dtype='int64').view('datetime64[ns]'))
+        else:
+            partials['events'] = pd.DataFrame({'starts': [], 'ends': []}, dtype='int32')
+        if 'breakdown' in partials:
+            partials['breakdown'] = partials['breakdown'].rename_axis(None)
+        else:
+            partials['breakdown'] = pd.Series(dtype='int64')
+        for name in FOLDED_AGGREGATES:
+            if name in partials and isinstance(partials[name], pd.Series):
+                partials[name] = partials[name].rename('count')
+
+        aggregates.add_partials(partials)
+        aggregates.rows_read = int(rows_read)
+        aggregates.rows_dropped = int(rows_dropped)
+        return aggregates
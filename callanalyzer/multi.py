@@ -0,0 +1,152 @@
+import glob
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from .cache import ParquetCache, file_digest, process_and_cache
+from .profiling import record_cache, span
+from .schema import compact_frame
+
+# Ingestione di più export 3CX in parallelo.
+#
+# Ogni file ha la sua voce nella cache su disco (hash del contenuto), quindi
+# aggiungendo l'export di un nuovo giorno viene elaborato solo quel file.
+# I file non in cache vengono elaborati in un pool di processi; i risultati
+# sono uniti ed eventuali chiamate ripetute da export sovrapposti vengono
+# rimosse su Call ID + Call Time.
+
+DEDUP_COLUMNS = ['Call ID', 'Call Time']
+
+
+def expand_sources(sources):
+    # Percorsi di file o cartelle (tutti i *.csv contenuti) -> lista di file
+    files = []
+    for source in sources:
+        if isinstance(source, (str, os.PathLike)) and os.path.isdir(source):
+            files.extend(sorted(glob.glob(os.path.join(source, '*.csv'))))
+        else:
+            files.append(source)
+    return files
+
+
+def _source_name(source):
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.basename(source)
+    return getattr(source, 'name', None)
+
+
+def _payload(source):
+    # I file caricati in memoria vanno passati ai worker come bytes
+    if isinstance(source, (str, os.PathLike)):
+        return source
+    return io.BytesIO(source.getvalue())
+
+
+def _process_in_worker(payload, key, source_name, cache_dir, cache_max_bytes):
+    cache = ParquetCache(cache_dir, cache_max_bytes) if cache_dir else None
+    return process_and_cache(payload, cache, key, source=source_name)
+
+
+def load_many(sources, cache=None, max_workers=None, return_exceptions=False):
+    # Restituisce [(df, info)] nello stesso ordine di `sources`. Con
+    # return_exceptions=True un file che fallisce lascia l'eccezione al suo
+    # posto invece di interrompere gli altri.
+    results = [None] * len(sources)
+    keys = [None] * len(sources)
+
+    # Prima le voci già in cache, lette direttamente in questo processo
+    missing = []
+    for i, source in enumerate(sources):
+        try:
+            with span('file_digest'):
+                keys[i] = file_digest(source)
+            cached = None
+            if cache is not None:
+                with span('cache_disco_lettura'):
+                    cached = cache.get(keys[i])
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            results[i] = e
+            continue
+        if cached is not None:
+            record_cache('disco', True)
+            results[i] = (cached[0], dict(cached[1], from_cache=True))
+        else:
+            if cache is not None:
+                record_cache('disco', False)
+            missing.append(i)
+
+    def collect(i, load):
+        try:
+            results[i] = load()
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            results[i] = e
+
+    max_workers = min(len(missing), max_workers or os.cpu_count() or 1)
+    if max_workers <= 1:
+        for i in missing:
+            collect(i, lambda: process_and_cache(sources[i], cache, keys[i], source=_source_name(sources[i])))
+        return results
+
+    cache_dir = cache.directory if cache is not None else None
+    cache_max_bytes = cache.max_bytes if cache is not None else None
+    # Le fasi dentro i processi worker non sono profilate: si misura il pool intero
+    with span('process_calls_parallelo'), ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            i: pool.submit(_process_in_worker, _payload(sources[i]), keys[i],
+                           _source_name(sources[i]), cache_dir, cache_max_bytes)
+            for i in missing
+        }
+        for i, future in futures.items():
+            collect(i, future.result)
+    return results
+
+
+def merge_calls(results):
+    # Unisce i risultati di load_many e rimuove i duplicati tra file.
+    # Restituisce (df, info) con lo stesso formato di process_calls.
+    frames = [df for df, _ in results]
+    infos = [info for _, info in results]
+    if len(frames) == 1:
+        return frames[0], dict(infos[0], files=1, duplicates=0)
+
+    with span('merge_calls', rows=sum(len(df) for df in frames)):
+        # Le categorie differiscono tra file: si uniscono come stringhe e si ricompatta
+        merged = pd.concat(
+            [df.astype({col: 'object' for col in df.select_dtypes('category').columns}) for df in frames],
+            ignore_index=True,
+        )
+        subset = [col for col in DEDUP_COLUMNS if col in merged.columns]
+        before = len(merged)
+        merged = merged.drop_duplicates(subset=subset).sort_values('Call Time', kind='stable')
+        merged = merged.reset_index(drop=True)
+        duplicates = before - len(merged)
+        merged, memory_table = compact_frame(merged)
+
+    date_formats = {}
+    for info in infos:
+        for fmt, count in info['date_formats'].items():
+            date_formats[fmt] = date_formats.get(fmt, 0) + count
+    info = {
+        'columns': infos[0]['columns'],
+        'rows_read': sum(info['rows_read'] for info in infos),
+        'call_time_head': infos[0]['call_time_head'],
+        'date_formats': date_formats,
+        'date_fallback': sum(info['date_fallback'] for info in infos),
+        'rows_dropped': sum(info['rows_dropped'] for info in infos),
+        'malformed': {
+            column: sum(info['malformed'][column] for info in infos)
+            for column in infos[0]['malformed']
+        },
+        'memory': memory_table.to_dict(),
+        'from_cache': all(info['from_cache'] for info in infos),
+        'files': len(infos),
+        'files_from_cache': sum(info['from_cache'] for info in infos),
+        'duplicates': duplicates,
+    }
+    return merged, info
@@ -0,0 +1,360 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .profiling import record_cache
+
+# Parsing vettoriale delle colonne di durata (Ringing, Talking).
+#
+# Le durate si ripetono moltissimo, quindi la colonna viene prima fattorizzata
+# e solo i valori distinti vengono analizzati, con operazioni stringa di pandas
+# e aritmetica intera NumPy. I pochi valori distinti che non rientrano nei
+# formati comuni passano dalla versione scalare, così il risultato è identico
+# a duration_to_seconds.
+
+_HHMMSS = r'^\s*([+-]?[0-9]{1,15})\s*:\s*([+-]?[0-9]{1,15})\s*:\s*([+-]?[0-9]{1,15})\s*$'
+_MMSS = r'^\s*([+-]?[0-9]{1,15})\s*:\s*([+-]?[0-9]{1,15})\s*$'
+_SECONDS = r'^\s*([+-]?[0-9]{1,15})(?:\.[0-9]*)?\s*$'
+_MAX_SECONDS = np.iinfo('int64').max
+
+
+def _scalar_duration(s):
+    # Versione scalare: None se il valore non è interpretabile
+    if pd.isna(s) or s == '' or s is None:
+        return 0
+    try:
+        # Gestisce formati come "00:05:30" o "5:30" o "30"
+        s = str(s).strip()
+        if ':' in s:
+            parts = s.split(':')
+            if len(parts) == 3:  # HH:MM:SS
+                hours, minutes, seconds = map(int, parts)
+                return hours * 3600 + minutes * 60 + seconds
+            elif len(parts) == 2:  # MM:SS
+                minutes, seconds = map(int, parts)
+                return minutes * 60 + seconds
+            return None
+        else:
+            # Solo secondi
+            return int(float(s))
+    except (ValueError, OverflowError):
+        return None
+
+
+def duration_to_seconds(s):
+    seconds = _scalar_duration(s)
+    return 0 if seconds is None else seconds
+
+
+def _parse_unique_durations(uniques):
+    # Restituisce (secondi, malformati) per ogni valore distinto
+    text = pd.Series(uniques, dtype=object).map(str)
+    seconds = np.zeros(len(text), dtype='int64')
+    parsed = np.zeros(len(text), dtype=bool)
+
+    hms = text.str.extract(_HHMMSS)
+    mask = hms[0].notna().to_numpy()
+    if mask.any():
+        parts = hms[mask].astype('int64').to_numpy()
+        seconds[mask] = parts[:, 0] * 3600 + parts[:, 1] * 60 + parts[:, 2]
+        parsed |= mask
+
+    ms = text.str.extract(_MMSS)
+    mask = ms[0].notna().to_numpy() & ~parsed
+    if mask.any():
+        parts = ms[mask].astype('int64').to_numpy()
+        seconds[mask] = parts[:, 0] * 60 + parts[:, 1]
+        parsed |= mask
+
+    secs = text.str.extract(_SECONDS)[0]
+    mask = secs.notna().to_numpy() & ~parsed
+    if mask.any():
+        seconds[mask] = secs[mask].astype('int64').to_numpy()
+        parsed |= mask
+
+    # Valori fuori dai formati comuni: fallback scalare, solo sui distinti
+    malformed = np.zeros(len(text), dtype=bool)
+    for i in np.flatnonzero(~parsed):
+        value = _scalar_duration(uniques[i])
+        if value is None or abs(value) > _MAX_SECONDS:
+            malformed[i] = True
+        else:
+            seconds[i] = value
+
+    return seconds, malformed
+
+
+def parse_durations(values):
+    # Converte una colonna di durate in secondi (int64).
+    # Restituisce anche la maschera delle righe con valori non interpretabili,
+    # che vengono conteggiate come 0 secondi.
+    values = pd.Series(values)
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    unique_seconds, unique_malformed = _parse_unique_durations(np.asarray(uniques, dtype=object))
+
+    valid = codes >= 0
+    seconds = np.zeros(len(codes), dtype='int64')
+    malformed = np.zeros(len(codes), dtype=bool)
+    seconds[valid] = unique_seconds[codes[valid]]
+    malformed[valid] = unique_malformed[codes[valid]]
+
+    return (pd.Series(seconds, index=values.index, name=values.name),
+            pd.Series(malformed, index=values.index, name=values.name))
+
+
+# Riconoscimento del formato di Call Time.
+#
+# I formati candidati vengono provati su un piccolo campione di righe e la
+# colonna viene convertita una sola volta con il formato vincente. Se il file
+# mescola più formati, le righe rimaste vengono ricampionate e convertite in
+# blocco con il formato successivo. Se più formati convertono il campione
+# allo stesso modo (gg/mm e mm/gg con giorni fino a 12) decide il numero di
+# righe convertite sull'intera colonna. I formati scelti vengono ricordati per
+# sorgente (ultime _FORMAT_CACHE_MAX) e decidono i pareggi che restano anche
+# sull'intera colonna, ad esempio nei blocchi successivi di un file letto in
+# streaming. Le date con fuso orario restano all'ora locale scritta
+# nell'export, senza conversione in UTC.
+
+DATE_FORMATS = [
+    '%Y-%m-%dT%H:%M:%S',    # 2025-07-25T11:41:48 (formato ISO)
+    '%Y-%m-%d %H:%M:%S',    # 2024-01-15 14:30:25
+    '%d/%m/%Y %H:%M:%S',    # 15/01/2024 14:30:25
+    '%m/%d/%Y %H:%M:%S',    # 01/15/2024 14:30:25
+    '%d-%m-%Y %H:%M:%S',    # 15-01-2024 14:30:25
+    '%Y/%m/%d %H:%M:%S',    # 2024/01/15 14:30:25
+    '%d.%m.%Y %H:%M:%S',    # 15.01.2024 14:30:25
+    '%Y-%m-%d %H:%M',       # 2024-01-15 14:30
+    '%d/%m/%Y %H:%M',       # 15/01/2024 14:30
+]
+
+_FORMAT_CACHE = {}
+_FORMAT_CACHE_MAX = 256
+_TZ_SUFFIX = r'\s*(?:Z|UTC|GMT|[+-]\d{2}:?\d{2})$'
+
+
+def _sample(values, size):
+    # Campione distribuito su tutta la colonna, non solo le prime righe
+    if len(values) <= size:
+        return values
+    positions = np.linspace(0, len(values) - 1, size).astype('int64')
+    return values.iloc[np.unique(positions)]
+
+
+def _best_sample_formats(values, formats, sample_size):
+    # Formati che convertono la quota maggiore del campione, nell'ordine della lista
+    sample = _sample(values.dropna(), sample_size)
+    if sample.empty:
+        return []
+    counts = {fmt: pd.to_datetime(sample, format=fmt, errors='coerce').notna().sum() for fmt in formats}
+    best_count = max(counts.values(), default=0)
+    if best_count == 0:
+        return []
+    return [fmt for fmt in formats if counts[fmt] == best_count]
+
+
+def detect_datetime_format(values, formats=None, sample_size=200):
+    # Restituisce il formato che converte tutto il campione; altrimenti quello
+    # che ne converte la quota maggiore (a parità vince l'ordine della lista).
+    # None se nessun formato converte almeno un valore.
+    formats = DATE_FORMATS if formats is None else formats
+    best = _best_sample_formats(values, formats, sample_size)
+    return best[0] if best else None
+
+
+def _to_naive(parsed):
+    # Date con fuso: ora locale del valore, senza conversione
+    if isinstance(parsed.dtype, pd.DatetimeTZDtype):
+        return parsed.dt.tz_localize(None)
+    return parsed
+
+
+def _parse_mixed(uniques):
+    # Parsing generico dei valori distinti rimasti. L'offset del fuso viene
+    # tolto prima del parsing: resta l'ora scritta nell'export e offset
+    # diversi nello stesso file (es. cambio dell'ora legale) non sono un errore
+    text = pd.Series(uniques, dtype=object).astype(str).str.replace(_TZ_SUFFIX, '', regex=True)
+    try:
+        parsed = pd.to_datetime(text, format='mixed', errors='coerce')
+    except (ValueError, TypeError):
+        parsed = pd.Series([_to_naive(pd.Series(pd.to_datetime([value], errors='coerce')))[0] for value in text])
+    return np.asarray(_to_naive(parsed), dtype='datetime64[ns]')
+
+
+def parse_call_times(values, source=None, sample_size=200):
+    # Converte la colonna Call Time. Restituisce la serie convertita (NaT per
+    # i valori non interpretabili) e un dizionario con i formati usati
+    # (formato -> righe convertite) e le righe passate dal parsing generico.
+    values = pd.Series(values)
+    info = {'formats': {}, 'fallback': 0, 'cached': False}
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        info['fallback'] = int(values.notna().sum())
+        return pd.Series(np.asarray(_to_naive(values), dtype='datetime64[ns]'), index=values.index,
+                         name=values.name), info
+    result = np.full(len(values), np.datetime64('NaT'), dtype='datetime64[ns]')
+    remaining = values.notna().to_numpy().copy()
+
+    def convert(fmt):
+        positions = np.flatnonzero(remaining)
+        parsed = pd.to_datetime(values.iloc[positions], format=fmt, errors='coerce')
+        return positions, np.asarray(parsed, dtype='datetime64[ns]')
+
+    def apply_format(fmt, converted=None):
+        positions, parsed = converted or convert(fmt)
+        ok = ~np.isnat(parsed)
+        if ok.any():
+            result[positions[ok]] = parsed[ok]
+            remaining[positions[ok]] = False
+            info['formats'][fmt] = int(ok.sum())
+
+    # Formati già visti per questa sorgente: mai applicati senza verifica (lo
+    # stesso nome file può avere un altro ordine giorno/mese), solo per i pareggi
+    cached_formats = _FORMAT_CACHE.get(source, []) if source is not None else []
+    candidates = list(DATE_FORMATS)
+    while remaining.any() and candidates:
+        best = _best_sample_formats(values[remaining], candidates, sample_size)
+        if not best:
+            break
+        if len(best) == 1:
+            fmt, converted = best[0], None
+        else:
+            # Il campione non distingue i formati: vince chi converte più righe dell'intera colonna
+            conversions = {fmt: convert(fmt) for fmt in best}
+            counts = {fmt: int((~np.isnat(conversions[fmt][1])).sum()) for fmt in best}
+            top = [fmt for fmt in best if counts[fmt] == max(counts.values())]
+            fmt = next((fmt for fmt in cached_formats if fmt in top), top[0])
+            converted = conversions[fmt]
+        candidates.remove(fmt)
+        apply_format(fmt, converted)
+    info['cached'] = bool(info['formats']) and all(fmt in cached_formats for fmt in info['formats'])
+
+    # Valori residui in formati non previsti: parsing generico sui soli distinti
+    if remaining.any():
+        positions = np.flatnonzero(remaining)
+        codes, uniques = pd.factorize(values.iloc[positions])
+        parsed = _parse_mixed(uniques)[codes]
+        ok = ~np.isnat(parsed)
+        result[positions[ok]] = parsed[ok]
+        info['fallback'] = int(ok.sum())
+
+    if source is not None and info['formats']:
+        _FORMAT_CACHE.pop(source, None)
+        _FORMAT_CACHE[source] = list(info['formats'])
+        while len(_FORMAT_CACHE) > _FORMAT_CACHE_MAX:
+            _FORMAT_CACHE.pop(next(iter(_FORMAT_CACHE)), None)
+
+    return pd.Series(result, index=values.index, name=values.name), info
+
+
+# Parsing di From/To e di Call Activity Details.
+#
+# Ogni valore distinto viene interpretato una sola volta, con operazioni
+# stringa vettoriali sugli uniques di factorize, e il risultato riportato
+# sulle righe tramite i codici. Per From/To, che hanno pochi valori distinti,
+# le tabelle di lookup restano in memoria tra un file e l'altro, così gli
+# export successivi dello stesso centralino trovano già interpretata quasi
+# ogni stringa. Quando i distinti sono quasi quante le righe (Call Activity
+# Details è quasi univoca) la cache non serve e viene saltata. Le cache sono
+# condivise tra i thread (sessioni Streamlit): si accede sotto lock e il
+# risultato di ogni chiamata viene costruito localmente, così una pulizia
+# concorrente non lo tocca.
+
+# Nome e numero in un solo passaggio: "5904 Cassa 04 (5904)" -> ("5904 Cassa 04", "5904")
+_PARTY = r'(.*?)\s*\((.*?)\)'
+_TRANSFER = r'transfer|forward'
+_ENDED_BY_CALLER = r'ended by[^\n]*\('
+_LOOKUP_MAX_ENTRIES = 500_000
+
+_PARTY_CACHE = {}
+_ACTIVITY_CACHE = {}
+_LOOKUP_LOCK = threading.Lock()
+_MISSING = object()
+
+
+def _is_text(values):
+    dtype = values.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        dtype = dtype.categories.dtype
+    return pd.api.types.is_string_dtype(dtype)
+
+
+def _lookup(values, cache, parse_uniques, name):
+    # Risultato di parse_uniques (Series di uniques -> un array per campo)
+    # allineato agli uniques, più i codici per riga (-1 per i NaN). La cache
+    # per valore distinto si usa solo se i distinti sono al più metà delle righe.
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    uniques = pd.Series(uniques)
+    if len(uniques) * 2 > len(values):
+        record_cache(name, False)
+        return codes, parse_uniques(uniques)
+
+    with _LOOKUP_LOCK:
+        hits = [cache.get(value, _MISSING) for value in uniques]
+    missing = np.array([hit is _MISSING for hit in hits], dtype=bool)
+    missing_positions = np.flatnonzero(missing)
+    hit_positions = np.flatnonzero(~missing)
+    record_cache(name, not len(missing_positions))
+
+    parsed = parse_uniques(uniques.iloc[missing_positions].reset_index(drop=True))
+    fields = []
+    for k, column in enumerate(parsed):
+        field = np.empty(len(uniques), dtype=column.dtype)
+        field[missing_positions] = column
+        field[hit_positions] = [hits[i][k] for i in hit_positions]
+        fields.append(field)
+
+    if len(missing_positions):
+        with _LOOKUP_LOCK:
+            if len(cache) + len(missing_positions) > _LOOKUP_MAX_ENTRIES:
+                cache.clear()
+            if len(missing_positions) <= _LOOKUP_MAX_ENTRIES:
+                cache.update(zip(uniques.iloc[missing_positions], zip(*parsed)))
+    return codes, fields
+
+
+def _parse_unique_parties(uniques):
+    parts = uniques.str.extract(_PARTY)
+    return (parts[0].fillna(uniques).to_numpy(dtype=object),
+            parts[1].fillna('Unknown').to_numpy(dtype=object))
+
+
+def parse_parties(values):
+    # Colonna From/To -> (nome, numero). Senza parentesi il nome è il valore
+    # intero e il numero "Unknown"; un valore mancante resta mancante nel nome.
+    values = pd.Series(values)
+    if not _is_text(values):
+        # Come str.extract: la colonna deve essere testuale
+        raise AttributeError('Can only use .str accessor with string values!')
+    codes, (names, numbers) = _lookup(values, _PARTY_CACHE, _parse_unique_parties, 'lookup_parti')
+
+    # Il codice -1 dei NaN prende l'ultimo elemento di ciascun lookup
+    names = np.append(names, np.nan)
+    numbers = np.append(numbers, 'Unknown')
+    name = pd.Series(names[codes], index=values.index)
+    number = pd.Series(numbers[codes], index=values.index)
+    if isinstance(values.dtype, pd.StringDtype):
+        name, number = name.astype(values.dtype), number.astype(values.dtype)
+    return name, number
+
+
+def _parse_unique_activity(uniques):
+    if uniques.dtype == object:
+        # Valori non testuali in una colonna object: nessun flag
+        uniques = uniques.where([isinstance(value, str) for value in uniques])
+    text = uniques.str.lower()
+    return (text.str.contains(_TRANSFER, na=False).to_numpy(dtype=bool),
+            text.str.contains(_ENDED_BY_CALLER, na=False).to_numpy(dtype=bool))
+
+
+def parse_activity_flags(values):
+    # Call Activity Details -> (trasferita, chiusa dal chiamante); False per i NaN
+    values = pd.Series(values)
+    if not _is_text(values):
+        return (pd.Series(False, index=values.index, dtype=bool),
+                pd.Series(False, index=values.index, dtype=bool))
+    codes, (transferred, ended_by_caller) = _lookup(
+        values, _ACTIVITY_CACHE, _parse_unique_activity, 'lookup_activity')
+    transferred = np.append(transferred, False)
+    ended_by_caller = np.append(ended_by_caller, False)
+    return (pd.Series(transferred[codes], index=values.index),
+            pd.Series(ended_by_caller[codes], index=values.index))
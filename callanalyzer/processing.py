@@ -0,0 +1,127 @@
+import pandas as pd
+
+from .parsing import parse_activity_flags, parse_call_times, parse_durations, parse_parties
+from .profiling import record_cache, span
+from .schema import compact_frame
+
+# Colonne derivate calcolate a partire dal log 3CX con Call Time già convertito.
+# Funzioni pure: nessuna chiamata Streamlit, derive_columns può essere
+# applicata anche a blocchi di righe (modalità streaming).
+
+# Da incrementare a ogni modifica del risultato di process_calls: invalida la
+# cache su disco dei file già elaborati
+PARSER_VERSION = '5'
+
+
+def derive_columns(df):
+    # Restituisce il DataFrame arricchito e un report con i conteggi delle
+    # durate non interpretabili
+    with span('parse_durations', rows=len(df)):
+        df['Ringing_sec'], ringing_malformed = parse_durations(df['Ringing'])
+        df['Talking_sec'], talking_malformed = parse_durations(df['Talking'])
+        df['Total_Duration_sec'] = df['Ringing_sec'] + df['Talking_sec']
+        df['End'] = df['Call Time'] + pd.to_timedelta(df['Total_Duration_sec'], unit='s')
+
+    # Analisi temporale
+    with span('colonne_temporali', rows=len(df)):
+        df['Hour'] = df['Call Time'].dt.hour
+        df['Date'] = df['Call Time'].dt.date
+        df['DayOfWeek'] = df['Call Time'].dt.day_name()
+        df['Week'] = df['Call Time'].dt.isocalendar().week
+        df['Month'] = df['Call Time'].dt.month
+
+    with span('parse_parties', rows=len(df)):
+        # Adatta alle nuove colonne: usa 'From' invece di 'Caller ID'
+        try:
+            # Estrae il nome/numero dalla colonna From (formato: "59004 Cassa 04 (59004)")
+            df['User'], df['User_Number'] = parse_parties(df['From'])
+        except:
+            df['User'] = df['From'].fillna("Unknown")
+            df['User_Number'] = "Unknown"
+
+        # Crea campo destination dalla colonna To
+        try:
+            df['Destination'], df['Destination_Number'] = parse_parties(df['To'])
+        except:
+            df['Destination'] = df['To'].fillna("Unknown")
+            df['Destination_Number'] = "Unknown"
+
+    with span('colonne_status', rows=len(df)):
+        # Analisi avanzata degli status
+        df['Status_clean'] = df['Status'].str.lower().str.strip()
+
+        # Categorizzazione più dettagliata
+        df['Is_Internal'] = df['Direction'].str.lower() == 'internal'
+        df['Is_Inbound'] = df['Direction'].str.lower() == 'inbound'
+        df['Is_Outbound'] = df['Direction'].str.lower() == 'outbound'
+
+        # Analisi dettagliata dello status
+        df['Is_Answered'] = df['Status_clean'].isin(['answered', 'connected'])
+        df['Is_Missed'] = df['Status_clean'].isin(['missed', 'unanswered', 'no answer'])
+        df['Is_Busy'] = df['Status_clean'].isin(['busy', 'user busy'])
+        df['Is_Failed'] = df['Status_clean'].isin(['failed', 'error', 'rejected'])
+        df['Is_Abandoned'] = df['Status_clean'].isin(['abandoned', 'caller hangup'])
+
+        # Analisi durata per categorizzare meglio
+        df['Has_Talking_Time'] = df['Talking_sec'] > 0
+        df['Has_Only_Ringing'] = (df['Ringing_sec'] > 0) & (df['Talking_sec'] == 0)
+        df['No_Duration'] = (df['Ringing_sec'] == 0) & (df['Talking_sec'] == 0)
+
+        # Categorizzazione corretta basata sui dati reali
+        df['Real_Conversation'] = (df['Status_clean'] == 'answered') & (df['Talking_sec'] > 0)
+        df['Likely_Abandoned'] = (df['Status_clean'] == 'answered') & (df['Talking_sec'] == 0)
+        df['Other_Status'] = df['Status_clean'] != 'answered'
+
+    # Considera come trasferiti quelli con activity details che contengono "transfer" o "forward"
+    if 'Call Activity Details' in df.columns:
+        with span('parse_activity_flags', rows=len(df)):
+            df['Is_Transferred'], df['Ended_By_Caller'] = parse_activity_flags(df['Call Activity Details'])
+    else:
+        df['Is_Transferred'] = False
+        df['Ended_By_Caller'] = False
+
+    report = {
+        'Ringing': int(ringing_malformed.sum()),
+        'Talking': int(talking_malformed.sum()),
+    }
+    return df, report
+
+
+def process_calls(file, source=None):
+    # Pipeline completa: lettura CSV, date, colonne derivate, schema compatto.
+    # Restituisce il DataFrame e un dizionario (serializzabile in JSON) con le
+    # informazioni da mostrare all'utente.
+    with span('read_csv') as read_span:
+        df = pd.read_csv(file)
+        read_span.set(rows=len(df))
+    info = {
+        'columns': list(df.columns),
+        'rows_read': len(df),
+        'call_time_head': [str(v) for v in df['Call Time'].head(3).tolist()],
+    }
+
+    # Riconosce il formato delle date su un campione e converte la colonna in blocco
+    with span('parse_call_times', rows=len(df)):
+        df['Call Time'], date_info = parse_call_times(df['Call Time'], source=source)
+    record_cache('formato_data', date_info['cached'])
+    if not date_info['formats'] and not date_info['fallback']:
+        raise ValueError("Impossibile convertire la colonna Call Time: nessun formato data riconosciuto")
+    info['date_formats'] = date_info['formats']
+    info['date_fallback'] = date_info['fallback']
+
+    # Rimuovi le righe con date non valide e ordina per Call Time: i filtri
+    # per periodo e fascia oraria lavorano per intervalli di posizioni
+    before_dropna = len(df)
+    with span('ordina_per_call_time', rows=before_dropna):
+        df = df.dropna(subset=['Call Time']).sort_values('Call Time', kind='stable').reset_index(drop=True)
+    info['rows_dropped'] = before_dropna - len(df)
+
+    with span('derive_columns', rows=len(df)):
+        df, info['malformed'] = derive_columns(df)
+
+    # Schema compatto: categorie, interi stretti, flag bool
+    with span('compact_frame', rows=len(df)):
+        df, memory_table = compact_frame(df)
+    info['memory'] = memory_table.to_dict()
+
+    return df, info
@@ -0,0 +1,258 @@
+import contextvars
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows: niente picco RSS del processo
+    resource = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+import pandas as pd
+
+# Profilazione per fase della pipeline e della dashboard.
+#
+#   with profiling() as profiler:
+#       df, info = process_calls('export.csv')
+#   print(profiler.table())
+#
+# Le funzioni della libreria aprono degli span con `span(nome)`: senza un
+# profiler attivo `span` restituisce un contesto vuoto condiviso, quindi il
+# costo è una lettura di ContextVar per fase. Con un profiler attivo ogni
+# span registra tempo, righe, picco di memoria (tracemalloc: array numpy e
+# oggetti Python; i buffer Arrow sono riportati come variazione del pool) e
+# gli hit/miss delle cache incontrati al suo interno. Il profiler è legato al
+# contesto corrente: sessioni Streamlit diverse non si mescolano (tracemalloc
+# invece è globale al processo, quindi con più profilazioni contemporanee con
+# memoria attiva i picchi sono indicativi).
+
+_CURRENT = contextvars.ContextVar('callanalyzer_profiler', default=None)
+
+
+class _NullSpan:
+    # Span inattivo: nessuna misura, nessuna allocazione
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, rows=None, **extra):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+
+    def __init__(self, profiler, name, rows=None):
+        self.profiler = profiler
+        self.name = name
+        self.rows = rows
+        self.extra = {}
+        self.cache = {}
+        self.path = name
+        self.depth = 0
+        self.offset = 0.0
+        self.seconds = None
+        self.peak_bytes = None
+        self.arrow_bytes = None
+        self._observed_peak = 0
+        self._start_traced = 0
+        self._start_arrow = 0
+        self._start = None
+
+    def set(self, rows=None, **extra):
+        if rows is not None:
+            self.rows = int(rows)
+        self.extra.update(extra)
+
+    def __enter__(self):
+        self.profiler._enter(self)
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._exit(self)
+        return False
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'path': self.path,
+            'depth': self.depth,
+            'offset_sec': round(self.offset, 6),
+            'seconds': None if self.seconds is None else round(self.seconds, 6),
+            'rows': self.rows,
+            'rows_per_sec': round(self.rows / self.seconds) if self.rows and self.seconds else None,
+            'peak_mb': None if self.peak_bytes is None else round(self.peak_bytes / 1024 ** 2, 3),
+            'arrow_mb': None if self.arrow_bytes is None else round(self.arrow_bytes / 1024 ** 2, 3),
+            'cache': {name: dict(counts) for name, counts in self.cache.items()},
+            **self.extra,
+        }
+
+
+class Profiler:
+
+    def __init__(self, memory=True, label=None):
+        self.memory = memory
+        self.label = label
+        self.spans = []
+        self.cache = {}
+        self._stack = []
+        self._started = None
+        self._finished = None
+        self._own_tracemalloc = False
+
+    def span(self, name, rows=None):
+        return Span(self, name, rows)
+
+    def start(self):
+        self._started = time.perf_counter()
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._own_tracemalloc = True
+        return self
+
+    def stop(self):
+        while self._stack:
+            self._exit(self._stack[-1])
+        self._finished = time.perf_counter()
+        if self._own_tracemalloc:
+            tracemalloc.stop()
+            self._own_tracemalloc = False
+
+    def _enter(self, span):
+        if self._stack:
+            parent = self._stack[-1]
+            span.path = f'{parent.path} > {span.name}'
+            span.depth = parent.depth + 1
+        span.offset = time.perf_counter() - (self._started or time.perf_counter())
+        if self.memory and tracemalloc.is_tracing():
+            traced, peak = tracemalloc.get_traced_memory()
+            # Il picco del padre fino a qui, prima di azzerarlo per il figlio
+            if self._stack:
+                self._stack[-1]._observed_peak = max(self._stack[-1]._observed_peak, peak)
+            tracemalloc.reset_peak()
+            span._start_traced = traced
+            span._observed_peak = traced
+            if pa is not None:
+                span._start_arrow = pa.total_allocated_bytes()
+        self.spans.append(span)
+        self._stack.append(span)
+        span._start = time.perf_counter()
+
+    def _exit(self, span):
+        span.seconds = time.perf_counter() - span._start
+        if self._stack and self._stack[-1] is span:
+            self._stack.pop()
+        if self.memory and tracemalloc.is_tracing():
+            peak = max(span._observed_peak, tracemalloc.get_traced_memory()[1])
+            span.peak_bytes = max(peak - span._start_traced, 0)
+            if pa is not None:
+                span.arrow_bytes = pa.total_allocated_bytes() - span._start_arrow
+            if self._stack:
+                self._stack[-1]._observed_peak = max(self._stack[-1]._observed_peak, peak)
+
+    def record_cache(self, name, hit):
+        outcome = 'hit' if hit else 'miss'
+        counts = self.cache.setdefault(name, {'hit': 0, 'miss': 0})
+        counts[outcome] += 1
+        if self._stack:
+            span_counts = self._stack[-1].cache.setdefault(name, {'hit': 0, 'miss': 0})
+            span_counts[outcome] += 1
+
+    @property
+    def total_seconds(self):
+        if self._started is None:
+            return 0.0
+        return (self._finished or time.perf_counter()) - self._started
+
+    def to_dict(self):
+        return {
+            'label': self.label,
+            'created': pd.Timestamp.now().isoformat(timespec='seconds'),
+            'total_seconds': round(self.total_seconds, 6),
+            'memory_tracking': self.memory,
+            'rss_peak_mb': _rss_peak_mb(),
+            'spans': [span.to_dict() for span in self.spans],
+            'cache': {name: dict(counts) for name, counts in self.cache.items()},
+        }
+
+    def to_json(self, indent=2):
+        return json.dumps(self.to_dict(), indent=indent, default=str)
+
+    def table(self):
+        return report_table(self.to_dict())
+
+    def cache_table(self):
+        return report_cache_table(self.to_dict())
+
+
+def report_table(report):
+    # Una riga per span del report (anche riletto da JSON), nome rientrato secondo l'annidamento
+    return pd.DataFrame([{
+        'Fase': '  ' * span['depth'] + span['name'],
+        'Secondi': None if span['seconds'] is None else round(span['seconds'], 4),
+        'Righe': span['rows'],
+        'Righe_Al_Sec': span['rows_per_sec'],
+        'Memoria_Picco_MB': None if span['peak_mb'] is None else round(span['peak_mb'], 1),
+        'Arrow_MB': None if span['arrow_mb'] is None else round(span['arrow_mb'], 1),
+        'Cache': ', '.join(f"{name}: {counts['hit']} hit / {counts['miss']} miss"
+                           for name, counts in span['cache'].items()),
+    } for span in report['spans']], columns=['Fase', 'Secondi', 'Righe', 'Righe_Al_Sec', 'Memoria_Picco_MB',
+                                             'Arrow_MB', 'Cache'])
+
+
+def report_cache_table(report):
+    return pd.DataFrame([
+        {'Cache': name, 'Hit': counts['hit'], 'Miss': counts['miss']} for name, counts in report['cache'].items()
+    ], columns=['Cache', 'Hit', 'Miss'])
+
+
+def _rss_peak_mb():
+    if resource is None:
+        return None
+    # ru_maxrss è in KB su Linux, in byte su macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+@contextmanager
+def profiling(enabled=True, memory=True, label=None):
+    # Attiva un profiler nel contesto corrente; con enabled=False non misura niente
+    if not enabled:
+        yield None
+        return
+    profiler = Profiler(memory=memory, label=label).start()
+    token = _CURRENT.set(profiler)
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        _CURRENT.reset(token)
+
+
+def current_profiler():
+    return _CURRENT.get()
+
+
+def span(name, rows=None):
+    profiler = _CURRENT.get()
+    if profiler is None:
+        return _NULL_SPAN
+    return Span(profiler, name, rows)
+
+
+def record_cache(name, hit):
+    profiler = _CURRENT.get()
+    if profiler is not None:
+        profiler.record_cache(name, hit)
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+from .concurrency import _to_ns, resample_concurrency
+
+# Piramide multi-risoluzione di volume e concorrenza per i grafici temporali.
+#
+# Il livello a 1 minuto viene calcolato dalla funzione a gradini; i livelli
+# più grossi (5 min, 15 min, 1 h, 1 giorno) si ottengono aggregando quello
+# fine: massimo dei picchi, media pesata sul tempo (gli intervalli scoperti
+# ai bordi valgono zero, come in resample_concurrency) e somma delle
+# chiamate. Per un intervallo visibile si usa il livello più fine che sta nel
+# numero massimo di punti; se nemmeno il giorno basta, la serie viene ridotta
+# con LTTB, che conserva i picchi visivi.
+
+PYRAMID_LEVELS = ['1min', '5min', '15min', '1h', '1D']
+PYRAMID_COLUMNS = ['Time', 'Chiamate', 'Concurrent Calls', 'Mean Concurrent Calls']
+DEFAULT_MAX_POINTS = 2000
+
+
+def lttb(x, y, n_out):
+    # Largest-Triangle-Three-Buckets: indici di n_out punti che conservano la forma di y
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    edges = np.linspace(1, n - 1, n_out - 1).astype('int64')
+    selected = np.empty(n_out, dtype='int64')
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        # Punto medio del bucket successivo (o l'ultimo punto)
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[next_lo:max(next_hi, next_lo + 1)].mean()
+        next_y = y[next_lo:max(next_hi, next_lo + 1)].mean()
+        area = np.abs((x[previous] - next_x) * (y[lo:hi] - y[previous])
+                      - (x[previous] - x[lo:hi]) * (next_y - y[previous]))
+        previous = lo + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
+
+
+class ConcurrencyPyramid:
+
+    def __init__(self, levels):
+        self.levels = levels
+
+    def view(self, start=None, end=None, max_points=DEFAULT_MAX_POINTS):
+        # (livello, tabella) per l'intervallo [start, end] con al più max_points punti
+        for freq in PYRAMID_LEVELS:
+            table = self._slice(self.levels[freq], start, end)
+            if len(table) <= max_points:
+                return freq, table
+        positions = lttb(_to_ns(table['Time']), table['Concurrent Calls'].to_numpy(), max_points)
+        return f'{PYRAMID_LEVELS[-1]} (LTTB)', table.iloc[positions].reset_index(drop=True)
+
+    def _slice(self, table, start, end):
+        times = _to_ns(table['Time'])
+        lo = 0 if start is None else int(np.searchsorted(times, _to_ns([start])[0], side='right')) - 1
+        hi = len(times) if end is None else int(np.searchsorted(times, _to_ns([end])[0], side='right'))
+        return table.iloc[max(lo, 0):hi]
+
+
+def build_pyramid(steps):
+    if steps.empty:
+        empty = pd.DataFrame(columns=PYRAMID_COLUMNS)
+        return ConcurrencyPyramid({freq: empty for freq in PYRAMID_LEVELS})
+
+    base = resample_concurrency(steps, PYRAMID_LEVELS[0])
+    # Chiamate iniziate in ogni istante: livello raggiunto meno livello precedente
+    active_after = steps['Active After'].to_numpy()
+    starts = steps['Concurrent Calls'].to_numpy() - np.concatenate([[0], active_after[:-1]])
+    times = _to_ns(steps['Time'])
+    bucket = np.searchsorted(_to_ns(base['Time']), times, side='right') - 1
+    base.insert(1, 'Chiamate', np.bincount(bucket, weights=starts, minlength=len(base)).astype('int64'))
+
+    levels = {PYRAMID_LEVELS[0]: base}
+    for freq in PYRAMID_LEVELS[1:]:
+        level = base.groupby(base['Time'].dt.floor(freq)).agg({
+            'Chiamate': 'sum',
+            'Concurrent Calls': 'max',
+            'Mean Concurrent Calls': 'sum',
+        }).rename_axis('Time').reset_index()
+        level['Mean Concurrent Calls'] /= pd.Timedelta(freq) / pd.Timedelta(PYRAMID_LEVELS[0])
+        levels[freq] = level
+    return ConcurrencyPyramid(levels)
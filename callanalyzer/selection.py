@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+
+# Filtri della dashboard tramite indici di posizione invece di maschere.
+#
+# Il DataFrame elaborato è ordinato per Call Time, quindi il periodo è un
+# intervallo di righe trovato con searchsorted e ogni fascia oraria di un
+# giorno è un blocco contiguo di righe. Per Direction e User si tengono le
+# posizioni (ordinate) delle righe di ciascun valore. Una selezione è un
+# elenco di posizioni (o un intervallo) sul DataFrame condiviso: le colonne
+# si estraggono solo quando servono. L'indice non tiene un riferimento al
+# DataFrame, che va passato a select: un dataset rimosso dallo store
+# condiviso non resta in memoria per colpa dell'indice in cache.
+
+_HOUR_NS = 3_600_000_000_000
+_DAY_NS = 24 * _HOUR_NS
+
+
+def _to_ns(value):
+    return pd.Timestamp(value).as_unit('ns').value
+
+
+def _positions_by_key(values):
+    # Valore -> posizioni crescenti delle righe con quel valore (NaN esclusi)
+    codes, uniques = pd.factorize(values)
+    order = np.argsort(codes, kind='stable')
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    bounds = np.cumsum(counts) + (codes < 0).sum()
+    return {key: order[end - count:end] for key, count, end in zip(uniques, counts, bounds)}
+
+
+def _ranges_to_positions(starts, ends):
+    lengths = ends - starts
+    keep = lengths > 0
+    starts, lengths = starts[keep], lengths[keep]
+    if len(starts) == 0:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(lengths.sum())
+
+
+def _intersect_sorted(a, b):
+    # Intersezione di due array crescenti senza duplicati, senza riordinare
+    if len(a) > len(b):
+        a, b = b, a
+    if len(a) == 0:
+        return a
+    idx = np.searchsorted(b, a).clip(max=len(b) - 1)
+    return a[b[idx] == a]
+
+
+class FrameIndex:
+
+    def __init__(self, df):
+        times = df['Call Time'].to_numpy(dtype='datetime64[ns]').view('int64')
+        if len(times) > 1 and (np.diff(times) < 0).any():
+            raise ValueError("Il DataFrame deve essere ordinato per Call Time")
+        self._times = times
+
+        # Blocchi contigui di righe con la stessa ora dello stesso giorno
+        hour_bucket = times // _HOUR_NS
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(hour_bucket)) + 1]) if len(times) else np.empty(0, np.int64)
+        self._hour_run_starts = starts
+        self._hour_run_ends = np.append(starts[1:], len(times))
+        self._hour_run_hours = df['Hour'].to_numpy()[starts]
+
+        self._key_positions = {col: _positions_by_key(df[col]) for col in ('Direction', 'User')}
+        self._key_missing = {col: bool(df[col].isna().any()) for col in ('Direction', 'User')}
+
+    def keys(self, column):
+        return list(self._key_positions[column])
+
+    def _key_candidates(self, column, selected, lo, hi):
+        # Come isin: le righe con valore mancante restano fuori anche se
+        # tutti i valori sono selezionati
+        positions = self._key_positions[column]
+        if selected is None or (set(positions) <= set(selected) and not self._key_missing[column]):
+            return None
+        parts = []
+        for key in selected:
+            rows = positions.get(key)
+            if rows is not None:
+                parts.append(rows[np.searchsorted(rows, lo):np.searchsorted(rows, hi)])
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return parts[0] if len(parts) == 1 else np.sort(np.concatenate(parts))
+
+    def _hour_candidates(self, hours, lo, hi):
+        if hours is None or (hours[0] <= 0 and hours[1] >= 23):
+            return None
+        keep = (self._hour_run_hours >= hours[0]) & (self._hour_run_hours <= hours[1])
+        starts = self._hour_run_starts[keep].clip(lo, hi)
+        ends = self._hour_run_ends[keep].clip(lo, hi)
+        return _ranges_to_positions(starts, ends)
+
+    def select(self, df, start=None, end=None, directions=None, users=None, hours=None):
+        # Stessa semantica dei filtri della dashboard: date e ore inclusive,
+        # nessun filtro utente se la lista è vuota. df è il DataFrame da cui
+        # è stato costruito l'indice.
+        if len(df) != len(self._times):
+            raise ValueError("Il DataFrame non corrisponde all'indice")
+        lo = 0 if start is None else int(np.searchsorted(self._times, _to_ns(start)))
+        hi = len(self._times) if end is None else int(np.searchsorted(self._times, _to_ns(end) + _DAY_NS))
+        hi = max(lo, hi)
+
+        candidates = [
+            self._key_candidates('Direction', directions, lo, hi),
+            self._key_candidates('User', users or None, lo, hi),
+            self._hour_candidates(hours, lo, hi),
+        ]
+        candidates = sorted((c for c in candidates if c is not None), key=len)
+        if not candidates:
+            return Selection(df, slice(lo, hi))
+        rows = candidates[0]
+        for other in candidates[1:]:
+            rows = _intersect_sorted(rows, other)
+        return Selection(df, rows)
+
+
+class Selection:
+
+    def __init__(self, df, rows):
+        self.df = df
+        self.rows = rows
+
+    def __len__(self):
+        if isinstance(self.rows, slice):
+            return self.rows.stop - self.rows.start
+        return len(self.rows)
+
+    @property
+    def empty(self):
+        return len(self) == 0
+
+    def column(self, name):
+        return self.df[name].iloc[self.rows]
+
+    def frame(self, columns=None):
+        # Materializza solo le colonne richieste delle righe selezionate
+        df = self.df if columns is None else self.df[list(columns)]
+        return df.iloc[self.rows]
+
+    def chunks(self, columns=None, chunk_rows=200_000):
+        # Le righe selezionate a blocchi, per le esportazioni senza copia completa
+        df = self.df if columns is None else self.df[list(columns)]
+        rows = self.rows
+        if isinstance(rows, slice):
+            rows = np.arange(rows.start, rows.stop)
+        for start in range(0, max(len(rows), 1), chunk_rows):
+            yield df.iloc[rows[start:start + chunk_rows]]
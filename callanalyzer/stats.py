@@ -0,0 +1,180 @@
+import pandas as pd
+
+from .callbacks import callback_delay_table, missed_call_callbacks, repeat_callers
+from .capacity import capacity_table, erlang_table, hourly_traffic
+from .callflow import build_call_flows, call_flow_table, call_legs, chain_length_table, extension_time_table
+from .concurrency import concurrency_steps, concurrency_summary, resample_concurrency
+from .profiling import span
+from .schema import DAY_ORDER
+
+# Tabelle di analisi calcolate dal DataFrame elaborato, con gli stessi nomi
+# di colonna mostrati nella dashboard. Usate sia dall'app sia dalla CLI.
+
+
+def status_table(df):
+    # Tutti gli status trovati nel dataset
+    unique_statuses = df['Status'].value_counts().loc[lambda c: c > 0]
+    return pd.DataFrame({
+        'Status': unique_statuses.index,
+        'Conteggio': unique_statuses.values,
+        'Percentuale': (unique_statuses.values / len(df) * 100).round(2)
+    })
+
+
+def non_answered_status_table(df):
+    # Breakdown dettagliato degli status non-answered
+    non_answered = df[df['Status_clean'] != 'answered']
+    non_answered_status = non_answered['Status'].value_counts().loc[lambda c: c > 0]
+    return pd.DataFrame({
+        'Status': non_answered_status.index,
+        'Conteggio': non_answered_status.values,
+        'Percentuale_del_Totale': (non_answered_status.values / len(df) * 100).round(2),
+        'Percentuale_dei_NonAnswered': (non_answered_status.values / max(len(non_answered), 1) * 100).round(2)
+    })
+
+
+def breakdown_counts(df):
+    return {
+        'total': len(df),
+        'answered': int((df['Status_clean'] == 'answered').sum()),
+        'real_conversations': int(df['Real_Conversation'].sum()),
+        'likely_abandoned': int(df['Likely_Abandoned'].sum()),
+        'other_status': int(df['Other_Status'].sum()),
+        'transferred': int(df['Is_Transferred'].sum()),
+    }
+
+
+def breakdown_table(df):
+    counts = breakdown_counts(df)
+    breakdown_df = pd.DataFrame({
+        'Categoria': [
+            'Conversazioni reali (answered + talking > 0)',
+            'Answered ma senza conversazione (0 sec talking)',
+            'Altri status (non answered)',
+            'TOTALE'
+        ],
+        'Conteggio': [
+            counts['real_conversations'],
+            counts['likely_abandoned'],
+            counts['other_status'],
+            counts['total']
+        ]
+    })
+    breakdown_df['Percentuale'] = (breakdown_df['Conteggio'] / counts['total'] * 100).round(1)
+    return breakdown_df
+
+
+def direction_table(df):
+    direction_stats = df.groupby('Direction', observed=True).agg({
+        'Call ID': 'count',
+        'Real_Conversation': 'sum',
+        'Talking_sec': 'mean',
+        'Ringing_sec': 'mean'
+    }).round(2)
+    direction_stats.columns = ['Totale', 'Conversazioni_Reali', 'Durata_Media_Talking', 'Durata_Media_Ringing']
+    direction_stats['Tasso_Conversazione_%'] = (direction_stats['Conversazioni_Reali'] / direction_stats['Totale'] * 100).round(1)
+    return direction_stats
+
+
+def _period_table(df, by):
+    stats = df.groupby(by, observed=True).agg({
+        'Call ID': 'count',
+        'Real_Conversation': 'sum',
+        'Talking_sec': 'mean'
+    }).round(2)
+    stats.columns = ['Totale_Chiamate', 'Conversazioni', 'Durata_Media']
+    return stats
+
+
+def weekly_table(df):
+    # Pattern settimanali, nell'ordine dei giorni della settimana
+    daily_stats = _period_table(df, 'DayOfWeek')
+    return daily_stats.reindex([d for d in DAY_ORDER if d in daily_stats.index])
+
+
+def hourly_table(df):
+    return _period_table(df, 'Hour')
+
+
+def user_table(df, top=15):
+    user_detailed_stats = df.groupby('User', observed=True).agg({
+        'Call ID': 'count',
+        'Real_Conversation': 'sum',
+        'Talking_sec': ['mean', 'sum'],
+        'Ringing_sec': 'mean',
+        'Is_Internal': 'sum',
+        'Is_Inbound': 'sum',
+        'Is_Outbound': 'sum'
+    }).round(2)
+
+    # Flatten column names
+    user_detailed_stats.columns = [
+        'Totale_Chiamate', 'Conversazioni_Reali', 'Durata_Media_Sec', 'Durata_Totale_Sec',
+        'Tempo_Risposta_Medio', 'Chiamate_Interne', 'Chiamate_In_Entrata', 'Chiamate_In_Uscita'
+    ]
+
+    user_detailed_stats['Tasso_Risposta_%'] = (
+        user_detailed_stats['Conversazioni_Reali'] / user_detailed_stats['Totale_Chiamate'] * 100
+    ).round(1)
+
+    user_detailed_stats['Durata_Totale_Min'] = (user_detailed_stats['Durata_Totale_Sec'] / 60).round(1)
+
+    return user_detailed_stats.sort_values('Totale_Chiamate', ascending=False).head(top)
+
+
+def conversation_stats(df):
+    conversations_only = df.loc[df['Real_Conversation'], 'Talking_sec']
+    if len(conversations_only) == 0:
+        return None
+    return {
+        'count': len(conversations_only),
+        'mean': float(conversations_only.mean()),
+        'median': float(conversations_only.median()),
+        'max': int(conversations_only.max()),
+    }
+
+
+def activity_table(df, top=10):
+    if 'Call Activity Details' not in df.columns:
+        return None
+    return df['Call Activity Details'].value_counts().loc[lambda c: c > 0].head(top)
+
+
+def summary_tables(df, concurrency_freq='1min'):
+    # Tutte le tabelle aggregate, indicizzate per nome (uso headless / CLI);
+    # ogni tabella ha il suo span di profilazione
+    steps = concurrency_steps(df['Call Time'], df['End'])
+    summary = concurrency_summary(steps)
+    builders = {
+        'status': lambda: status_table(df),
+        'non_answered_status': lambda: non_answered_status_table(df),
+        'breakdown': lambda: breakdown_table(df),
+        'direction': lambda: direction_table(df).reset_index(),
+        'weekly': lambda: weekly_table(df).reset_index(),
+        'hourly': lambda: hourly_table(df).reset_index(),
+        'users': lambda: user_table(df).reset_index(),
+        'concurrency': lambda: resample_concurrency(steps, concurrency_freq),
+        'concurrency_summary': lambda: pd.DataFrame([{
+            'Picco': summary['peak'],
+            'Istante_Picco': summary['peak_time'],
+            'Media': round(summary['mean'], 3),
+        }]),
+        'capacity': lambda: capacity_table(steps),
+        'erlang': lambda: erlang_table(hourly_traffic(df)).reset_index(),
+    }
+    tables = {}
+    for name, build in builders.items():
+        with span(f'tabella_{name}', rows=len(df)):
+            tables[name] = build()
+    with span('tabella_callbacks', rows=len(df)):
+        callbacks = missed_call_callbacks(df)
+        tables['callback_delays'] = callback_delay_table(callbacks)
+        tables['repeat_callers'] = repeat_callers(df, callbacks).reset_index()
+    activity = activity_table(df)
+    if activity is not None:
+        with span('tabella_call_flow', rows=len(df)):
+            tables['activity'] = activity.rename_axis('Call Activity Details').reset_index(name='Conteggio')
+            flows = build_call_flows(df['Call Activity Details'])
+            tables['transfer_chains'] = chain_length_table(call_flow_table(df, flows))
+            tables['extension_time'] = extension_time_table(call_legs(df, flows)).reset_index()
+    return tables
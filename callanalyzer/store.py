@@ -0,0 +1,98 @@
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from .profiling import record_cache
+
+# Store in memoria dei DataFrame elaborati, condiviso da tutte le sessioni
+# del processo e indicizzato per hash del contenuto.
+#
+# Le sessioni ricevono un riferimento allo stesso DataFrame invece di una
+# copia: con il copy-on-write di pandas (sempre attivo da pandas 3, vedi
+# requirements.txt) filtri e colonne aggiunte da una sessione non modificano
+# l'oggetto condiviso. La memoria totale è limitata
+# da un budget in byte con eviction LRU.
+
+DEFAULT_MAX_BYTES = 1024 ** 3
+
+def frame_nbytes(df):
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+class SharedFrameStore:
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = int(max_bytes or os.environ.get('CALLANALYZER_STORE_MAX_BYTES', DEFAULT_MAX_BYTES))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_load(self, key, loader):
+        # Restituisce (df, info) per la chiave; se assente chiama loader() una
+        # sola volta anche con più sessioni che chiedono lo stesso file insieme
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                record_cache('memoria_condivisa', True)
+                df, info, _ = self._entries[key]
+                return df, info
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    record_cache('memoria_condivisa', True)
+                    df, info, _ = self._entries[key]
+                    return df, info
+                self.misses += 1
+            record_cache('memoria_condivisa', False)
+
+            df, info = loader()
+            nbytes = frame_nbytes(df)
+
+            with self._lock:
+                self._entries[key] = (df, info, nbytes)
+                self._loading.pop(key, None)
+                self._evict(keep=key)
+        return df, info
+
+    def _evict(self, keep):
+        # Il file appena caricato resta anche se da solo supera il budget
+        while self.used_bytes > self.max_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                self._entries.move_to_end(oldest)
+                continue
+            del self._entries[oldest]
+            self.evictions += 1
+
+    @property
+    def used_bytes(self):
+        return sum(nbytes for _, _, nbytes in self._entries.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'used_bytes': self.used_bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def entries(self):
+        # Tabella delle voci, dalla meno alla più usata di recente
+        with self._lock:
+            return pd.DataFrame(
+                [(key[:12], len(df), nbytes / 1024 ** 2) for key, (df, _, nbytes) in self._entries.items()],
+                columns=['Chiave', 'Righe', 'MB'],
+            )
@@ -0,0 +1,265 @@
+import numpy as np
+import pandas as pd
+
+from .concurrency import concurrency_steps_from_counts
+from .parsing import parse_call_times
+from .processing import derive_columns
+from .profiling import span
+from .schema import DAY_ORDER
+
+# Ingestione a blocchi per export 3CX molto grandi.
+#
+# Il CSV viene letto a blocchi di `chunksize` righe; ogni blocco passa dalla
+# stessa derivazione della modalità normale e viene ripiegato in aggregati
+# incrementali (somme e conteggi), poi scartato. La memoria di picco dipende
+# quindi dalla dimensione del blocco e non da quella del file. Per la
+# concorrenza si conservano solo gli inizi/fini aggregati per istante. Le
+# activity details sono quasi tutte distinte: se ne tengono solo i valori più
+# frequenti, potando il contatore quando supera ACTIVITY_MAX_ENTRIES (i
+# conteggi della top 10 diventano approssimati per difetto).
+
+DEFAULT_CHUNKSIZE = 200_000
+ACTIVITY_MAX_ENTRIES = 50_000
+ACTIVITY_KEEP_ENTRIES = 10_000
+BREAKDOWN_KEYS = ['total', 'answered', 'real_conversations', 'likely_abandoned',
+                  'other_status', 'transferred']
+
+
+def _fold(current, new):
+    # Tutti gli aggregati sono conteggi o somme di secondi interi
+    if current is None:
+        return new.astype('int64')
+    return current.add(new, fill_value=0).astype('int64')
+
+
+FOLDED_AGGREGATES = ['status', 'non_answered_by_direction', 'direction', 'weekly', 'hourly',
+                     'users', 'conversation_durations', 'activity']
+
+
+def partial_aggregates(df):
+    # Somme e conteggi di un blocco già passato da derive_columns, da sommare
+    # a quelli dei blocchi precedenti (in memoria o nello store incrementale)
+    partials = {
+        'breakdown': pd.Series({
+            'total': len(df),
+            'answered': (df['Status_clean'] == 'answered').sum(),
+            'real_conversations': df['Real_Conversation'].sum(),
+            'likely_abandoned': df['Likely_Abandoned'].sum(),
+            'other_status': df['Other_Status'].sum(),
+            'transferred': df['Is_Transferred'].sum(),
+        }).astype('int64'),
+        'status': df['Status'].value_counts(),
+    }
+    non_answered = df[df['Status_clean'] != 'answered']
+    partials['non_answered_by_direction'] = non_answered.groupby(
+        ['Direction', 'Status'], observed=True).size()
+
+    partials['direction'] = df.groupby('Direction', observed=True).agg(
+        Totale=('Call ID', 'count'),
+        Conversazioni_Reali=('Real_Conversation', 'sum'),
+        Talking_sum=('Talking_sec', 'sum'),
+        Ringing_sum=('Ringing_sec', 'sum'),
+    )
+    period_aggs = dict(
+        Totale_Chiamate=('Call ID', 'count'),
+        Conversazioni=('Real_Conversation', 'sum'),
+        Talking_sum=('Talking_sec', 'sum'),
+    )
+    partials['weekly'] = df.groupby('DayOfWeek', observed=True).agg(**period_aggs)
+    partials['hourly'] = df.groupby('Hour', observed=True).agg(**period_aggs)
+    partials['users'] = df.groupby('User', observed=True).agg(
+        Totale_Chiamate=('Call ID', 'count'),
+        Conversazioni_Reali=('Real_Conversation', 'sum'),
+        Durata_Totale_Sec=('Talking_sec', 'sum'),
+        Ringing_sum=('Ringing_sec', 'sum'),
+        Chiamate_Interne=('Is_Internal', 'sum'),
+        Chiamate_In_Entrata=('Is_Inbound', 'sum'),
+        Chiamate_In_Uscita=('Is_Outbound', 'sum'),
+    )
+
+    # Distribuzione esatta delle durate (secondi interi): media, mediana e
+    # istogramma senza conservare le singole righe
+    partials['conversation_durations'] = df.loc[df['Real_Conversation'], 'Talking_sec'].value_counts()
+
+    if 'Call Activity Details' in df.columns:
+        partials['activity'] = df['Call Activity Details'].value_counts()
+
+    # Inizi e fini aggregati per istante, per la concorrenza
+    starts = pd.Series(1, index=df['Call Time'].to_numpy(dtype='datetime64[ns]'))
+    ends = pd.Series(1, index=df['End'].to_numpy(dtype='datetime64[ns]'))
+    partials['events'] = pd.DataFrame({
+        'starts': starts.groupby(level=0).sum(),
+        'ends': ends.groupby(level=0).sum(),
+    }).fillna(0).astype('int32')
+    return partials
+
+
+class StreamingAggregates:
+    # Aggregati incrementali equivalenti alle tabelle della dashboard
+
+    def __init__(self):
+        self.rows_read = 0
+        self.rows_dropped = 0
+        self.malformed = {'Ringing': 0, 'Talking': 0}
+        self.date_formats = {}
+        self.date_fallback = 0
+        self.breakdown = pd.Series(0, index=BREAKDOWN_KEYS, dtype='int64')
+        self.status = None
+        self.non_answered_by_direction = None
+        self.direction = None
+        self.weekly = None
+        self.hourly = None
+        self.users = None
+        self.conversation_durations = None
+        self.activity = None
+        self.activity_pruned = False
+        self._events = []
+        self._events_rows = 0
+        self._events_compacted = 0
+
+    def add_chunk(self, df):
+        # df: blocco già passato da derive_columns
+        self.add_partials(partial_aggregates(df))
+
+    def add_partials(self, partials):
+        # Ripiega gli aggregati parziali di un blocco (vedi partial_aggregates)
+        self.breakdown = self.breakdown.add(partials['breakdown'], fill_value=0).astype('int64')
+        for name in FOLDED_AGGREGATES:
+            if partials.get(name) is not None:
+                setattr(self, name, _fold(getattr(self, name), partials[name]))
+        if self.activity is not None and len(self.activity) > ACTIVITY_MAX_ENTRIES:
+            self.activity = self.activity.nlargest(ACTIVITY_KEEP_ENTRIES)
+            self.activity_pruned = True
+
+        self._events.append(partials['events'])
+        self._events_rows += len(partials['events'])
+        # Compatta quando i blocchi accumulati raddoppiano rispetto all'ultima compattazione
+        if self._events_rows > 2 * max(self._events_compacted, DEFAULT_CHUNKSIZE):
+            self._compact_events()
+
+    def _compact_events(self):
+        if len(self._events) > 1:
+            merged = pd.concat(self._events)
+            self._events = [merged.groupby(level=0).sum().astype('int32')]
+        self._events_rows = self._events_compacted = sum(len(e) for e in self._events)
+
+    # Tabelle finali, con gli stessi nomi di colonna della dashboard
+
+    def status_table(self):
+        total = self.breakdown['total']
+        counts = self.status.sort_values(ascending=False).astype('int64')
+        return pd.DataFrame({
+            'Status': counts.index,
+            'Conteggio': counts.values,
+            'Percentuale': (counts.values / total * 100).round(2),
+        })
+
+    def breakdown_table(self):
+        breakdown_df = pd.DataFrame({
+            'Categoria': [
+                'Conversazioni reali (answered + talking > 0)',
+                'Answered ma senza conversazione (0 sec talking)',
+                'Altri status (non answered)',
+                'TOTALE'
+            ],
+            'Conteggio': [
+                self.breakdown['real_conversations'],
+                self.breakdown['likely_abandoned'],
+                self.breakdown['other_status'],
+                self.breakdown['total'],
+            ]
+        })
+        breakdown_df['Percentuale'] = (breakdown_df['Conteggio'] / self.breakdown['total'] * 100).round(1)
+        return breakdown_df
+
+    def direction_table(self):
+        stats = self.direction.copy()
+        stats['Durata_Media_Talking'] = (stats['Talking_sum'] / stats['Totale']).round(2)
+        stats['Durata_Media_Ringing'] = (stats['Ringing_sum'] / stats['Totale']).round(2)
+        stats = stats[['Totale', 'Conversazioni_Reali', 'Durata_Media_Talking', 'Durata_Media_Ringing']]
+        stats['Tasso_Conversazione_%'] = (stats['Conversazioni_Reali'] / stats['Totale'] * 100).round(1)
+        return stats
+
+    def _period_table(self, table):
+        stats = table.copy()
+        stats['Durata_Media'] = (stats['Talking_sum'] / stats['Totale_Chiamate']).round(2)
+        return stats[['Totale_Chiamate', 'Conversazioni', 'Durata_Media']]
+
+    def weekly_table(self):
+        stats = self._period_table(self.weekly)
+        return stats.reindex([d for d in DAY_ORDER if d in stats.index])
+
+    def hourly_table(self):
+        return self._period_table(self.hourly).sort_index()
+
+    def user_table(self, top=15):
+        stats = self.users.copy()
+        stats['Durata_Media_Sec'] = (stats['Durata_Totale_Sec'] / stats['Totale_Chiamate']).round(2)
+        stats['Tempo_Risposta_Medio'] = (stats['Ringing_sum'] / stats['Totale_Chiamate']).round(2)
+        stats = stats[['Totale_Chiamate', 'Conversazioni_Reali', 'Durata_Media_Sec', 'Durata_Totale_Sec',
+                       'Tempo_Risposta_Medio', 'Chiamate_Interne', 'Chiamate_In_Entrata', 'Chiamate_In_Uscita']]
+        stats['Tasso_Risposta_%'] = (stats['Conversazioni_Reali'] / stats['Totale_Chiamate'] * 100).round(1)
+        stats['Durata_Totale_Min'] = (stats['Durata_Totale_Sec'] / 60).round(1)
+        return stats.sort_values('Totale_Chiamate', ascending=False).head(top)
+
+    def conversation_stats(self):
+        durations = self.conversation_durations
+        if durations is None or durations.sum() == 0:
+            return None
+        durations = durations.sort_index()
+        counts = durations.to_numpy()
+        values = durations.index.to_numpy()
+        cumulative = np.cumsum(counts)
+        total = cumulative[-1]
+        # Mediana come nella versione per righe: media dei due valori centrali se pari
+        lower = values[np.searchsorted(cumulative, (total + 1) // 2)]
+        upper = values[np.searchsorted(cumulative, total // 2 + 1)]
+        return {
+            'count': int(total),
+            'mean': float((values * counts).sum() / total),
+            'median': (lower + upper) / 2,
+            'max': int(values.max()),
+            'distribution': durations,
+        }
+
+    def activity_table(self, top=10):
+        if self.activity is None:
+            return None
+        return self.activity.sort_values(ascending=False).head(top).astype('int64')
+
+    def concurrency_steps(self):
+        self._compact_events()
+        if not self._events:
+            return concurrency_steps_from_counts([], [], [])
+        events = self._events[0]
+        return concurrency_steps_from_counts(events.index, events['starts'], events['ends'])
+
+
+def stream_csv(file, chunksize=DEFAULT_CHUNKSIZE, source=None, aggregates=None):
+    # Legge il CSV a blocchi e restituisce gli aggregati incrementali; passando
+    # `aggregates` si continuano ad accumulare quelli di un file precedente
+    if aggregates is None:
+        aggregates = StreamingAggregates()
+    for chunk in pd.read_csv(file, chunksize=chunksize):
+        with span('blocco', rows=len(chunk)):
+            aggregates.rows_read += len(chunk)
+            # Dopo il primo blocco il formato data è in cache per questa sorgente
+            with span('parse_call_times', rows=len(chunk)):
+                chunk['Call Time'], date_info = parse_call_times(chunk['Call Time'], source=source)
+            for fmt, count in date_info['formats'].items():
+                aggregates.date_formats[fmt] = aggregates.date_formats.get(fmt, 0) + count
+            aggregates.date_fallback += date_info['fallback']
+
+            before = len(chunk)
+            chunk = chunk.dropna(subset=['Call Time'])
+            aggregates.rows_dropped += before - len(chunk)
+            if chunk.empty:
+                continue
+
+            with span('derive_columns', rows=len(chunk)):
+                chunk, malformed = derive_columns(chunk)
+            for column, count in malformed.items():
+                aggregates.malformed[column] += count
+            with span('aggregati', rows=len(chunk)):
+                aggregates.add_chunk(chunk)
+    return aggregates
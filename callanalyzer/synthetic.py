@@ -0,0 +1,358 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = pa_csv = None
+
+# Generatore di export 3CX sintetici per benchmark e prove di carico.
+#
+#   python -m callanalyzer.synthetic chiamate.csv --rows 5000000 --seed 1
+#
+# Le chiamate hanno le stesse colonne di un export reale (Call Time, Call ID,
+# From, To, Direction, Status, Ringing, Talking, Call Activity Details) con
+# distribuzioni plausibili: più traffico nei giorni feriali e nelle ore
+# d'ufficio, status e durate diversi per direzione, numeri esterni e interni
+# con popolarità a coda lunga (quindi chiamanti ripetuti e richiamate) e
+# percorsi di coda e trasferimento nelle activity details. Una parte delle
+# date usa formati diversi dall'ISO e una piccola quota di valori è non
+# valida, come negli export uniti a mano.
+#
+# Le righe vengono generate a blocchi di giorni consecutivi, così anche 50
+# milioni di chiamate si scrivono con memoria costante. Con gli stessi
+# parametri (seed compreso) il file prodotto è identico.
+
+# Da incrementare a ogni modifica dei dati generati: i benchmark salvati con
+# versioni diverse non misurano lo stesso input
+SYNTHETIC_VERSION = '1'
+SYNTHETIC_COLUMNS = ['Call Time', 'Call ID', 'From', 'To', 'Direction', 'Status',
+                     'Ringing', 'Talking', 'Call Activity Details']
+DEFAULT_CHUNK_ROWS = 250_000
+DEFAULT_CALLS_PER_DAY = 5_000
+MAX_DAYS = 365
+
+DIRECTIONS = ['Inbound', 'Outbound', 'Internal']
+DIRECTION_WEIGHTS = [0.45, 0.35, 0.20]
+STATUSES = ['Answered', 'Unanswered', 'Busy', 'Failed', 'Abandoned']
+STATUS_WEIGHTS = {
+    'Inbound': [0.72, 0.15, 0.03, 0.02, 0.08],
+    'Outbound': [0.64, 0.26, 0.06, 0.04, 0.00],
+    'Internal': [0.86, 0.11, 0.03, 0.00, 0.00],
+}
+# Lunedì..domenica e ore del giorno (picchi a metà mattina e metà pomeriggio)
+WEEKDAY_WEIGHTS = [1.0, 1.0, 0.95, 0.95, 0.9, 0.25, 0.08]
+HOUR_WEIGHTS = [0.2, 0.1, 0.1, 0.1, 0.1, 0.2, 0.6, 2, 6, 10, 11, 10,
+                6, 5, 8, 10, 9, 7, 4, 2, 1, 0.6, 0.4, 0.3]
+# Formati di Call Time e loro quota; il resto dei valori non validi
+DATE_FORMAT_MIX = {
+    '%Y-%m-%dT%H:%M:%S': 0.85,
+    '%d/%m/%Y %H:%M:%S': 0.10,
+    '%Y-%m-%d %H:%M': 0.05,
+}
+INVALID_DATE_RATE = 0.001
+INVALID_DURATION_RATE = 0.0005
+MISSING_ACTIVITY_RATE = 0.03
+
+_FIRST_NAMES = ['Marco', 'Giulia', 'Luca', 'Sara', 'Andrea', 'Chiara', 'Paolo', 'Elena', 'Davide', 'Marta',
+                'Stefano', 'Anna', 'Matteo', 'Laura', 'Simone', 'Francesca']
+_LAST_NAMES = ['Rossi', 'Bianchi', 'Russo', 'Ferrari', 'Esposito', 'Romano', 'Colombo', 'Ricci', 'Marino',
+               'Greco', 'Bruno', 'Gallo', 'Conti', 'De Luca', 'Costa', 'Giordano']
+_QUEUES = ['Queue Vendite 800', 'Ring Group Assistenza 801', 'Queue Amministrazione 802', 'IVR Centralino 803']
+_MAX_RINGING = 120
+_MAX_TALKING = 4 * 3600
+
+
+def _weights(values):
+    values = np.asarray(values, dtype='float64')
+    return values / values.sum()
+
+
+def _popularity(size, exponent):
+    # Pesi a coda lunga per un elenco ordinato per popolarità
+    return _weights(1.0 / np.arange(1, size + 1) ** exponent)
+
+
+def _str(values):
+    return pd.Series(values, dtype='str')
+
+
+class _Directory:
+    # Interni, code e numeri esterni con le stringhe nei formati dell'export
+
+    def __init__(self, rng, extensions, external_numbers):
+        first = rng.choice(_FIRST_NAMES, extensions)
+        last = rng.choice(_LAST_NAMES, extensions)
+        numbers = np.arange(100, 100 + extensions).astype(str)
+        self.extension_numbers = numbers
+        self.extensions = np.array([f'{n} {f} {l} ({n})' for n, f, l in zip(numbers, first, last)], dtype=object)
+        self.extension_weights = _popularity(extensions, 0.6)
+
+        # Cellulari e fissi italiani, con e senza prefisso internazionale
+        mobile = rng.random(external_numbers) < 0.6
+        digits = np.where(mobile, 3_000_000_000 + rng.integers(0, 999_999_999, external_numbers),
+                          200_000_000 + rng.integers(0, 799_999_999, external_numbers))
+        digits = np.where(mobile, digits.astype(str), np.char.add('0', digits.astype(str)))
+        prefix = rng.choice(['+39', '0039', ''], external_numbers, p=[0.6, 0.1, 0.3])
+        self.external_numbers = np.char.add(prefix, digits).astype(object)
+        # Una parte dei contatti è in rubrica: "Nome Cognome (numero)"
+        named = rng.random(external_numbers) < 0.3
+        names = np.char.add(np.char.add(rng.choice(_FIRST_NAMES, external_numbers), ' '),
+                            rng.choice(_LAST_NAMES, external_numbers))
+        labelled = np.char.add(np.char.add(np.char.add(names, ' ('), self.external_numbers.astype(str)), ')')
+        self.externals = np.where(named, labelled, self.external_numbers.astype(str)).astype(object)
+        # Nelle activity details il numero compare sempre tra parentesi
+        bare = np.char.add(np.char.add(np.char.add(self.external_numbers.astype(str), ' ('),
+                                       self.external_numbers.astype(str)), ')')
+        self.external_parties = np.where(named, labelled, bare).astype(object)
+        self.external_weights = _popularity(external_numbers, 0.9)
+
+        self.queues = np.array(_QUEUES, dtype=object)
+
+    def extension(self, rng, size):
+        return rng.choice(len(self.extensions), size, p=self.extension_weights)
+
+    def external(self, rng, size):
+        return rng.choice(len(self.externals), size, p=self.external_weights)
+
+
+def _duration_strings():
+    seconds = np.arange(_MAX_TALKING + 1)
+    return np.array([f'{s // 3600:02d}:{s % 3600 // 60:02d}:{s % 60:02d}' for s in seconds], dtype=object)
+
+
+def _call_times(rng, day_starts, day_counts):
+    # Istanti ordinati: giorno ripetuto per il suo numero di chiamate, ora dal profilo giornaliero
+    day_ns = np.repeat(day_starts, day_counts)
+    hour = rng.choice(24, len(day_ns), p=_weights(HOUR_WEIGHTS))
+    offset_ns = (hour * 3600 + rng.integers(0, 3600, len(day_ns))) * 1_000_000_000
+    return np.sort(day_ns + offset_ns).view('datetime64[ns]')
+
+
+def _format_times(rng, times, date_formats, invalid_rate):
+    formats = list(date_formats)
+    choice = rng.choice(len(formats), len(times), p=_weights(list(date_formats.values())))
+    text = np.empty(len(times), dtype=object)
+    for i, fmt in enumerate(formats):
+        mask = choice == i
+        if not mask.any():
+            continue
+        if fmt == '%Y-%m-%dT%H:%M:%S':
+            text[mask] = np.datetime_as_string(times[mask], unit='s')
+        else:
+            text[mask] = pd.DatetimeIndex(times[mask]).strftime(fmt).to_numpy(dtype=object)
+    invalid = rng.random(len(times)) < invalid_rate
+    text[invalid] = rng.choice(['', 'n/d', '31/02/2025 25:61:00'], int(invalid.sum()))
+    return text
+
+
+def _durations(rng, direction, status):
+    size = len(direction)
+    answered = status == 'Answered'
+    unanswered = ~answered
+    ringing = rng.lognormal(np.log(9), 0.6, size)
+    ringing = np.where(unanswered, rng.lognormal(np.log(22), 0.5, size), ringing)
+    ringing = np.where(direction == 'Internal', ringing * 0.5, ringing)
+    ringing = np.clip(ringing, 0, _MAX_RINGING).astype('int64')
+
+    talking = np.clip(rng.lognormal(np.log(95), 1.05, size), 1, _MAX_TALKING).astype('int64')
+    talking = np.where(direction == 'Internal', talking // 3 + 1, talking)
+    # Risposte senza conversazione: il chiamante riattacca alla risposta
+    talking = np.where(answered & (rng.random(size) >= 0.06), talking, 0)
+    return ringing, talking
+
+
+def _activity(rng, direction, status, caller, callee, queue, agent, other_agent):
+    # Percorso della chiamata nel formato letto da callflow (parti come "Nome (numero)")
+    size = len(direction)
+    answered = status == 'Answered'
+    pattern = rng.random(size)
+    text = pd.Series(pd.NA, index=range(size), dtype='str')
+
+    def put(mask, *parts):
+        # Concatena le parti solo per le righe del modello, senza stringhe intermedie per tutto il blocco
+        rows = np.flatnonzero(mask)
+        if not len(rows):
+            return
+        value = ''
+        for part in parts:
+            value = value + (part if isinstance(part, str) else _str(part[rows]))
+        text.iloc[rows] = value.array
+
+    inbound = direction == 'Inbound'
+    # Scelte per riga fatte sui riferimenti agli oggetti, non sulle stringhe
+    queue_hop = np.where(inbound & (pattern < 0.7), queue + ' -> ', '')
+    ended_by = np.where(rng.random(size) < 0.55, caller, agent)
+    transfer = pattern % 0.1 < 0.012
+    forward = ~transfer & (pattern % 0.1 < 0.02)
+
+    routed = ('Inbound: ', caller, ' -> ', queue_hop, agent)
+    ended = ('; Ended by ', ended_by)
+    put(inbound & answered & ~transfer & ~forward, *routed, ' answered', *ended)
+    put(inbound & answered & transfer, *routed, ' answered; Transfer to ', other_agent, ' answered', *ended)
+    put(inbound & answered & forward, *routed, '; Forwarded to ', other_agent, ' answered', *ended)
+    put(inbound & (status == 'Abandoned'), 'Inbound: ', caller, ' -> ', queue, '; Ended by ', caller)
+    put(inbound & ~answered & (status != 'Abandoned'), *routed, '; Missed')
+
+    outbound = direction == 'Outbound'
+    put(outbound & answered, 'Outbound: ', agent, ' -> ', callee, ' answered; Ended by ', agent)
+    put(outbound & ~answered, 'Outbound: ', agent, ' -> ', callee, '; No answer')
+
+    internal = direction == 'Internal'
+    put(internal & answered & transfer, 'Internal: ', agent, ' -> ', other_agent, ' answered; Transfer to ',
+        callee, ' answered')
+    put(internal & answered & ~transfer, 'Internal: ', agent, ' -> ', other_agent, ' answered')
+    put(internal & ~answered, 'Internal: ', agent, ' -> ', other_agent, '; Missed')
+
+    text[rng.random(size) < MISSING_ACTIVITY_RATE] = pd.NA
+    return text
+
+
+def _chunk(rng, directory, durations, times, first_id, date_formats, invalid_date_rate, invalid_duration_rate):
+    size = len(times)
+    direction = np.array(DIRECTIONS, dtype=object)[rng.choice(3, size, p=DIRECTION_WEIGHTS)]
+    status = np.empty(size, dtype=object)
+    for name, weights in STATUS_WEIGHTS.items():
+        mask = direction == name
+        status[mask] = np.array(STATUSES, dtype=object)[rng.choice(len(STATUSES), int(mask.sum()), p=weights)]
+
+    agent_code = directory.extension(rng, size)
+    other_code = directory.extension(rng, size)
+    external_code = directory.external(rng, size)
+    agent = directory.extensions[agent_code]
+    other_agent = directory.extensions[other_code]
+    external = directory.externals[external_code]
+    external_party = directory.external_parties[external_code]
+    queue = directory.queues[rng.choice(len(directory.queues), size, p=[0.5, 0.3, 0.15, 0.05])]
+
+    inbound = direction == 'Inbound'
+    internal = direction == 'Internal'
+    caller = np.where(inbound, external, agent)
+    callee = np.where(inbound, agent, np.where(internal, other_agent, external))
+    # In entrata il To è la coda o l'interno chiamato direttamente (DID)
+    to = np.where(inbound & (rng.random(size) < 0.65), queue, callee)
+
+    ringing, talking = _durations(rng, direction, status)
+    ringing_text = durations[ringing]
+    talking_text = durations[talking]
+    for text in (ringing_text, talking_text):
+        invalid = rng.random(size) < invalid_duration_rate
+        text[invalid] = rng.choice(['', 'n/d', '-'], int(invalid.sum()))
+
+    return pd.DataFrame({
+        'Call Time': _format_times(rng, times, date_formats, invalid_date_rate),
+        'Call ID': np.arange(first_id, first_id + size),
+        'From': _str(caller),
+        'To': _str(to),
+        'Direction': _str(direction),
+        'Status': _str(status),
+        'Ringing': _str(ringing_text),
+        'Talking': _str(talking_text),
+        'Call Activity Details': _activity(rng, direction, status, np.where(inbound, external_party, agent),
+                                           np.where(internal, other_agent, external_party), queue, agent,
+                                           other_agent),
+    }, columns=SYNTHETIC_COLUMNS)
+
+
+def generate_calls(rows, seed=0, start='2025-01-01', days=None, extensions=60, external_numbers=None,
+                   date_formats=None, invalid_date_rate=INVALID_DATE_RATE,
+                   invalid_duration_rate=INVALID_DURATION_RATE, chunk_rows=DEFAULT_CHUNK_ROWS):
+    # Blocchi (DataFrame) di chiamate sintetiche in ordine di Call Time, `rows` righe in tutto
+    rng = np.random.default_rng(seed)
+    if days is None:
+        days = int(min(max(np.ceil(rows / DEFAULT_CALLS_PER_DAY), 7), MAX_DAYS))
+    if external_numbers is None:
+        external_numbers = int(min(max(rows // 20, 500), 500_000))
+    directory = _Directory(rng, extensions, external_numbers)
+    durations = _duration_strings()
+
+    day_starts = pd.date_range(start, periods=days, freq='D').to_numpy(dtype='datetime64[ns]').view('int64')
+    day_weights = _weights(np.array(WEEKDAY_WEIGHTS)[pd.DatetimeIndex(day_starts).dayofweek])
+    day_counts = rng.multinomial(rows, day_weights)
+
+    # Giorni consecutivi raggruppati fino a circa chunk_rows righe per blocco
+    first_id = 1_000_000
+    first_day = 0
+    while first_day < days:
+        last_day = first_day
+        total = day_counts[first_day]
+        while last_day + 1 < days and total + day_counts[last_day + 1] <= chunk_rows:
+            last_day += 1
+            total += day_counts[last_day]
+        times = _call_times(rng, day_starts[first_day:last_day + 1], day_counts[first_day:last_day + 1])
+        if len(times):
+            yield _chunk(rng, directory, durations, times, first_id, date_formats or DATE_FORMAT_MIX,
+                         invalid_date_rate, invalid_duration_rate)
+        first_id += len(times)
+        first_day = last_day + 1
+
+
+def synthetic_calls(rows, **options):
+    # Tutte le chiamate in un solo DataFrame (per dimensioni che stanno in memoria)
+    chunks = list(generate_calls(rows, **options))
+    if not chunks:
+        return pd.DataFrame(columns=SYNTHETIC_COLUMNS)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def _write_chunk(chunk, fh):
+    # I valori generati non contengono virgole, virgolette o a capo: con
+    # pyarrow il CSV si scrive senza quoting ed è identico a quello di pandas
+    if pa_csv is None:
+        fh.write(chunk.to_csv(index=False, header=False, lineterminator='\n').encode('utf-8'))
+        return
+    table = pa.Table.from_pandas(chunk, preserve_index=False)
+    pa_csv.write_csv(table, fh, pa_csv.WriteOptions(include_header=False, quoting_style='none'))
+
+
+def write_synthetic_csv(path, rows, **options):
+    # Scrive l'export a blocchi; restituisce il numero di righe scritte
+    written = 0
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as fh:
+        fh.write((','.join(SYNTHETIC_COLUMNS) + '\n').encode('utf-8'))
+        for chunk in generate_calls(rows, **options):
+            _write_chunk(chunk, fh)
+            written += len(chunk)
+    os.replace(tmp_path, path)
+    return written
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m callanalyzer.synthetic',
+        description="Genera un export 3CX sintetico (CSV) per benchmark e prove di carico.",
+    )
+    parser.add_argument('output', help="file CSV da creare")
+    parser.add_argument('-n', '--rows', type=int, default=100_000, help="numero di chiamate (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=0, help="seme del generatore (default: %(default)s)")
+    parser.add_argument('--start', default='2025-01-01', help="primo giorno (default: %(default)s)")
+    parser.add_argument('--days', type=int, default=None,
+                        help=f"giorni coperti (default: {DEFAULT_CALLS_PER_DAY} chiamate al giorno, "
+                             f"da 7 a {MAX_DAYS} giorni)")
+    parser.add_argument('--extensions', type=int, default=60, help="numero di interni (default: %(default)s)")
+    parser.add_argument('--iso-only', action='store_true', help="solo date ISO, senza formati misti né date non valide")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    options = {}
+    if args.iso_only:
+        options = {'date_formats': {'%Y-%m-%dT%H:%M:%S': 1.0}, 'invalid_date_rate': 0.0}
+    started = time.perf_counter()
+    written = write_synthetic_csv(args.output, args.rows, seed=args.seed, start=args.start, days=args.days,
+                                  extensions=args.extensions, **options)
+    size_mb = os.path.getsize(args.output) / 1024 ** 2
+    print(f"✅ {args.output}: {written} chiamate, {size_mb:.0f} MB in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())